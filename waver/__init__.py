@@ -1,10 +1,26 @@
+import importlib
+
 try:
     from ._version import version as __version__
 except ImportError:
     __version__ = "unknown"
 
 
+# napari plugin hooks and the modules they are defined in. They import
+# napari, so they are only imported when napari asks for them and waver can
+# be used without napari installed.
+_NAPARI_HOOKS = {
+    'napari_get_reader': '._reader',
+    'napari_experimental_provide_dock_widget': '._dock_widget',
+}
+
+
+def __getattr__(name):
+    if name in _NAPARI_HOOKS:
+        return getattr(importlib.import_module(_NAPARI_HOOKS[name], __name__), name)
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
 
-from ._reader import napari_get_reader
-from ._dock_widget import napari_experimental_provide_dock_widget
 
+def __dir__():
+    # Listed so the napari plugin engine finds the hooks
+    return sorted(list(globals()) + list(_NAPARI_HOOKS))
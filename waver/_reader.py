@@ -1,8 +1,8 @@
 from napari_plugin_engine import napari_hook_implementation
 from pathlib import Path
-import zarr
 
 from .datasets import load_simulation_dataset
+from .datasets._loader import open_simulation_group
 
 
 @napari_hook_implementation
@@ -22,7 +22,7 @@ def napari_get_reader(path):
     """
     # Inspect dataset
     path = Path(path)
-    dataset = zarr.open(path.as_posix(), mode='r')
+    dataset = open_simulation_group(path)
 
     # If dataset is a full dataset return reader
     if dataset.attrs['waver'] and dataset.attrs['dataset']:
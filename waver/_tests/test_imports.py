@@ -0,0 +1,29 @@
+import json
+import subprocess
+import sys
+
+import pytest
+
+
+GUI_MODULES = ('napari', 'napari_plugin_engine', 'magicgui', 'qtpy')
+
+
+@pytest.mark.parametrize('module', ['waver', 'waver.simulation', 'waver.datasets'])
+def test_import_without_napari(module):
+    """Test simulations and datasets can be imported without importing napari."""
+    code = (f'import json, sys, {module}; '
+            f'print(json.dumps([name for name in sys.modules if name.split(".")[0] in {GUI_MODULES!r}]))')
+    result = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True)
+    assert json.loads(result.stdout.strip().splitlines()[-1]) == []
+
+
+def test_napari_hooks():
+    """Test the napari plugin hooks are found on the package."""
+    import waver
+    from waver._reader import napari_get_reader
+
+    assert waver.napari_get_reader is napari_get_reader
+    assert 'napari_experimental_provide_dock_widget' in dir(waver)
+    assert callable(waver.napari_experimental_provide_dock_widget)
+    with pytest.raises(AttributeError):
+        waver.not_an_attribute
@@ -1,3 +1,7 @@
-from ._generator import generate_simulation_dataset
+from ._generator import generate_simulation_dataset, merge_simulation_shards
 from ._loader import load_simulation_dataset
+from ._pyramid import build_simulation_pyramid
+from ._storage import Storage, STORAGE_PRESETS, benchmark_storage
+from ._streaming import SimulationStream
+from ._training import TrainingLoader, benchmark_training_loader
 from ._visualize import run_and_visualize
\ No newline at end of file
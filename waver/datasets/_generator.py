@@ -1,12 +1,24 @@
 import inspect
+import json
+import os
+import numpy as np
 import zarr
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from pathlib import Path
 from tqdm import tqdm
 
-from ..simulation import run_multiple_sources
+from ..simulation import Simulation, run_multiple_sources, run_travel_times
+from ..simulation._time import Time
+from ..simulation._utils import run_rng
+from ._storage import make_storage, quantization_error
 
 
-def generate_simulation_dataset(path, runs, **kawrgs):
+# Percentiles of each array stored in the statistics of a dataset
+PERCENTILES = (1, 50, 99)
+
+
+def generate_simulation_dataset(path, runs, outputs=('wave',), workers=None, seed=None, resume=False, run_range=None,
+                                storage=None, **kawrgs):
     """Generate and save a simulation dataset.
 
     Parameters
@@ -17,6 +29,41 @@ def generate_simulation_dataset(path, runs, **kawrgs):
         If int then number of runs to use. If array then
         array must be of one dim more than simulation grid
         dim.
+    outputs : tuple of str, optional
+        Outputs to store for each run. 'wave' stores the wave on the
+        detector and 'travel_time' stores the first arrival time of the
+        wave from each source on the detector, which is much faster to
+        compute than the wave.
+    workers : int, optional
+        Number of worker processes to generate runs in. Each worker writes
+        the outputs of its runs directly into the chunks of the dataset
+        for those runs. If None then runs are generated in this process.
+    seed : int, optional
+        Seed for random speed distributions. Each run uses its own random
+        number generator spawned from the seed, so the dataset does not
+        depend on the number of workers. If None then a seed is drawn and
+        stored with the dataset.
+    resume : bool, optional
+        If True and a dataset generated with the same parameters already
+        exists at the path, only generate the runs it has not completed,
+        using its seed. The resumed dataset is identical to one generated
+        without interruption. If False any existing data is overwritten.
+    run_range : tuple of int, optional
+        Start and stop index of the runs to generate, for generating a
+        shard of a larger dataset. The shard only stores these runs, and
+        each run is identical to the same run of the full dataset. Shards
+        of the same dataset, for example generated on different machines,
+        must use the same seed and can be combined with
+        `merge_simulation_shards`.
+    storage : str or Storage, optional
+        Chunking, compression and data type of the stored arrays, either a
+        `Storage` or the name of a preset suited to how the dataset is
+        read, one of 'default', 'training' for reading whole runs,
+        'browsing' for reading single time frames and 'traces' for reading
+        the time series of single detector pixels. When a lower precision
+        data type is used the largest quantization error of each run,
+        relative to its largest value, is stored in the
+        `quantization_error` group.
     kawrgs :
         run_multiple_sources kwargs.
 
@@ -28,43 +75,302 @@ def generate_simulation_dataset(path, runs, **kawrgs):
     # Convert path to pathlib path
     path = Path(path)
 
-    # Create dataset
-    dataset = zarr.open(path.as_posix(), mode='w')
-
     if not isinstance(runs, int):
         full_speed_array = runs
         runs = len(runs)
     else:
         full_speed_array = None        
 
-    # Add dataset attributes
-    dataset.attrs['waver'] = True
-    dataset.attrs['dataset'] = True
-    dataset.attrs['runs'] = runs
+    if run_range is None:
+        run_range = (0, runs)
+    elif seed is None:
+        raise ValueError('A seed is required to generate a shard, so that all shards use the same seed')
+    start, stop = run_range
+    if not 0 <= start <= stop <= runs:
+        raise ValueError(f'Run range {tuple(run_range)} not valid for {runs} runs')
+
+    storage = make_storage(storage)
+    shapes = _output_shapes(outputs, kawrgs)
+
+    # Every run is identical when the speed is the same for all runs, so
+    # its arrays are shared by all runs and only computed and stored once
+    if full_speed_array is not None:
+        shared = len(full_speed_array) > 0 and bool(np.all(full_speed_array == full_speed_array[0]))
+    else:
+        shared = not isinstance(kawrgs.get('speed'), str)
+
+    # Dataset attributes
+    attrs = {'waver': True, 'dataset': True, 'runs': runs, 'run_range': [start, stop], 'outputs': list(outputs),
+             'storage': storage._asdict(), 'shared': list(shapes) if shared else []}
 
     # Add simulation attributes based on kwargs and defaults
     parameters = inspect.signature(run_multiple_sources).parameters
     for param, value in parameters.items():
+        if param == 'rng':
+            continue
         if param in kawrgs:
-            dataset.attrs[param] = kawrgs[param]
+            attrs[param] = kawrgs[param]
         else:
-            dataset.attrs[param] = value.default
-
-    # Initialize speed and wave arrays
-    speed_array = None
-    wave_array = None
-    
-    # Move through runs
-    for run in tqdm(range(runs), leave=False):
+            attrs[param] = value.default
+
+    # Compare attributes as they are stored
+    attrs = json.loads(json.dumps(attrs))
+
+    existing = zarr.open(path.as_posix(), mode='a') if resume else None
+    if existing is not None and existing.attrs.get('dataset', False):
+        # Resume the existing dataset
+        dataset = existing
+        stored = dataset.attrs.asdict()
+        changed = [key for key, value in attrs.items() if stored.get(key) != value]
+        if seed is not None and seed != stored['seed']:
+            changed.append('seed')
+        if changed:
+            raise ValueError(f'Dataset at {path} was generated with different {changed}, '
+                             'use resume=False to overwrite it')
+        seed = stored['seed']
+    else:
+        # Create dataset
+        dataset = zarr.open(path.as_posix(), mode='w')
+        if seed is None:
+            seed = np.random.SeedSequence().entropy
+        dataset.attrs.update({**attrs, 'seed': seed})
+
+        # Create output arrays before running, chunked one run at a time so
+        # each run writes to its own chunks. Shared arrays only hold one run.
+        nruns = 1 if shared else stop - start
+        for name, shape in shapes.items():
+            storage.create(dataset, name, (nruns, ) + shape, len(kawrgs['size']))
+        dataset.zeros('completed', shape=(stop - start,), chunks=(1,), dtype=bool)
+        if np.dtype(storage.dtype) != np.float64:
+            errors = dataset.create_group('quantization_error')
+            for name in shapes:
+                errors.zeros(name, shape=(nruns,), chunks=(1,))
+
+        # Statistics of each run, the minimum, maximum and percentiles
+        statistics = dataset.create_group('statistics')
+        for name in shapes:
+            statistics.zeros(name, shape=(nruns, 2 + len(PERCENTILES)), chunks=(1, 2 + len(PERCENTILES)))
+
+    def run_kwargs(run):
         if full_speed_array is not None:
-            kawrgs['speed'] = full_speed_array[run]
-        wave, speed = run_multiple_sources(**kawrgs)
-        if speed_array is None:
-            speed_array = dataset.zeros('speed', shape=(runs, ) + speed.shape, chunks=(1,) + (64,) * speed.ndim)
-        if wave_array is None:
-            wave_array = dataset.zeros('wave', shape=(runs, ) + wave.shape, chunks=(1,) + (64,) * wave.ndim)
+            return {**kawrgs, 'speed': full_speed_array[run]}
+        return kawrgs
+
+    # Index of the runs of the dataset still to generate, only one run is
+    # needed when all runs are identical
+    pending = start + np.flatnonzero(~dataset['completed'][:])
+    if shared:
+        pending = pending[:1]
+
+    if workers is None:
+        # Move through runs
+        for run in tqdm(pending, leave=False):
+            _write_run(path.as_posix(), run, outputs, run_kwargs(run), seed)
+    else:
+        # Workers write their runs directly into the dataset
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(_write_run, path.as_posix(), run, outputs,
+                                       {'progress': False, **run_kwargs(run)}, seed)
+                       for run in pending]
+            for future in tqdm(as_completed(futures), total=len(futures), leave=False):
+                # Raise any error from the worker
+                future.result()
+
+    # Summarize the statistics of all runs so the dataset can be displayed
+    # without reading it, and consolidate the metadata so it is opened
+    # with a single read
+    dataset.attrs['statistics'] = {name: _summarize_statistics(array[:], stop - start)
+                                   for name, array in dataset['statistics'].arrays()}
+    zarr.consolidate_metadata(dataset.store)
+    return dataset
+
+
+def _write_run(path, run, outputs, kawrgs, seed):
+    """Run a simulation and write its outputs into an existing dataset.
+
+    The run is marked as completed once all of its outputs are written.
 
-        speed_array[run] = speed
-        wave_array[run] = wave
+    Parameters
+    ----------
+    path : str
+        Root path of the simulation dataset.
+    run : int
+        Index of the run in the full dataset. Arrays shared by all runs are
+        written to their single run.
+    outputs : tuple of str
+        Outputs to compute, 'wave' and or 'travel_time'.
+    kawrgs :
+        run_multiple_sources kwargs.
+    seed : int
+        Seed of the dataset.
+    """
+    dataset = zarr.open(path, mode='r+')
+    shared = dataset.attrs.get('shared', [])
+    index = run - dataset.attrs['run_range'][0]
+    for name, value in _run_outputs(outputs, kawrgs, run_rng(seed, run)).items():
+        array_index = 0 if name in shared else index
+        dataset[name][array_index] = value
+        if 'quantization_error' in dataset:
+            dataset['quantization_error'][name][array_index] = quantization_error(value, dataset[name].dtype)
+        dataset['statistics'][name][array_index] = ([np.min(value), np.max(value)]
+                                                    + list(np.percentile(value, PERCENTILES)))
+
+    # Shared arrays complete every run at once
+    if shared:
+        dataset['completed'][:] = True
+    else:
+        dataset['completed'][index] = True
+
+
+def merge_simulation_shards(path, shards):
+    """Combine shards of a simulation dataset into a single dataset.
+
+    The combined dataset only stores the attributes of the dataset and the
+    location of each shard, no data is copied. When loaded, the arrays of
+    the shards are concatenated along the run axis.
+
+    Parameters
+    ----------
+    path : str
+        Root path where the combined dataset will be stored.
+    shards : list of str
+        Paths of the shards, generated with `generate_simulation_dataset`
+        using a `run_range`. Together the shards must cover all runs of the
+        dataset once.
+
+    Returns
+    -------
+    dataset : zarr.hierarchy.Group
+        Combined simulation dataset.
+    """
+    path = Path(path)
+
+    # Order shards by their first run
+    shards = [Path(shard) for shard in shards]
+    shard_attrs = [zarr.open(shard.as_posix(), mode='r').attrs.asdict() for shard in shards]
+    order = np.argsort([attrs['run_range'][0] for attrs in shard_attrs], kind='stable')
+    shards = [shards[i] for i in order]
+    shard_attrs = [shard_attrs[i] for i in order]
+
+    # Check shards are from the same dataset and cover all of its runs
+    differ = ('run_range', 'statistics')
+    attrs = {key: value for key, value in shard_attrs[0].items() if key not in differ}
+    next_run = 0
+    for shard, shard_attr in zip(shards, shard_attrs):
+        if {key: value for key, value in shard_attr.items() if key not in differ} != attrs:
+            raise ValueError(f'Shard {shard} was generated with different parameters to shard {shards[0]}')
+        if shard_attr['run_range'][0] != next_run:
+            raise ValueError(f'Shards do not cover the runs of the dataset contiguously, '
+                             f'shard {shard} starts at run {shard_attr["run_range"][0]} not {next_run}')
+        next_run = shard_attr['run_range'][1]
+    if next_run != attrs['runs']:
+        raise ValueError(f'Shards cover {next_run} runs of a dataset of {attrs["runs"]} runs')
+
+    # Combine the statistics of the shards, weighting percentiles by runs
+    statistics = {}
+    for name in shard_attrs[0].get('statistics', {}):
+        shard_statistics = [shard_attr['statistics'][name] for shard_attr in shard_attrs]
+        values = np.array([[stat['min'], stat['max']] + [stat['percentiles'][str(p)] for p in PERCENTILES]
+                           for stat in shard_statistics])
+        nruns = np.array([stat['nruns'] for stat in shard_statistics])
+        statistics[name] = _summarize_statistics(values, nruns.sum(), weights=nruns)
+
+    # Store shards relative to the combined dataset where possible
+    dataset = zarr.open(path.as_posix(), mode='w')
+    dataset.attrs.update({**attrs, 'run_range': [0, attrs['runs']], 'statistics': statistics,
+                          'shards': [os.path.relpath(shard.resolve(), path.resolve()) for shard in shards]})
+    zarr.consolidate_metadata(dataset.store)
+    return dataset
+
+
+def _summarize_statistics(values, nruns, weights=None):
+    """Summarize the statistics of the runs of an array.
+
+    Parameters
+    ----------
+    values : np.ndarray
+        Minimum, maximum and percentiles of each run, or group of runs,
+        along the last axis.
+    nruns : int
+        Number of runs summarized.
+    weights : np.ndarray, optional
+        Number of runs in each group of runs.
+
+    Returns
+    -------
+    dict
+        Minimum and maximum over all runs, and the mean of each percentile
+        over the runs.
+    """
+    percentiles = np.average(values[:, 2:], axis=0, weights=weights)
+    return {'nruns': int(nruns), 'min': float(values[:, 0].min()), 'max': float(values[:, 1].max()),
+            'percentiles': {str(p): float(value) for p, value in zip(PERCENTILES, percentiles)}}
+
+
+def _output_shapes(outputs, kawrgs):
+    """Shape of each output of a run without running it.
+
+    Parameters
+    ----------
+    outputs : tuple of str
+        Outputs to compute, 'wave' and or 'travel_time'.
+    kawrgs :
+        run_multiple_sources kwargs.
+
+    Returns
+    -------
+    dict of tuple of int
+        Shape of each output of a run and of the speed.
+    """
+    parameters = inspect.signature(run_multiple_sources).parameters
+    kawrgs = {**{param: value.default for param, value in parameters.items()}, **kawrgs}
+
+    sim = Simulation(size=kawrgs['size'], spacing=kawrgs['spacing'], max_speed=kawrgs['max_speed'],
+                     time_step=kawrgs['time_step'], pml_thickness=kawrgs['pml_thickness'])
+    sim.add_detector(spatial_downsample=kawrgs['spatial_downsample'], boundary=kawrgs['boundary'],
+                     edge=kawrgs['edge'])
+    nsources = len(kawrgs['sources'])
+
+    shapes = {'speed': (1, 1) + sim.grid.shape}
+    if 'wave' in outputs:
+        time = Time(step=sim.time_step, duration=kawrgs['duration'],
+                    temporal_downsample=kawrgs['temporal_downsample'])
+        shapes['wave'] = (nsources, time.nsteps_detected) + sim.detector.downsample_shape
+    if 'travel_time' in outputs:
+        shapes['travel_time'] = (nsources,) + sim.detector.downsample_shape
+    return shapes
+
+
+def _run_outputs(outputs, kawrgs, rng=None):
+    """Run a simulation computing each of the requested outputs.
+
+    Parameters
+    ----------
+    outputs : tuple of str
+        Outputs to compute, 'wave' and or 'travel_time'.
+    kawrgs :
+        run_multiple_sources kwargs.
+    rng : np.random.Generator, optional
+        Random number generator used to generate a random speed
+        distribution.
+
+    Returns
+    -------
+    dict of np.ndarray
+        Computed outputs and the speed they were computed with.
+    """
+    unknown = set(outputs) - {'wave', 'travel_time'}
+    if len(outputs) == 0 or unknown:
+        raise ValueError(f'Outputs {tuple(outputs)} not valid, use wave and or travel_time')
 
-    return dataset
\ No newline at end of file
+    results = {}
+    if 'wave' in outputs:
+        results['wave'], results['speed'] = run_multiple_sources(**kawrgs, rng=rng)
+        # Compute travel times with the same random speed
+        kawrgs = {**kawrgs, 'speed': results['speed'][0, 0]}
+    if 'travel_time' in outputs:
+        parameters = inspect.signature(run_travel_times).parameters
+        travel_time_kwargs = {key: value for key, value in kawrgs.items() if key in parameters}
+        travel_time_kwargs['progress'] = False
+        results['travel_time'], results['speed'] = run_travel_times(**travel_time_kwargs, rng=rng)
+    return results
@@ -1,4 +1,5 @@
-from napari.utils import Colormap
+import dask.array as da
+import numpy as np
 from pathlib import Path
 import zarr
 
@@ -6,6 +7,12 @@ import zarr
 def load_simulation_dataset(path):
     """Load a simulation dataset.
 
+    Arrays are returned as dask arrays chunked like the stored arrays, so
+    no data is read until it is displayed. Contrast limits come from the
+    statistics stored with the dataset when it was generated. Arrays with
+    a pyramid, see `build_simulation_pyramid`, are returned as multiscale
+    layers.
+
     Parameters
     ----------
     path : str
@@ -17,21 +24,143 @@ def load_simulation_dataset(path):
         Loaded simulation dataset.
     """
 
+    from napari.utils import Colormap
+
     # Load dataset
     path = Path(path)
-    dataset = zarr.open(path.as_posix(), mode='r')
+    dataset = open_simulation_group(path)
 
     metadata = dataset.attrs.asdict()
+    statistics = metadata.get('statistics', {})
 
     # If dataset is a full dataset return it
     if dataset.attrs['waver'] and dataset.attrs['dataset']:
+        arrays = _dataset_arrays(dataset, path)
+        layers = []
         # Return simulation wave data
-        clim = max(dataset['wave'][0].max(), abs(dataset['wave'][0].min())) / 3**dataset['wave'][0].ndim
-        wave_cmap = Colormap([[0.55, 0, .32, 1], [0, 0, 0, 0], [0.15, 0.4, 0.1, 1]], name='PBlG')
-        wave_dict = {'colormap': wave_cmap, 'contrast_limits':[-clim, clim], 'name': 'wave', 'metadata':metadata}
+        if 'wave' in arrays:
+            if 'wave' in statistics:
+                peak = max(statistics['wave']['max'], abs(statistics['wave']['min']))
+            else:
+                first_wave = np.asarray(arrays['wave'][0][0])
+                peak = max(first_wave.max(), abs(first_wave.min()))
+            clim = peak / 3**(arrays['wave'][0].ndim - 1)
+            wave_cmap = Colormap([[0.55, 0, .32, 1], [0, 0, 0, 0], [0.15, 0.4, 0.1, 1]], name='PBlG')
+            wave_dict = {'colormap': wave_cmap, 'contrast_limits':[-clim, clim], 'name': 'wave', 'metadata':metadata}
+            layers.append(_layer(arrays['wave'], wave_dict))
+        # Return simulation travel time data
+        if 'travel_time' in arrays:
+            if 'travel_time' in statistics:
+                max_time = statistics['travel_time']['max']
+            else:
+                max_time = np.asarray(arrays['travel_time'][0][0]).max()
+            time_dict = {'colormap': 'viridis', 'contrast_limits':(0, max_time),
+                         'name': 'travel_time', 'metadata':metadata}
+            layers.append(_layer(arrays['travel_time'], time_dict))
         speed_cmap = Colormap([[0, 0, 0, 0], [0.7, 0.5, 0, 1]], name='Orange')
         speed_dict = {'colormap': speed_cmap, 'visible': False, 'contrast_limits':(metadata['min_speed'], metadata['max_speed']),
                       'name': 'speed', 'metadata':metadata}
-        return [(dataset['wave'], wave_dict, 'image'), (dataset['speed'], speed_dict, 'image')]
+        layers.append(_layer(arrays['speed'], speed_dict))
+        return layers
     else:
         raise ValueError(f'Dataset at {path} not valid waver simulation')
+
+
+def _layer(levels, layer_dict):
+    """Image layer data tuple of the levels of an array.
+
+    Parameters
+    ----------
+    levels : list of dask.array.Array
+        Array at each level of its pyramid, starting at full resolution.
+    layer_dict : dict
+        Layer kwargs.
+
+    Returns
+    -------
+    tuple
+        Layer data tuple, multiscale if the array has more than one level.
+    """
+    if len(levels) == 1:
+        return (levels[0], layer_dict, 'image')
+    return (levels, {**layer_dict, 'multiscale': True}, 'image')
+
+
+def open_simulation_group(path):
+    """Open the zarr group of a simulation dataset for reading.
+
+    Parameters
+    ----------
+    path : pathlib.Path
+        Root path of the simulation dataset.
+
+    Returns
+    -------
+    zarr.hierarchy.Group
+        Group of the dataset, opened from its consolidated metadata when
+        it has been consolidated.
+    """
+    if (path / '.zmetadata').exists():
+        return zarr.open_consolidated(path.as_posix(), mode='r')
+    return zarr.open(path.as_posix(), mode='r')
+
+
+def _dataset_arrays(dataset, path):
+    """Arrays of a simulation dataset.
+
+    Parameters
+    ----------
+    dataset : zarr.hierarchy.Group
+        Simulation dataset.
+    path : pathlib.Path
+        Root path of the simulation dataset.
+
+    Returns
+    -------
+    dict of list of dask.array.Array
+        Levels of the pyramid of each array of the dataset by name, a
+        single level for arrays without a pyramid. Arrays shared by all
+        runs are lazily broadcast along the run axis and arrays of a
+        dataset combined from shards are lazily concatenated along the run
+        axis.
+    """
+    if 'shards' not in dataset.attrs:
+        return _run_arrays(dataset)
+
+    shards = [_run_arrays(open_simulation_group(path / shard)) for shard in dataset.attrs['shards']]
+    arrays = {}
+    for name in shards[0]:
+        # Only use the levels every shard has
+        nlevels = min(len(shard[name]) for shard in shards)
+        arrays[name] = [da.concatenate([shard[name][level] for shard in shards], axis=0) for level in range(nlevels)]
+    return arrays
+
+
+def _run_arrays(dataset):
+    """Arrays of a single simulation dataset with one entry for each run.
+
+    Parameters
+    ----------
+    dataset : zarr.hierarchy.Group
+        Simulation dataset, which is not combined from shards.
+
+    Returns
+    -------
+    dict of list of dask.array.Array
+        Levels of the pyramid of each array of the dataset by name, chunked
+        like the stored arrays.
+    """
+    start, stop = dataset.attrs.get('run_range', (0, dataset.attrs['runs']))
+    shared = dataset.attrs.get('shared', [])
+    pyramid = dataset.attrs.get('pyramid', {})
+
+    arrays = {}
+    for name in ['speed', 'wave', 'travel_time']:
+        if name not in dataset:
+            continue
+        levels = [dataset[name]] + [dataset['pyramid'][name][str(level)] for level in range(1, pyramid.get(name, 1))]
+        levels = [da.from_zarr(level) for level in levels]
+        if name in shared:
+            levels = [da.broadcast_to(level, (stop - start,) + level.shape[1:]) for level in levels]
+        arrays[name] = levels
+    return arrays
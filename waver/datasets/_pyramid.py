@@ -0,0 +1,81 @@
+import dask.array as da
+import numpy as np
+import zarr
+from pathlib import Path
+
+
+# Levels are added to a pyramid until the largest spatial axis is at most
+# this many pixels, unless the number of levels is given
+PYRAMID_MIN_SIZE = 64
+
+
+def build_simulation_pyramid(path, nlevels=None, names=('wave', 'speed')):
+    """Build a multiscale pyramid of the arrays of a simulation dataset.
+
+    Each level of the pyramid halves the spatial axes of the level before
+    it by averaging blocks of two pixels along each axis, keeping the run,
+    source and time axes and the axis of the faces of a boundary detector.
+    Levels are stored in the `pyramid` group of the dataset and loaded as
+    multiscale layers, so only the resolution on screen is read when
+    browsing.
+
+    Parameters
+    ----------
+    path : str
+        Root path of the simulation dataset. For a dataset combined from
+        shards a pyramid is built for each shard.
+    nlevels : int, optional
+        Number of levels including the full resolution. If None then levels
+        are added until the largest spatial axis is at most
+        `PYRAMID_MIN_SIZE` pixels.
+    names : tuple of str, optional
+        Names of the arrays to build pyramids of.
+
+    Returns
+    -------
+    dataset : zarr.hierarchy.Group
+        Simulation dataset.
+    """
+    path = Path(path)
+    dataset = zarr.open(path.as_posix(), mode='r+')
+
+    if 'shards' in dataset.attrs:
+        for shard in dataset.attrs['shards']:
+            build_simulation_pyramid(path / shard, nlevels=nlevels, names=names)
+        return dataset
+
+    ndim = len(dataset.attrs['size'])
+    pyramid = dataset.attrs.get('pyramid', {})
+    for name in names:
+        if name not in dataset:
+            continue
+        if f'pyramid/{name}' in dataset:
+            del dataset[f'pyramid/{name}']
+        source = dataset[name]
+        spatial = range(source.ndim - ndim, source.ndim)
+        if name != 'speed' and dataset.attrs.get('boundary', 0) > 0:
+            # The first axis of a boundary detector indexes its faces and
+            # depth, which are not grid axes
+            spatial = spatial[1:]
+
+        level = 1
+        while spatial and (nlevels is None or level < nlevels):
+            if nlevels is None and max(source.shape[axis] for axis in spatial) <= PYRAMID_MIN_SIZE:
+                break
+            factors = {axis: 2 for axis in spatial if source.shape[axis] >= 2}
+            if not factors:
+                break
+
+            coarse = da.coarsen(np.mean, da.from_zarr(source), factors, trim_excess=True).astype(source.dtype)
+            chunks = tuple(min(c, s) for c, s in zip(source.chunks, coarse.shape))
+            target = dataset.zeros(f'pyramid/{name}/{level}', shape=coarse.shape, chunks=chunks,
+                                   dtype=source.dtype, compressor=source.compressor, overwrite=True)
+            da.store(coarse.rechunk(chunks), target, lock=False)
+
+            source = target
+            level += 1
+        pyramid[name] = level
+
+    dataset.attrs['pyramid'] = pyramid
+    zarr.consolidate_metadata(dataset.store)
+    return dataset
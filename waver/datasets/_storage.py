@@ -0,0 +1,240 @@
+import time
+from tempfile import TemporaryDirectory
+from typing import NamedTuple
+
+import numpy as np
+import zarr
+from numcodecs import Blosc, Zstd
+
+
+# Largest number of detector pixels along each axis in a chunk of traces
+TRACE_PIXELS = 8
+
+COMPRESSORS = {
+    'blosc-lz4': lambda: Blosc(cname='lz4', clevel=5, shuffle=Blosc.SHUFFLE),
+    'blosc-lz4-bitshuffle': lambda: Blosc(cname='lz4', clevel=5, shuffle=Blosc.BITSHUFFLE),
+    'blosc-zstd': lambda: Blosc(cname='zstd', clevel=3, shuffle=Blosc.SHUFFLE),
+    'blosc-zstd-bitshuffle': lambda: Blosc(cname='zstd', clevel=3, shuffle=Blosc.BITSHUFFLE),
+    'zstd': lambda: Zstd(level=3),
+}
+
+
+class Storage(NamedTuple):
+    """Storage of the arrays of a simulation dataset.
+
+    Parameters
+    ----------
+    chunks : str or dict, optional
+        Chunking of the arrays of each run. One of 'default', chunks of up
+        to 64 pixels along each axis, 'run', one chunk per run, 'frame',
+        one chunk per time frame of each source, or 'trace', one chunk per
+        block of detector pixels holding their full time series. Can also
+        be a dict of the chunk shape of a run for each array, with the
+        arrays not in it using the default chunks. Arrays are always
+        chunked one run at a time.
+    compressor : str, optional
+        Compressor of the chunks, one of 'default', 'blosc-lz4',
+        'blosc-lz4-bitshuffle', 'blosc-zstd', 'blosc-zstd-bitshuffle',
+        'zstd' or None for no compression. The default is the zarr default
+        compressor.
+    dtype : str, optional
+        Storage data type of the arrays, for example 'float64', 'float32'
+        or 'float16'. Lower precision types shrink the dataset at the cost
+        of quantizing the stored values.
+    """
+    chunks: object='default'
+    compressor: str='default'
+    dtype: str='float64'
+
+    def chunks_for(self, name, shape, ndim):
+        """Chunk shape of an array.
+
+        Parameters
+        ----------
+        name : str
+            Name of the array, for example 'wave', 'travel_time' or 'speed'.
+        shape : tuple of int
+            Shape of the array for a single run, with the axes of the grid
+            last.
+        ndim : int
+            Dimensionality of the grid.
+
+        Returns
+        -------
+        tuple of int
+            Chunk shape of the array including the run axis.
+        """
+        leading = len(shape) - ndim
+        if isinstance(self.chunks, dict):
+            chunks = tuple(self.chunks.get(name, (64,) * len(shape)))
+        elif self.chunks == 'default':
+            chunks = (64,) * len(shape)
+        elif self.chunks == 'run':
+            chunks = tuple(shape)
+        elif self.chunks == 'frame':
+            chunks = (1,) * leading + tuple(shape[leading:])
+        elif self.chunks == 'trace':
+            if name == 'wave':
+                # Full time series, which is the second axis of the wave
+                chunks = (1, shape[1]) + (TRACE_PIXELS,) * ndim
+            else:
+                chunks = tuple(shape)
+        else:
+            raise ValueError(f'Chunks {self.chunks} not recognized, use one of '
+                             "'default', 'run', 'frame', 'trace' or a dict of chunk shapes")
+        return (1,) + tuple(min(c, max(s, 1)) for c, s in zip(chunks, shape))
+
+    def make_compressor(self):
+        """Make the compressor of the chunks.
+
+        Returns
+        -------
+        numcodecs.abc.Codec or str or None
+            Compressor, 'default' to use the zarr default compressor, or
+            None for no compression.
+        """
+        if self.compressor in ('default', None):
+            return self.compressor
+        elif self.compressor in COMPRESSORS:
+            return COMPRESSORS[self.compressor]()
+        else:
+            raise ValueError(f'Compressor {self.compressor} not recognized, use one of '
+                             f"'default', {list(COMPRESSORS)} or None")
+
+    def create(self, group, name, shape, ndim):
+        """Create an empty array for the runs of a dataset.
+
+        Parameters
+        ----------
+        group : zarr.hierarchy.Group
+            Group to create the array in.
+        name : str
+            Name of the array.
+        shape : tuple of int
+            Shape of the array, with the run axis first.
+        ndim : int
+            Dimensionality of the grid.
+
+        Returns
+        -------
+        zarr.core.Array
+            Created array.
+        """
+        return group.zeros(name, shape=shape, chunks=self.chunks_for(name, shape[1:], ndim),
+                           compressor=self.make_compressor(), dtype=self.dtype)
+
+
+# Storage suited to each way datasets are read
+STORAGE_PRESETS = {
+    'default': Storage(),
+    'training': Storage(chunks='run', compressor='blosc-lz4', dtype='float32'),
+    'browsing': Storage(chunks='frame', compressor='blosc-lz4', dtype='float32'),
+    'traces': Storage(chunks='trace', compressor='blosc-zstd', dtype='float32'),
+}
+
+
+def make_storage(storage):
+    """Make a storage from a preset.
+
+    Parameters
+    ----------
+    storage : str or Storage or None
+        Name of a preset, one of 'default', 'training', 'browsing' or
+        'traces', or a storage, which is returned as is. If None then the
+        default storage is used.
+
+    Returns
+    -------
+    Storage
+        Storage.
+    """
+    if storage is None:
+        return STORAGE_PRESETS['default']
+    elif isinstance(storage, Storage):
+        return storage
+    elif storage in STORAGE_PRESETS:
+        return STORAGE_PRESETS[storage]
+    else:
+        raise ValueError(f'Storage {storage} not recognized, use one of {list(STORAGE_PRESETS)} or a Storage')
+
+
+def quantization_error(values, dtype):
+    """Largest error from storing values with a data type.
+
+    Parameters
+    ----------
+    values : np.ndarray
+        Values to store.
+    dtype : str
+        Storage data type.
+
+    Returns
+    -------
+    float
+        Largest absolute error of the stored values relative to the largest
+        absolute value.
+    """
+    values = np.asarray(values, dtype=float)
+    with np.errstate(over='ignore', invalid='ignore'):
+        error = np.max(np.abs(values - values.astype(dtype).astype(float)), initial=0)
+    peak = np.max(np.abs(values), initial=0)
+    return float(error / peak) if peak > 0 else float(error)
+
+
+def benchmark_storage(wave, storages=None):
+    """Benchmark storing the wave of a dataset with different storages.
+
+    Each storage is used to write the wave to a temporary store, which is
+    then read one run at a time, one time frame at a time and one trace at
+    a time.
+
+    Parameters
+    ----------
+    wave : np.ndarray
+        Wave of some runs of a dataset, with shape
+        `(runs, nsources, ntimes) + detector shape`.
+    storages : dict of Storage or str, optional
+        Storages to benchmark by name. If None then all presets are used.
+
+    Returns
+    -------
+    dict of dict
+        For each storage, the write throughput and the read throughput of
+        runs, frames and traces in megabytes per second of uncompressed
+        data, the number of bytes stored and the quantization error.
+    """
+    wave = np.asarray(wave, dtype=float)
+    storages = STORAGE_PRESETS if storages is None else storages
+    ndim = wave.ndim - 3
+
+    # Index of each run, time frame and trace that is read, reading at
+    # most 64 traces of each run
+    npixels = int(np.prod(wave.shape[3:]))
+    patterns = {
+        'run': [(run,) for run in range(wave.shape[0])],
+        'frame': [(run, 0, t) for run in range(wave.shape[0]) for t in range(wave.shape[2])],
+        'trace': [(run, 0, slice(None)) + pixel for run in range(wave.shape[0])
+                  for pixel in list(np.ndindex(*wave.shape[3:]))[::max(1, npixels // 64)]],
+    }
+
+    results = {}
+    for name, storage in storages.items():
+        storage = make_storage(storage)
+        with TemporaryDirectory(suffix='.zarr') as path:
+            array = storage.create(zarr.open(path, mode='w'), 'wave', wave.shape, ndim)
+
+            start = time.perf_counter()
+            for run in range(wave.shape[0]):
+                array[run] = wave[run]
+            results[name] = {'write_mb_per_s': wave.nbytes / 1e6 / (time.perf_counter() - start)}
+
+            for pattern, indices in patterns.items():
+                start = time.perf_counter()
+                for index in indices:
+                    array[index]
+                megabytes = wave[indices[0]].nbytes * len(indices) / 1e6
+                results[name][f'{pattern}_read_mb_per_s'] = megabytes / (time.perf_counter() - start)
+
+            results[name]['nbytes_stored'] = array.nbytes_stored
+            results[name]['quantization_error'] = quantization_error(wave, storage.dtype)
+    return results
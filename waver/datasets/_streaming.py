@@ -0,0 +1,165 @@
+import itertools
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import numpy as np
+
+from ..simulation import run_multiple_sources
+from ..simulation._utils import run_rng
+
+
+class SimulationStream:
+    """Stream of simulations generated on the fly instead of stored.
+
+    Each sample is a simulation with its own random number generator
+    spawned from the seed and the index of the sample, so the sample with
+    a given index is the same however many workers generate the stream and
+    matches the run with that index of a dataset generated with the same
+    seed. Simulations run in background worker processes, with at most
+    `queue_size` of them waiting to be consumed.
+
+    Parameters
+    ----------
+    samples : int, optional
+        Number of samples in the stream. If None then the stream is endless.
+    workers : int, optional
+        Number of worker processes to run simulations in. If None then
+        simulations are run in this process as they are consumed.
+    queue_size : int, optional
+        Largest number of simulations running or waiting to be consumed. If
+        None then twice the number of workers.
+    seed : int, optional
+        Seed for random speed distributions. If None then a seed is drawn.
+    start : int, optional
+        Index of the first sample, for example to resume a stream.
+    ordered : bool, optional
+        If True yield samples in order of their index, otherwise yield them
+        as soon as they complete.
+    kawrgs :
+        run_multiple_sources kwargs.
+    """
+
+    def __init__(self, samples=None, workers=None, queue_size=None, seed=None, start=0, ordered=False, **kawrgs):
+        self.samples = samples
+        self.workers = workers
+        self.queue_size = max(queue_size or 2 * (workers or 1), 1)
+        self.seed = np.random.SeedSequence().entropy if seed is None else seed
+        self.start = start
+        self.ordered = ordered
+        self.kawrgs = {'progress': False, **kawrgs}
+
+        self._samples = 0
+        self._elapsed = 0
+        self._waiting = 0
+
+    def __len__(self):
+        if self.samples is None:
+            raise TypeError('Stream of simulations is endless')
+        return self.samples
+
+    def simulate(self, index):
+        """Run the simulation of a sample.
+
+        Parameters
+        ----------
+        index : int
+            Index of the sample.
+
+        Returns
+        -------
+        speed : np.ndarray
+            Speed of the simulation on the grid.
+        wave : np.ndarray
+            Wave of each source on the detector.
+        """
+        return _simulate(index, self.kawrgs, self.seed)[1:]
+
+    def __iter__(self):
+        """Iterate over the samples of the stream.
+
+        Yields
+        ------
+        speed : np.ndarray
+            Speed of the simulation on the grid.
+        wave : np.ndarray
+            Wave of each source on the detector.
+        """
+        if self.samples is None:
+            indices = itertools.count(self.start)
+        else:
+            indices = iter(range(self.start, self.start + self.samples))
+        last = time.perf_counter()
+
+        if self.workers is None:
+            for index in indices:
+                waited = time.perf_counter()
+                result = self.simulate(index)
+                last = self._record(last, waited)
+                yield result
+            return
+
+        executor = ProcessPoolExecutor(max_workers=self.workers)
+        pending = {}
+        try:
+            while True:
+                # Keep the queue full while the consumer works on a sample
+                for index in itertools.islice(indices, self.queue_size - len(pending)):
+                    pending[index] = executor.submit(_simulate, index, self.kawrgs, self.seed)
+                if not pending:
+                    break
+
+                waited = time.perf_counter()
+                if self.ordered:
+                    future = pending.pop(min(pending))
+                else:
+                    done, _ = wait(pending.values(), return_when=FIRST_COMPLETED)
+                    future = pending.pop(min(index for index, running in pending.items() if running in done))
+                _, speed, wave = future.result()
+                last = self._record(last, waited)
+                yield speed, wave
+        finally:
+            # Do not wait for simulations that will not be consumed
+            for future in pending.values():
+                future.cancel()
+            executor.shutdown(wait=True)
+
+    def _record(self, last, waited):
+        """Record the metrics of a sample and return the current time."""
+        now = time.perf_counter()
+        self._samples += 1
+        self._elapsed += now - last
+        self._waiting += now - waited
+        return now
+
+    @property
+    def metrics(self):
+        """dict: Number of samples yielded, time in seconds spent iterating and waiting for simulations,
+        and simulations per second. Waiting for most of the time means simulations are generated slower
+        than they are consumed."""
+        return {'samples': self._samples, 'elapsed_s': self._elapsed, 'waiting_s': self._waiting,
+                'simulations_per_s': self._samples / self._elapsed if self._elapsed > 0 else 0.0}
+
+
+def _simulate(index, kawrgs, seed):
+    """Run the simulation of a sample of a stream.
+
+    Parameters
+    ----------
+    index : int
+        Index of the sample.
+    kawrgs :
+        run_multiple_sources kwargs.
+    seed : int
+        Seed of the stream.
+
+    Returns
+    -------
+    index : int
+        Index of the sample.
+    speed : np.ndarray
+        Speed of the simulation on the grid.
+    wave : np.ndarray
+        Wave of each source on the detector.
+    """
+    wave, speed = run_multiple_sources(**kawrgs, rng=run_rng(seed, index))
+    return index, speed[0, 0], wave
@@ -1,5 +1,46 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
 from tempfile import TemporaryDirectory
-from waver.datasets import generate_simulation_dataset, load_simulation_dataset
+
+import dask.array as da
+import numpy as np
+import pytest
+from waver import napari_get_reader
+from waver.datasets import (generate_simulation_dataset, load_simulation_dataset, merge_simulation_shards, Storage,
+                            build_simulation_pyramid)
+
+
+sim_params = {
+    'size': (1.6e-3, 1.6e-3),
+    'spacing': 100e-6,
+    'duration': 5e-6,
+    'min_speed': 343,
+    'max_speed': 686,
+    'speed': 'random',
+    'time_step': 50e-9,
+    'pml_thickness': 4,
+    'sources': [{
+        'location': (0.8e-3, 0.8e-3),
+        'period': 5e-6,
+        'ncycles':1,
+    }],
+    'boundary': 1,
+    'edge': 1
+}
+
+# Larger grid with a central source for building pyramids
+pyramid_params = {
+    **sim_params,
+    'size': (3.2e-3, 3.2e-3),
+    'duration': 2e-6,
+    'sources': [{
+        'location': (1.6e-3, 1.6e-3),
+        'period': 5e-6,
+        'ncycles':1,
+    }],
+    'boundary': 0,
+    'edge': None,
+}
 
 
 def test_dataset_generator_and_loader():
@@ -28,4 +69,231 @@ def test_dataset_generator_and_loader():
 
         assert len(dataset) == 2
         assert dataset[0][0].shape == (4, 1, 200, 1, 32)
-        assert dataset[1][0].shape == (4, 1, 1, 32, 32)
\ No newline at end of file
+        assert dataset[1][0].shape == (4, 1, 1, 32, 32)
+
+
+def test_dataset_travel_time():
+    """Test generating and loading a dateset with travel times."""
+    runs = 2
+    sim_params = {
+        'size': (3.2e-3, 3.2e-3),
+        'spacing': 100e-6,
+        'duration': 20e-6,
+        'min_speed': 343,
+        'max_speed': 686,
+        'speed': 686,
+        'time_step': 50e-9,
+        'temporal_downsample': 2,
+        'sources': [{
+            'location': (1.6e-3, 1.6e-3),
+            'period': 5e-6,
+            'ncycles':1,
+        }],
+        'boundary': 1,
+        'edge': 1
+    }
+    with TemporaryDirectory(suffix='.zarr') as path:
+        generate_simulation_dataset(path, runs, outputs=('wave', 'travel_time'), **sim_params)
+        dataset = load_simulation_dataset(path)
+
+        assert [layer[1]['name'] for layer in dataset] == ['wave', 'travel_time', 'speed']
+        assert dataset[1][0].shape == (2, 1, 1, 32)
+        assert dataset[1][0][0, 0, 0, 16] > 0
+
+    with TemporaryDirectory(suffix='.zarr') as path:
+        generate_simulation_dataset(path, runs, outputs=('travel_time',), **sim_params)
+        dataset = load_simulation_dataset(path)
+
+        assert [layer[1]['name'] for layer in dataset] == ['travel_time', 'speed']
+
+
+def test_dataset_workers():
+    """Test generating a dateset with workers matches generating it serially."""
+    runs = 3
+    with TemporaryDirectory(suffix='.zarr') as serial_path, TemporaryDirectory(suffix='.zarr') as path:
+        serial = generate_simulation_dataset(serial_path, runs, seed=0, **sim_params)
+        dataset = generate_simulation_dataset(path, runs, workers=2, seed=0, **sim_params)
+
+        np.testing.assert_array_equal(dataset['speed'][:], serial['speed'][:])
+        np.testing.assert_array_equal(dataset['wave'][:], serial['wave'][:])
+        assert not np.array_equal(dataset['speed'][0], dataset['speed'][1])
+        assert dataset.attrs['seed'] == 0
+
+
+def test_dataset_resume():
+    """Test resuming an interrupted dataset matches an uninterrupted one."""
+    runs = 3
+    with TemporaryDirectory(suffix='.zarr') as path:
+        dataset = generate_simulation_dataset(path, runs, **sim_params)
+        assert dataset['completed'][:].all()
+        expected_speed = dataset['speed'][:]
+        expected_wave = dataset['wave'][:]
+
+        # Interrupt the dataset after the first run
+        dataset['completed'][1:] = False
+        dataset['speed'][1:] = 0
+        dataset['wave'][1:] = 0
+
+        dataset = generate_simulation_dataset(path, runs, resume=True, **sim_params)
+        assert dataset['completed'][:].all()
+        np.testing.assert_array_equal(dataset['speed'][:], expected_speed)
+        np.testing.assert_array_equal(dataset['wave'][:], expected_wave)
+
+        with pytest.raises(ValueError):
+            generate_simulation_dataset(path, runs, resume=True, **{**sim_params, 'duration': 6e-6})
+
+
+def test_dataset_shards():
+    """Test merging dataset shards matches generating the full dataset."""
+    runs = 5
+    with TemporaryDirectory() as root:
+        full = generate_simulation_dataset(os.path.join(root, 'full.zarr'), runs, seed=1, **sim_params)
+
+        # Generate shards in separate processes standing in for nodes
+        ranges = [(3, 5), (0, 2), (2, 3)]
+        shards = [os.path.join(root, f'shard_{start}.zarr') for start, _ in ranges]
+        with ProcessPoolExecutor(max_workers=2) as executor:
+            futures = [executor.submit(generate_simulation_dataset, shard, runs, seed=1, run_range=run_range,
+                                       **sim_params) for shard, run_range in zip(shards, ranges)]
+            [future.result() for future in futures]
+
+        path = os.path.join(root, 'merged.zarr')
+        merge_simulation_shards(path, shards)
+        assert napari_get_reader(path) is load_simulation_dataset
+
+        dataset = load_simulation_dataset(path)
+        assert [layer[1]['name'] for layer in dataset] == ['wave', 'speed']
+        np.testing.assert_array_equal(np.asarray(dataset[0][0]), full['wave'][:])
+        np.testing.assert_array_equal(np.asarray(dataset[1][0]), full['speed'][:])
+
+        with pytest.raises(ValueError):
+            merge_simulation_shards(path, shards[:2])
+
+
+def test_dataset_storage():
+    """Test generating a dateset with a storage preset and lower precision."""
+    runs = 2
+    params = {**sim_params, 'speed': 686}
+    with TemporaryDirectory(suffix='.zarr') as path:
+        reference = generate_simulation_dataset(path, runs, **params)['wave'][:]
+
+    with TemporaryDirectory(suffix='.zarr') as path:
+        storage = Storage(chunks='run', compressor='blosc-zstd', dtype='float16')
+        dataset = generate_simulation_dataset(path, runs, storage=storage, **params)
+
+        assert dataset['wave'].dtype == np.float16
+        assert dataset['wave'].chunks == (1,) + dataset['wave'].shape[1:]
+        assert dataset['wave'].compressor.cname == 'zstd'
+        assert dataset.attrs['storage']['dtype'] == 'float16'
+
+        error = dataset['quantization_error']['wave'][:]
+        assert np.all(error > 0)
+        peak = np.abs(reference).max(axis=tuple(range(1, reference.ndim)))
+        np.testing.assert_array_less(np.abs(dataset['wave'][:] - reference).max(axis=(1, 2, 3, 4)), error * peak + 1e-12)
+
+
+def test_dataset_shared_arrays():
+    """Test arrays identical for all runs are stored once."""
+    runs = 3
+    params = {**sim_params, 'speed': None}
+    with TemporaryDirectory(suffix='.zarr') as path:
+        generate_simulation_dataset(path, runs, seed=0, **sim_params)
+        varying = load_simulation_dataset(path)
+        wave = np.asarray(varying[0][0])
+        speed = np.asarray(varying[1][0])
+
+    # Runs with the same speed are all identical
+    with TemporaryDirectory(suffix='.zarr') as path:
+        dataset = generate_simulation_dataset(path, np.repeat(speed[:1, 0, 0], runs, axis=0), **params)
+        assert dataset.attrs['shared'] == ['speed', 'wave']
+        assert dataset['wave'].shape[0] == 1
+        assert dataset['completed'][:].all()
+
+        layers = load_simulation_dataset(path)
+        assert layers[0][0].shape == (runs,) + dataset['wave'].shape[1:]
+        for run in range(runs):
+            np.testing.assert_array_equal(np.asarray(layers[0][0][run]), wave[0])
+            np.testing.assert_array_equal(np.asarray(layers[1][0][run]), speed[0])
+
+    # Runs with different speeds are stored separately
+    with TemporaryDirectory(suffix='.zarr') as path:
+        dataset = generate_simulation_dataset(path, speed[:, 0, 0], **params)
+        assert dataset.attrs['shared'] == []
+        assert dataset['wave'].shape[0] == runs
+
+
+def test_dataset_statistics():
+    """Test datasets store statistics and load lazily."""
+    runs = 3
+    params = {**sim_params, 'boundary': 0, 'edge': None}
+    with TemporaryDirectory() as root:
+        path = os.path.join(root, 'full.zarr')
+        dataset = generate_simulation_dataset(path, runs, seed=2, storage='browsing', **params)
+        wave = dataset['wave'][:].astype(float)
+        assert os.path.exists(os.path.join(path, '.zmetadata'))
+
+        statistics = dataset.attrs['statistics']['wave']
+        assert statistics['nruns'] == runs
+        np.testing.assert_allclose(statistics['min'], wave.min(), rtol=1e-3)
+        np.testing.assert_allclose(statistics['max'], wave.max(), rtol=1e-3)
+        median = np.mean([np.percentile(run, 50) for run in wave])
+        np.testing.assert_allclose(statistics['percentiles']['50'], median, rtol=1e-3, atol=1e-6)
+
+        layers = load_simulation_dataset(path)
+        assert isinstance(layers[0][0], da.Array)
+        assert layers[0][0].chunksize == dataset['wave'].chunks
+        clim = max(statistics['max'], -statistics['min']) / 3**(wave.ndim - 1)
+        assert layers[0][1]['contrast_limits'] == [-clim, clim]
+
+        # Statistics of shards combine to those of the full dataset
+        shards = [os.path.join(root, f'shard_{start}.zarr') for start in range(runs)]
+        for start, shard in enumerate(shards):
+            generate_simulation_dataset(shard, runs, seed=2, storage='browsing', run_range=(start, start + 1),
+                                        **params)
+        merged = merge_simulation_shards(os.path.join(root, 'merged.zarr'), shards)
+        merged_statistics = merged.attrs['statistics']['wave']
+        assert merged_statistics['nruns'] == runs
+        assert merged_statistics['min'] == statistics['min']
+        assert merged_statistics['max'] == statistics['max']
+        np.testing.assert_allclose(merged_statistics['percentiles']['50'], statistics['percentiles']['50'])
+
+
+def test_dataset_pyramid():
+    """Test building and loading multiscale pyramids of a dataset."""
+    runs = 2
+    with TemporaryDirectory(suffix='.zarr') as path:
+        generate_simulation_dataset(path, runs, seed=0, **pyramid_params)
+        dataset = build_simulation_pyramid(path, nlevels=3)
+        assert dataset.attrs['pyramid'] == {'wave': 3, 'speed': 3}
+
+        layers = load_simulation_dataset(path)
+        assert [layer[1].get('multiscale', False) for layer in layers] == [True, True]
+        wave_levels = layers[0][0]
+        assert [level.shape[-2:] for level in wave_levels] == [(32, 32), (16, 16), (8, 8)]
+        assert [level.shape[:-2] for level in wave_levels] == [dataset['wave'].shape[:-2]] * 3
+
+        wave = dataset['wave'][:]
+        expected = wave.reshape(wave.shape[:-2] + (16, 2, 16, 2)).mean(axis=(-3, -1))
+        np.testing.assert_allclose(np.asarray(wave_levels[1]), expected)
+        assert layers[1][0][2].shape == (runs, 1, 1, 8, 8)
+
+
+def test_dataset_pyramid_boundary():
+    """Test pyramids of boundary detectors keep the axis of their faces."""
+    params = {**pyramid_params, 'speed': 686, 'boundary': 1}
+    with TemporaryDirectory(suffix='.zarr') as path:
+        generate_simulation_dataset(path, 1, **params)
+        dataset = build_simulation_pyramid(path, nlevels=2)
+
+        wave = dataset['wave'][:]
+        assert wave.shape[-2:] == (4, 32)
+        coarse = dataset['pyramid/wave/1'][:]
+        np.testing.assert_allclose(coarse, wave.reshape(wave.shape[:-1] + (16, 2)).mean(axis=-1))
+        assert dataset['pyramid/speed/1'].shape[-2:] == (16, 16)
+
+    with TemporaryDirectory(suffix='.zarr') as path:
+        generate_simulation_dataset(path, 1, **{**params, 'size': (3.2e-3,), 'sources': [{
+            'location': (1.6e-3,), 'period': 5e-6, 'ncycles': 1}]})
+        dataset = build_simulation_pyramid(path, nlevels=2)
+        assert dataset.attrs['pyramid']['wave'] == 1
+        assert 'pyramid/wave/1' not in dataset
@@ -0,0 +1,50 @@
+import numpy as np
+import pytest
+
+from waver.datasets._storage import Storage, benchmark_storage, make_storage, quantization_error
+
+
+@pytest.mark.parametrize("chunks, expected", [
+    ('default', (1, 3, 64, 32, 32)),
+    ('run', (1, 3, 100, 32, 32)),
+    ('frame', (1, 1, 1, 32, 32)),
+    ('trace', (1, 1, 100, 8, 8)),
+    ({'wave': (1, 10, 16, 16)}, (1, 1, 10, 16, 16)),
+])
+def test_storage_chunks(chunks, expected):
+    """Test chunking the wave of a dataset."""
+    storage = Storage(chunks=chunks)
+
+    assert storage.chunks_for('wave', (3, 100, 32, 32), 2) == expected
+
+
+def test_storage_presets():
+    """Test making storages from presets."""
+    assert make_storage(None) == Storage()
+    assert make_storage('training').chunks_for('speed', (1, 1, 32, 32), 2) == (1, 1, 1, 32, 32)
+
+    with pytest.raises(ValueError):
+        make_storage('unknown')
+    with pytest.raises(ValueError):
+        Storage(compressor='unknown').make_compressor()
+
+
+def test_quantization_error():
+    """Test quantization error of storage data types."""
+    values = np.linspace(-1, 1, 101)
+
+    assert quantization_error(values, 'float64') == 0
+    assert 0 < quantization_error(values, 'float32') < 1e-7
+    assert 1e-5 < quantization_error(values, 'float16') < 1e-3
+
+
+def test_benchmark_storage():
+    """Test benchmarking storages."""
+    wave = np.random.random((2, 1, 10, 8, 8))
+    results = benchmark_storage(wave, {'run': Storage(chunks='run'), 'half': Storage(dtype='float16')})
+
+    assert list(results) == ['run', 'half']
+    assert set(results['run']) == {'write_mb_per_s', 'run_read_mb_per_s', 'frame_read_mb_per_s',
+                                   'trace_read_mb_per_s', 'nbytes_stored', 'quantization_error'}
+    assert results['half']['nbytes_stored'] < results['run']['nbytes_stored']
+    assert results['half']['quantization_error'] > 0
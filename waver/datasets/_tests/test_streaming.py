@@ -0,0 +1,53 @@
+from itertools import islice
+from tempfile import TemporaryDirectory
+
+import numpy as np
+from waver.datasets import generate_simulation_dataset, SimulationStream
+
+
+sim_params = {
+    'size': (1.6e-3, 1.6e-3),
+    'spacing': 100e-6,
+    'duration': 5e-6,
+    'min_speed': 343,
+    'max_speed': 686,
+    'speed': 'random',
+    'time_step': 50e-9,
+    'pml_thickness': 4,
+    'sources': [{
+        'location': (0.8e-3, 0.8e-3),
+        'period': 5e-6,
+        'ncycles':1,
+    }],
+    'boundary': 1,
+    'edge': 1
+}
+
+
+def test_simulation_stream():
+    """Test streamed simulations do not depend on the workers and match a dataset."""
+    samples = 3
+    serial = list(SimulationStream(samples, seed=0, **sim_params))
+    assert len(serial) == samples
+    assert not np.array_equal(serial[0][0], serial[1][0])
+
+    stream = SimulationStream(samples, workers=2, queue_size=2, seed=0, ordered=True, **sim_params)
+    for (speed, wave), (expected_speed, expected_wave) in zip(stream, serial):
+        np.testing.assert_array_equal(speed, expected_speed)
+        np.testing.assert_array_equal(wave, expected_wave)
+    assert stream.metrics['samples'] == samples
+    assert stream.metrics['simulations_per_s'] > 0
+
+    # Samples completed out of order are the same samples
+    unordered = list(SimulationStream(samples, workers=2, seed=0, **sim_params))
+    assert sorted(speed.sum() for speed, _ in unordered) == sorted(speed.sum() for speed, _ in serial)
+
+    with TemporaryDirectory(suffix='.zarr') as path:
+        dataset = generate_simulation_dataset(path, samples, seed=0, **sim_params)
+        np.testing.assert_array_equal(dataset['wave'][2], serial[2][1])
+        np.testing.assert_array_equal(SimulationStream(seed=0, **sim_params).simulate(2)[0], serial[2][0])
+
+    # Endless streams stop when the consumer does
+    endless = SimulationStream(workers=1, seed=0, start=1, **sim_params)
+    speed, wave = next(islice(endless, 1, None))
+    np.testing.assert_array_equal(wave, serial[2][1])
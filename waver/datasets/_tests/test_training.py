@@ -0,0 +1,93 @@
+import os
+from tempfile import TemporaryDirectory
+
+import numpy as np
+import pytest
+from waver.datasets import (generate_simulation_dataset, merge_simulation_shards, TrainingLoader,
+                            benchmark_training_loader)
+
+
+sim_params = {
+    'size': (1.6e-3, 1.6e-3),
+    'spacing': 100e-6,
+    'duration': 5e-6,
+    'min_speed': 343,
+    'max_speed': 686,
+    'speed': 'random',
+    'time_step': 50e-9,
+    'pml_thickness': 4,
+    'sources': [{
+        'location': (0.8e-3, 0.8e-3),
+        'period': 5e-6,
+        'ncycles':1,
+    }],
+    'boundary': 1,
+    'edge': 1
+}
+
+
+@pytest.mark.parametrize('cache_chunks', [0, 4])
+def test_training_loader(cache_chunks):
+    """Test the training loader reads every sample once per epoch."""
+    runs = 3
+    with TemporaryDirectory(suffix='.zarr') as path:
+        dataset = generate_simulation_dataset(path, runs, seed=0, storage='training', **sim_params)
+        speed = dataset['speed'][:]
+        wave = dataset['wave'][:]
+
+        loader = TrainingLoader(path, 'frame', buffer_chunks=1, workers=2, cache_chunks=cache_chunks, seed=0)
+        assert len(loader) == runs * wave.shape[2]
+
+        # Samples of a chunk are read together
+        order = loader.order()
+        np.testing.assert_array_equal(np.sort(order), np.arange(len(loader)))
+        runs_read = order // wave.shape[2]
+        assert np.count_nonzero(np.diff(runs_read)) == runs - 1
+
+        samples = list(loader)
+        assert len(samples) == len(loader)
+        seen = set()
+        for sample_speed, sample_wave in samples:
+            run = next(run for run in range(runs) if np.array_equal(sample_speed, speed[run, 0, 0]))
+            frame = next(t for t in range(wave.shape[2]) if np.array_equal(sample_wave, wave[run, 0, t])
+                         and (run, t) not in seen)
+            seen.add((run, frame))
+        assert len(seen) == len(loader)
+
+        metrics = loader.metrics
+        assert metrics['samples'] == len(loader)
+        assert metrics['samples_per_s'] > 0
+        if cache_chunks:
+            # Threads may both miss a chunk they read at the same time
+            assert metrics['cache_hits'] + metrics['cache_misses'] == len(loader)
+            assert metrics['cache_misses'] >= runs
+            assert metrics['cache_hits'] > 0
+
+        results = benchmark_training_loader(path, 'source', workers=2)
+        assert set(results) == {'naive_samples_per_s', 'loader_samples_per_s', 'speedup'}
+
+
+def test_training_loader_shards():
+    """Test the training loader reads shards and shared arrays."""
+    runs = 3
+    with TemporaryDirectory() as root:
+        full = generate_simulation_dataset(os.path.join(root, 'full.zarr'), runs, seed=1, **sim_params)
+        shards = [os.path.join(root, f'shard_{start}.zarr') for start in (0, 2)]
+        for shard, run_range in zip(shards, [(0, 2), (2, 3)]):
+            generate_simulation_dataset(shard, runs, seed=1, run_range=run_range, **sim_params)
+        path = os.path.join(root, 'merged.zarr')
+        merge_simulation_shards(path, shards)
+
+        loader = TrainingLoader(path, 'source', shuffle=False)
+        for run, (speed, wave) in enumerate(loader):
+            np.testing.assert_array_equal(speed, full['speed'][run, 0, 0])
+            np.testing.assert_array_equal(wave, full['wave'][run, 0])
+
+        path = os.path.join(root, 'shared.zarr')
+        shared = generate_simulation_dataset(path, runs, **{**sim_params, 'speed': 686})
+        assert shared.attrs['shared'] == ['speed', 'wave']
+        samples = list(TrainingLoader(path, 'run', cache_chunks=2))
+        assert len(samples) == runs
+        for speed, wave in samples:
+            np.testing.assert_array_equal(speed, shared['speed'][0, 0, 0])
+            np.testing.assert_array_equal(wave, shared['wave'][0])
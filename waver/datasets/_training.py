@@ -0,0 +1,236 @@
+import bisect
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from pathlib import Path
+
+import numpy as np
+
+from ._loader import open_simulation_group
+
+
+# Number of leading axes of the wave indexed by each kind of sample
+SAMPLE_AXES = {'run': 1, 'source': 2, 'frame': 3}
+
+
+class TrainingLoader:
+    """Iterate over the samples of a simulation dataset for training.
+
+    Each sample is the speed of a run and the wave of that run, of one of
+    its sources, or of one time frame of one of its sources. Samples are
+    read ahead of the training loop by a pool of threads. Shuffling is
+    aware of the chunks of the stored wave: the order of the chunks is
+    shuffled and samples are then shuffled within a buffer of several
+    chunks, so reads stay close together on disk. Decoded chunks can be
+    kept in memory so samples from the same chunk only decode it once.
+
+    Parameters
+    ----------
+    path : str
+        Root path of the simulation dataset, which can be combined from
+        shards.
+    sample : str, optional
+        Kind of sample, one of 'run', 'source' or 'frame'.
+    shuffle : bool, optional
+        Shuffle the samples at each epoch.
+    buffer_chunks : int, optional
+        Number of chunks of samples shuffled together.
+    prefetch : int, optional
+        Number of samples read ahead of the training loop.
+    workers : int, optional
+        Number of threads reading samples.
+    cache_chunks : int, optional
+        Number of decoded chunks kept in memory, least recently used first.
+        If zero then samples are read directly.
+    seed : int, optional
+        Seed for shuffling.
+    """
+
+    def __init__(self, path, sample='source', *, shuffle=True, buffer_chunks=16, prefetch=8, workers=4,
+                 cache_chunks=0, seed=None):
+        if sample not in SAMPLE_AXES:
+            raise ValueError(f'Sample {sample} not recognized, use one of {list(SAMPLE_AXES)}')
+        path = Path(path)
+        dataset = open_simulation_group(path)
+        if 'shards' in dataset.attrs:
+            self._groups = [open_simulation_group(path / shard) for shard in dataset.attrs['shards']]
+        else:
+            self._groups = [dataset]
+        self._starts = [group.attrs.get('run_range', (0, group.attrs['runs']))[0] for group in self._groups]
+        self._shared = [group.attrs.get('shared', []) for group in self._groups]
+
+        wave = self._groups[0]['wave']
+        self.sample = sample
+        self.shuffle = shuffle
+        self.buffer_chunks = buffer_chunks
+        self.prefetch = max(prefetch, 1)
+        self.workers = max(workers, 1)
+        self.cache_chunks = cache_chunks
+        self._depth = SAMPLE_AXES[sample]
+        self._counts = (dataset.attrs['runs'],) + wave.shape[1:self._depth]
+        self._chunks = wave.chunks[:self._depth]
+        self._rng = np.random.default_rng(seed)
+
+        if cache_chunks:
+            self._read_chunk = lru_cache(maxsize=cache_chunks)(self._read_chunk)
+            self._read_speed = lru_cache(maxsize=cache_chunks)(self._read_speed)
+
+        self._lock = threading.Lock()
+        self._samples = 0
+        self._nbytes = 0
+        self._elapsed = 0
+        self._waiting = 0
+
+    def __len__(self):
+        return int(np.prod(self._counts))
+
+    def __iter__(self):
+        """Iterate over one epoch of samples.
+
+        Yields
+        ------
+        speed : np.ndarray
+            Speed of the run on the grid.
+        wave : np.ndarray
+            Wave of the sample on the detector.
+        """
+        order = self.order()
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            pending = deque()
+            for index in order:
+                pending.append(executor.submit(self.load, index))
+                if len(pending) >= self.prefetch:
+                    yield self._collect(pending.popleft(), start)
+                    start = time.perf_counter()
+            while pending:
+                yield self._collect(pending.popleft(), start)
+                start = time.perf_counter()
+
+    def _collect(self, future, start):
+        """Wait for a sample and record its metrics."""
+        waited = time.perf_counter()
+        speed, wave = future.result()
+        now = time.perf_counter()
+        with self._lock:
+            self._samples += 1
+            self._nbytes += speed.nbytes + wave.nbytes
+            self._waiting += now - waited
+            self._elapsed += now - start
+        return speed, wave
+
+    def order(self):
+        """Order of the samples of an epoch.
+
+        Returns
+        -------
+        np.ndarray
+            Flat index of each sample in the order they are read.
+        """
+        indices = np.arange(len(self))
+        if not self.shuffle:
+            return indices
+
+        # Number the chunk of each sample and shuffle the order of the chunks
+        position = np.stack(np.unravel_index(indices, self._counts)) // np.reshape(self._chunks, (-1, 1))
+        _, chunk = np.unique(position, axis=1, return_inverse=True)
+        chunk = np.ravel(chunk)
+        rank = np.argsort(self._rng.permutation(chunk.max() + 1))[chunk]
+
+        # Shuffle samples within buffers of several consecutive chunks
+        return indices[np.lexsort((self._rng.random(len(indices)), rank // max(self.buffer_chunks, 1)))]
+
+    def load(self, index):
+        """Read a sample.
+
+        Parameters
+        ----------
+        index : int
+            Flat index of the sample.
+
+        Returns
+        -------
+        speed : np.ndarray
+            Speed of the run on the grid.
+        wave : np.ndarray
+            Wave of the sample on the detector.
+        """
+        run, *rest = (int(i) for i in np.unravel_index(index, self._counts))
+        shard = bisect.bisect_right(self._starts, run) - 1
+        local_run = run - self._starts[shard]
+        speed_run = 0 if 'speed' in self._shared[shard] else local_run
+        wave_run = 0 if 'wave' in self._shared[shard] else local_run
+
+        speed = self._read_speed(shard, speed_run)
+        if not self.cache_chunks:
+            return speed, self._groups[shard]['wave'][(wave_run,) + tuple(rest)]
+
+        chunk = tuple(i // c for i, c in zip(rest, self._chunks[1:]))
+        offset = tuple(i - k * c for i, k, c in zip(rest, chunk, self._chunks[1:]))
+        return speed, self._read_chunk(shard, wave_run, chunk)[offset]
+
+    def _read_speed(self, shard, run):
+        """Read the speed of a run of a shard on the grid."""
+        return self._groups[shard]['speed'][run, 0, 0]
+
+    def _read_chunk(self, shard, run, chunk):
+        """Read the wave of a chunk of a run of a shard along the axes of the samples."""
+        index = (run,) + tuple(slice(k * c, (k + 1) * c) for k, c in zip(chunk, self._chunks[1:]))
+        return self._groups[shard]['wave'][index]
+
+    @property
+    def metrics(self):
+        """dict: Number of samples and bytes read, time in seconds spent iterating and waiting for
+        samples, throughput in samples and megabytes per second, and any cache hits and misses."""
+        with self._lock:
+            metrics = {'samples': self._samples, 'nbytes': self._nbytes, 'elapsed_s': self._elapsed,
+                       'waiting_s': self._waiting,
+                       'samples_per_s': self._samples / self._elapsed if self._elapsed > 0 else 0.0,
+                       'mb_per_s': self._nbytes / 1e6 / self._elapsed if self._elapsed > 0 else 0.0}
+        if self.cache_chunks:
+            info = self._read_chunk.cache_info()
+            metrics.update({'cache_hits': info.hits, 'cache_misses': info.misses})
+        return metrics
+
+
+def benchmark_training_loader(path, sample='source', nsamples=None, **kwargs):
+    """Benchmark a training loader against reading samples in random order.
+
+    Parameters
+    ----------
+    path : str
+        Root path of the simulation dataset.
+    sample : str, optional
+        Kind of sample, one of 'run', 'source' or 'frame'.
+    nsamples : int, optional
+        Number of samples read by each method. If None then all samples
+        are read.
+    kwargs :
+        TrainingLoader kwargs.
+
+    Returns
+    -------
+    dict
+        Throughput in samples per second of reading samples one at a time
+        in random order, of the training loader, and the speedup of the
+        training loader.
+    """
+    naive = TrainingLoader(path, sample, shuffle=False, **{**kwargs, 'cache_chunks': 0})
+    nsamples = len(naive) if nsamples is None else min(nsamples, len(naive))
+
+    start = time.perf_counter()
+    for index in np.random.default_rng(kwargs.get('seed')).permutation(len(naive))[:nsamples]:
+        naive.load(index)
+    naive_rate = nsamples / (time.perf_counter() - start)
+
+    loader = TrainingLoader(path, sample, **kwargs)
+    start = time.perf_counter()
+    for count, _ in enumerate(loader, start=1):
+        if count >= nsamples:
+            break
+    loader_rate = nsamples / (time.perf_counter() - start)
+
+    return {'naive_samples_per_s': naive_rate, 'loader_samples_per_s': loader_rate,
+            'speedup': loader_rate / naive_rate}
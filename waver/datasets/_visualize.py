@@ -1,6 +1,4 @@
-import napari
 import numpy as np
-from napari.utils import Colormap
 
 from ..simulation import run_multiple_sources
 
@@ -13,6 +11,9 @@ def run_and_visualize(**kawrgs):
     kawrgs :
         run_multiple_sources kwargs.
     """
+    import napari
+    from napari.utils import Colormap
+
     wave, speed = run_multiple_sources(**kawrgs)
 
     clim = np.percentile(wave, 99)
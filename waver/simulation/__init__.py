@@ -1,2 +1,8 @@
 from .simulation import Simulation
-from ._convenience import run_single_source, run_multiple_sources
\ No newline at end of file
+from ._cache import ResultCache
+from ._convenience import (run_single_source, run_multiple_sources, run_encoded_sources, run_travel_times,
+                           run_reverse_time_migration)
+from ._encoding import decode_sources, encoding_crosstalk
+from ._misfit import l2_misfit
+from ._reducers import Reducer, PeakAmplitude, RMSAmplitude, FirstArrival, TimeOfMax, Spectrum
+from ._utils import generate_grid_speeds
@@ -0,0 +1,197 @@
+import hashlib
+import os
+from pathlib import Path
+
+import numpy as np
+
+
+# Version of the format of cached results, increase when it changes so that
+# old results are not read
+CACHE_FORMAT = 1
+
+# Version of the solver, increase when WaveEquation, the injection of
+# sources or anything else that changes simulated results changes, so that
+# results cached by an older solver are not read. The package version is
+# not enough as it is "unknown" in a source checkout.
+SOLVER_VERSION = 1
+
+
+def hash_inputs(*values):
+    """Hash the inputs of a simulation.
+
+    Parameters
+    ----------
+    *values :
+        Inputs to hash, which can be arrays, named tuples, dicts, lists,
+        tuples, strings, numbers or None, nested in any way.
+
+    Returns
+    -------
+    str
+        Hexadecimal SHA-256 digest of the inputs.
+    """
+    digest = hashlib.sha256()
+
+    def update(value):
+        if isinstance(value, np.ndarray):
+            value = np.ascontiguousarray(value)
+            digest.update(f'ndarray:{value.dtype.str}:{value.shape}:'.encode())
+            digest.update(value.tobytes())
+        elif isinstance(value, tuple) and hasattr(value, '_fields'):
+            digest.update(f'{type(value).__name__}:{len(value)}:'.encode())
+            for field, item in zip(value._fields, value):
+                digest.update(f'{field}='.encode())
+                update(item)
+        elif isinstance(value, (list, tuple)):
+            digest.update(f'{type(value).__name__}:{len(value)}:'.encode())
+            for item in value:
+                update(item)
+        elif isinstance(value, dict):
+            digest.update(f'dict:{len(value)}:'.encode())
+            for key in sorted(value):
+                digest.update(f'{key}='.encode())
+                update(value[key])
+        elif isinstance(value, np.generic):
+            update(value.item())
+        elif isinstance(value, (float, int, str, bool)) or value is None:
+            digest.update(f'{type(value).__name__}:{value!r};'.encode())
+        else:
+            raise TypeError(f'Can not hash value of type {type(value).__name__}')
+
+    update(values)
+    return digest.hexdigest()
+
+
+class ResultCache:
+    """Cache of simulation results on disk, addressed by their inputs.
+
+    Results are stored in a directory, one file for each key. When the
+    cache grows above its size limit the least recently used results are
+    removed.
+
+    Parameters
+    ----------
+    path : str
+        Directory where results are stored, created if it does not exist.
+    max_bytes : int, optional
+        Largest total size of the stored results in bytes. If None the
+        cache is not limited.
+    """
+
+    def __init__(self, path, max_bytes=None):
+        self.path = Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, *values):
+        """Key of a result from the inputs it depends on.
+
+        The key also depends on the cache format and the solver version.
+
+        Parameters
+        ----------
+        *values :
+            Inputs of the result, see `hash_inputs`.
+
+        Returns
+        -------
+        str
+            Key of the result.
+        """
+        return hash_inputs(CACHE_FORMAT, SOLVER_VERSION, *values)
+
+    def _file(self, key):
+        return self.path / f'{key}.npz'
+
+    def get(self, key):
+        """Get a stored result.
+
+        Parameters
+        ----------
+        key : str
+            Key of the result.
+
+        Returns
+        -------
+        dict of np.ndarray or None
+            Arrays of the result, or None if it is not stored.
+        """
+        file = self._file(key)
+        try:
+            with np.load(file) as data:
+                result = {name: data[name] for name in data.files}
+        except (FileNotFoundError, OSError, ValueError):
+            self.misses += 1
+            return None
+
+        # Mark the result as recently used
+        try:
+            os.utime(file)
+        except FileNotFoundError:
+            pass
+        self.hits += 1
+        return result
+
+    def put(self, key, **arrays):
+        """Store a result.
+
+        Parameters
+        ----------
+        key : str
+            Key of the result.
+        **arrays : np.ndarray
+            Arrays of the result by name.
+        """
+        # Write to a temporary file first so a result is never partially
+        # written, even with several processes sharing the cache
+        file = self._file(key)
+        temporary = file.with_name(f'{file.name}.{os.getpid()}.tmp')
+        with open(temporary, 'wb') as f:
+            np.savez(f, **arrays)
+        os.replace(temporary, file)
+        self.evict()
+
+    def evict(self):
+        """Remove the least recently used results until the cache fits in its size limit."""
+        if self.max_bytes is None:
+            return
+        entries = sorted(self._entries(), key=lambda entry: entry[1].st_mtime)
+        total = sum(stat.st_size for _, stat in entries)
+        for path, stat in entries:
+            if total <= self.max_bytes:
+                break
+            total -= stat.st_size
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def clear(self):
+        """Remove all stored results and reset the statistics."""
+        for path, _ in self._entries():
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+        self.hits = 0
+        self.misses = 0
+
+    def _entries(self):
+        """Path and status of each stored result, skipping results removed by another process."""
+        entries = []
+        for entry in os.scandir(self.path):
+            if entry.name.endswith('.npz'):
+                try:
+                    entries.append((entry.path, entry.stat()))
+                except FileNotFoundError:
+                    pass
+        return entries
+
+    @property
+    def stats(self):
+        """dict: Number of hits and misses, number of stored results and their size in bytes."""
+        entries = self._entries()
+        return {'hits': self.hits, 'misses': self.misses, 'entries': len(entries),
+                'nbytes': sum(stat.st_size for _, stat in entries)}
@@ -0,0 +1,131 @@
+import numpy as np
+from scipy.special import comb
+
+
+def max_reversible_steps(ncheckpoints, nrepetitions):
+    """Largest number of steps that can be reversed with checkpointing.
+
+    Parameters
+    ----------
+    ncheckpoints : int
+        Number of checkpoints that can be stored at once, including the
+        checkpoint of the initial state.
+    nrepetitions : int
+        Largest number of times any step is recomputed.
+
+    Returns
+    -------
+    int
+        Largest number of steps, the binomial coefficient
+        `(ncheckpoints + nrepetitions)! / (ncheckpoints! nrepetitions!)`.
+    """
+    return int(comb(ncheckpoints + nrepetitions, ncheckpoints, exact=True))
+
+
+def checkpoint_number(nsteps, nbytes, memory=None):
+    """Number of checkpoints to use when reversing a simulation.
+
+    Parameters
+    ----------
+    nsteps : int
+        Number of steps to reverse.
+    nbytes : int
+        Size of one checkpoint in bytes.
+    memory : int, optional
+        Memory budget for checkpoints in bytes. If None then enough
+        checkpoints are used to recompute each step about `log2(nsteps)`
+        times.
+
+    Returns
+    -------
+    int
+        Number of checkpoints, between one and the number of steps.
+    """
+    if memory is None:
+        ncheckpoints = int(np.ceil(np.log2(max(nsteps, 2))))
+    else:
+        ncheckpoints = int(memory // nbytes)
+        if ncheckpoints < 1:
+            raise ValueError(f'Memory budget of {memory} bytes is smaller than one checkpoint of {nbytes} bytes')
+    return min(ncheckpoints, nsteps)
+
+
+def reverse_steps(nsteps, ncheckpoints, *, advance, reverse, snapshot, restore):
+    """Visit the steps of a simulation in reverse order using checkpoints.
+
+    Only `ncheckpoints` states are stored at once, and the states in between
+    are recomputed from the closest checkpoint on demand. Checkpoints are
+    placed with the binomial schedule of the revolve algorithm, which
+    minimizes the number of recomputed steps for the number of checkpoints.
+    The first steps taken always advance through the whole simulation once,
+    so any output of the simulation is complete before the first step is
+    reversed.
+
+    Parameters
+    ----------
+    nsteps : int
+        Number of steps of the simulation.
+    ncheckpoints : int
+        Number of states that can be stored at once, including the initial
+        state.
+    advance : callable
+        Function taking the index of a step that advances the simulation by
+        that step.
+    reverse : callable
+        Function taking the index of a step that is called in reverse order
+        of the steps, when the simulation is in the state before that step.
+    snapshot : callable
+        Function returning a copy of the state of the simulation.
+    restore : callable
+        Function taking a copy of the state that restores the simulation to
+        it.
+
+    Returns
+    -------
+    int
+        Number of steps advanced, including recomputed steps.
+    """
+    if ncheckpoints < 1:
+        raise ValueError(f'At least one checkpoint is required, got {ncheckpoints}')
+
+    checkpoints = {}
+    nadvanced = 0
+
+    def advance_to(current, step):
+        nonlocal nadvanced
+        for index in range(current, step):
+            advance(index)
+        nadvanced += step - current
+
+    def reverse_segment(start, end, ncheckpoints):
+        # Simulation is in the state at start, which is checkpointed
+        nsteps = end - start
+        if nsteps == 1:
+            reverse(start)
+        elif ncheckpoints == 1:
+            for step in range(end - 1, start - 1, -1):
+                advance_to(start, step)
+                reverse(step)
+                restore(checkpoints[start])
+        else:
+            # Split the segment at the first point that lets both parts be
+            # reversed with the fewest repetitions
+            nrepetitions = 1
+            while max_reversible_steps(ncheckpoints, nrepetitions) < nsteps:
+                nrepetitions += 1
+            split = nsteps - max_reversible_steps(ncheckpoints - 1, nrepetitions)
+            if nrepetitions > 1:
+                split = max(split, max_reversible_steps(ncheckpoints, nrepetitions - 2))
+            middle = start + max(split, 1)
+
+            advance_to(start, middle)
+            checkpoints[middle] = snapshot()
+            reverse_segment(middle, end, ncheckpoints - 1)
+            del checkpoints[middle]
+            restore(checkpoints[start])
+            reverse_segment(start, middle, ncheckpoints)
+
+    if nsteps > 0:
+        checkpoints[0] = snapshot()
+        reverse_segment(0, nsteps, min(ncheckpoints, nsteps))
+    return nadvanced
@@ -2,13 +2,18 @@ import numpy as np
 from tqdm import tqdm
 # from napari.qt import progress as tqdm
 
-from ._utils import generate_grid_speed
+from .. import __version__
+from ._cache import ResultCache
+from ._encoding import make_encoding_codes
+from ._source import Source
+from ._utils import generate_grid_speed, location_to_index
 from .simulation import Simulation
 
 
 def run_single_source(size, spacing, location, period, duration, max_speed, time_step=None, pml_thickness=20,
                    speed=None, min_speed=0, spatial_downsample=1, temporal_downsample=1,
-                   boundary=0, edge=None, ncycles=1, phase=0, progress=True, leave=False):
+                   boundary=0, edge=None, ncycles=1, phase=0, amplitude=1, waveform='sine', end_period=None,
+                   samples=None, analytic=False, progress=True, leave=False, rng=None, cache=None):
     """Convenience method to run a single simulation with a single source.
 
     Parameters
@@ -63,10 +68,36 @@ def run_single_source(size, spacing, location, period, duration, max_speed, time
         it will only run for ncycles.
     phase : float
         Phase offset of the source in radians.
+    amplitude : float, optional
+        Amplitude of the source.
+    waveform : str, optional
+        Temporal profile of the source, one of 'sine', 'ricker', 'gaussian',
+        'chirp' or 'array'. See `Simulation.add_source`.
+    end_period : float, optional
+        Period at the end of a chirp in seconds.
+    samples : array, optional
+        Values of an 'array' source at each time step.
+    analytic : bool, optional
+        If True and the simulation supports it, compute the detected wave
+        from the Green's function of the wave equation instead of time
+        stepping. This requires a uniform speed, a perfectly matched layer
+        at least 20 pixels and half a wavelength thick, waves spanning at
+        least 12 pixels and, in 2D and 3D, a detector at least 2 pixels away
+        from the sources, so the wave is within 20% of the peak of the wave
+        from time stepping. Otherwise the simulation is time stepped. See
+        `Simulation.supports_analytic`.
     progress : bool, optional
         Show progress bar or not.
     leave : bool, optional
         Leave progress bar or not.
+    rng : np.random.Generator, optional
+        Random number generator used to generate a random speed
+        distribution. If None then the global `np.random` state is used.
+    cache : str or ResultCache, optional
+        Cache of results, or the directory of one. Results are looked up
+        by a hash of every input that affects them, including the speed on
+        the grid and the version of waver, and are only computed when they
+        are not in the cache.
 
     Returns
     -------
@@ -81,21 +112,39 @@ def run_single_source(size, spacing, location, period, duration, max_speed, time
 
     if isinstance(speed, str):
         # Generate speed according to method.
-        speed = generate_grid_speed(speed, sim.grid.shape, (min_speed, max_speed))
+        speed = generate_grid_speed(speed, sim.grid.shape, (min_speed, max_speed), rng=rng)
 
     # Set speed array
     if speed is not None:
         sim.set_speed(speed=speed, min_speed=min_speed, max_speed=max_speed)
 
     # Add source
-    sim.add_source(location=location, period=period, ncycles=ncycles, phase=phase)
+    sim.add_source(location=location, period=period, ncycles=ncycles, phase=phase, amplitude=amplitude,
+                   waveform=waveform, end_period=end_period, samples=samples)
 
     # Add detector grid
     sim.add_detector(spatial_downsample=spatial_downsample,
                      boundary=boundary, edge=edge)
 
+    # Look up the result from every input that affects it
+    analytic = analytic and sim.supports_analytic
+    if cache is not None:
+        if not isinstance(cache, ResultCache):
+            cache = ResultCache(cache)
+        key = cache.key(__version__, sim.grid, sim.grid_speed, sim.time_step, sim.sources, sim.detector,
+                        duration, temporal_downsample, analytic)
+        result = cache.get(key)
+        if result is not None:
+            return result['wave'], result['speed']
+
     # Run simulation
-    sim.run(duration=duration, temporal_downsample=temporal_downsample, progress=progress, leave=leave)
+    if analytic:
+        sim.run_analytic(duration=duration, temporal_downsample=temporal_downsample)
+    else:
+        sim.run(duration=duration, temporal_downsample=temporal_downsample, progress=progress, leave=leave)
+
+    if cache is not None:
+        cache.put(key, wave=sim.detected_wave, speed=np.expand_dims(sim.grid_speed, axis=0))
 
     # Return simulation wave and speed data
     return sim.detected_wave, np.expand_dims(sim.grid_speed, axis=0)
@@ -103,7 +152,7 @@ def run_single_source(size, spacing, location, period, duration, max_speed, time
 
 def run_multiple_sources(size, spacing, sources, duration, max_speed, time_step=None, pml_thickness=20,
                    speed=None, min_speed=0, spatial_downsample=1, temporal_downsample=1,
-                   boundary=0, edge=None, progress=True, leave=False):
+                   boundary=0, edge=None, reciprocity=False, analytic=False, progress=True, leave=False, rng=None):
     """Convenience method to run a single simulation with multiple sources.
 
     Parameters
@@ -147,10 +196,30 @@ def run_multiple_sources(size, spacing, sources, duration, max_speed, time_step=
         a point, 2D a line, 3D a plane etc. The particular edge is determined
         by indexing around the grid. It None is provided then all edges are
         used.  
+    reciprocity : bool or str, optional
+        If True, use acoustic reciprocity and run one simulation from each
+        detector pixel, recording at the source locations, instead of one
+        simulation per source. If 'auto' then reciprocity is only used when
+        the detector has fewer pixels than there are sources. All sources
+        must share the same period, ncycles and phase to use reciprocity,
+        and with a perfectly matched layer no source can be on the edge of
+        the grid, as sources there are extended into the layer.
+    analytic : bool, optional
+        If True and the simulation supports it, compute the detected wave
+        from the Green's function of the wave equation instead of time
+        stepping. This requires a uniform speed, a perfectly matched layer
+        at least 20 pixels and half a wavelength thick, waves spanning at
+        least 12 pixels and, in 2D and 3D, a detector at least 2 pixels away
+        from the sources, so the wave is within 20% of the peak of the wave
+        from time stepping. Otherwise the simulation is time stepped. See
+        `Simulation.supports_analytic`.
     progress : bool, optional
         Show progress bar or not.
     leave : bool, optional
         Leave progress bar or not.
+    rng : np.random.Generator, optional
+        Random number generator used to generate a random speed
+        distribution. If None then the global `np.random` state is used.
 
     Returns
     -------
@@ -164,8 +233,22 @@ def run_multiple_sources(size, spacing, sources, duration, max_speed, time_step=
         sim = Simulation(size=size, spacing=spacing, max_speed=max_speed, time_step=time_step, pml_thickness=pml_thickness)
 
         # Generate speed according to method
-        speed = generate_grid_speed(speed, sim.grid.shape, (min_speed, max_speed))
+        speed = generate_grid_speed(speed, sim.grid.shape, (min_speed, max_speed), rng=rng)
 
+    if reciprocity == 'auto':
+        # Compare number of simulations from unique detector pixels to
+        # number of sources, if the sources can use reciprocity
+        sim = Simulation(size=size, spacing=spacing, max_speed=max_speed, time_step=time_step, pml_thickness=pml_thickness)
+        sim.add_detector(spatial_downsample=spatial_downsample, boundary=boundary, edge=edge)
+        reciprocity = (_shared_profile(sources) is not None
+                       and not _sources_on_edge(sources, sim.grid)
+                       and len(_unique_detector_pixels(sim.detector, sim.grid)[0]) < len(sources))
+
+    if reciprocity:
+        return _run_reciprocal_sources(size=size, spacing=spacing, sources=sources, pml_thickness=pml_thickness,
+                duration=duration, max_speed=max_speed, time_step=time_step, speed=speed, min_speed=min_speed,
+                spatial_downsample=spatial_downsample, temporal_downsample=temporal_downsample,
+                boundary=boundary, edge=edge, progress=progress, leave=leave)
 
     detected_waves = []
 
@@ -174,8 +257,439 @@ def run_multiple_sources(size, spacing, sources, duration, max_speed, time_step=
         wave, grid_speed = run_single_source(size=size, spacing=spacing, **source, pml_thickness=pml_thickness,
                 duration=duration, max_speed=max_speed, time_step=time_step, speed=speed, min_speed=min_speed,
                 spatial_downsample=spatial_downsample, temporal_downsample=temporal_downsample,
-                boundary=boundary, edge=edge, progress=progress, leave=leave)
+                boundary=boundary, edge=edge, analytic=analytic, progress=progress, leave=leave)
         detected_waves.append(wave)
 
     # Return simulation wave and speed data
-    return np.stack(detected_waves, axis=0), np.expand_dims(grid_speed, axis=0)
\ No newline at end of file
+    return np.stack(detected_waves, axis=0), np.expand_dims(grid_speed, axis=0)
+
+
+def run_encoded_sources(size, spacing, sources, duration, max_speed, encoding_size, nencodings=1, seed=None,
+                   time_step=None, pml_thickness=20, speed=None, min_speed=0, spatial_downsample=1,
+                   temporal_downsample=1, boundary=0, edge=None, progress=True, leave=False, rng=None):
+    """Convenience method to run multiple sources with simultaneous source encoding.
+
+    Groups of `encoding_size` sources are fired together in a single
+    simulation, each with a random polarity code. As the wave equation is
+    linear the waves of each source can be estimated afterwards using
+    `decode_sources`, or the encoded waves can be used directly. This reduces
+    the number of simulations by a factor of `encoding_size / nencodings`.
+
+    Parameters
+    ----------
+    size : tuple of float
+        Size of the grid in meters. Length of size determines the
+        dimensionality of the grid.
+    spacing : float
+        Spacing of the grid in meters. The grid is assumed to be
+        isotropic, all dimensions use the same spacing.
+    sources : list of dict
+        List of sources to use with the same grid. Each source is a
+        dict of Simulation.add_source kwargs.
+    duration : float
+        Length of the simulation in seconds.
+    max_speed : float, optional
+        Maximum speed of the wave in meters per second. If passed then
+        this speed will be used to derive the time step.
+    encoding_size : int
+        Number of sources fired together in a single simulation.
+    nencodings : int, optional
+        Number of independent codes to use for each group of sources.
+    seed : int, optional
+        Seed for the random number generator used to draw the codes.
+    time_step : float, optional
+        Time step to use if stable.
+    pml_thickness : int
+        Thickness of any perfectly matched layer in pixels.
+    speed : float, array, or str, optional
+        Speed of the wave in meters per second. If a float then
+        speed is assumed constant across the whole grid. If an
+        array then must be the same shape as the grid. Note that
+        the speed is assumed contant in time. Or string with a method for 
+            generating a random speed distribution. 
+    min_speed : float, optional
+        Minimum allowed speed value.
+    spatial_downsample : int, optional
+        Spatial downsample factor.
+    temporal_downsample : int, optional
+        Temporal downsample factor.
+    boundary : int, optional
+        If greater than zero, then number of pixels on the boundary
+        to detect at, in downsampled coordinates. If zero then detection
+        is done over the full grid.
+    edge : int, optional
+        If provided detect only at that particular "edge", which in 1D is
+        a point, 2D a line, 3D a plane etc. The particular edge is determined
+        by indexing around the grid. It None is provided then all edges are
+        used.  
+    progress : bool, optional
+        Show progress bar or not.
+    leave : bool, optional
+        Leave progress bar or not.
+    rng : np.random.Generator, optional
+        Random number generator used to generate a random speed
+        distribution. If None then the global `np.random` state is used.
+
+    Returns
+    -------
+    wave : np.ndarray
+        Array of encoded waves sampled on detector, one for each simulation.
+    speed : np.ndarray
+        Array of speed values sampled on grid.
+    codes : np.ndarray
+        Array of shape `(nsimulations, nsources)` with the amplitude of
+        each source in each simulation.
+    """
+    codes = make_encoding_codes(len(sources), encoding_size, nencodings=nencodings, seed=seed)
+
+    # Create a simulation
+    sim = Simulation(size=size, spacing=spacing, max_speed=max_speed, time_step=time_step, pml_thickness=pml_thickness)
+
+    if isinstance(speed, str):
+        # Generate speed according to method
+        speed = generate_grid_speed(speed, sim.grid.shape, (min_speed, max_speed), rng=rng)
+
+    detected_waves = []
+
+    # Move through encoded simulations
+    for code in tqdm(codes, leave=False):
+        sim = Simulation(size=size, spacing=spacing, max_speed=max_speed, time_step=time_step, pml_thickness=pml_thickness)
+
+        # Set speed array
+        if speed is not None:
+            sim.set_speed(speed=speed, min_speed=min_speed, max_speed=max_speed)
+
+        # Add all sources fired in this simulation with their code
+        for amplitude, source in zip(code, sources):
+            if amplitude != 0:
+                sim.add_source(**{'ncycles': 1, **source, 'amplitude': source.get('amplitude', 1) * amplitude})
+
+        # Add detector grid
+        sim.add_detector(spatial_downsample=spatial_downsample,
+                         boundary=boundary, edge=edge)
+
+        # Run simulation
+        sim.run(duration=duration, temporal_downsample=temporal_downsample, progress=progress, leave=leave)
+        detected_waves.append(sim.detected_wave)
+
+    # Return simulation wave and speed data
+    return np.stack(detected_waves, axis=0), np.expand_dims(np.expand_dims(sim.grid_speed, axis=0), axis=0), codes
+
+
+def run_travel_times(size, spacing, sources, max_speed, pml_thickness=20, speed=None, min_speed=0,
+                   spatial_downsample=1, boundary=0, edge=None, progress=True, leave=False, rng=None):
+    """Convenience method to compute first arrival times for multiple sources.
+
+    Parameters
+    ----------
+    size : tuple of float
+        Size of the grid in meters. Length of size determines the
+        dimensionality of the grid.
+    spacing : float
+        Spacing of the grid in meters. The grid is assumed to be
+        isotropic, all dimensions use the same spacing.
+    sources : list of dict
+        List of sources to use with the same grid. Each source is a
+        dict of Simulation.add_source kwargs.
+    max_speed : float, optional
+        Maximum speed of the wave in meters per second.
+    pml_thickness : int
+        Thickness of any perfectly matched layer in pixels.
+    speed : float, array, or str, optional
+        Speed of the wave in meters per second. If a float then
+        speed is assumed constant across the whole grid. If an
+        array then must be the same shape as the grid. Note that
+        the speed is assumed contant in time. Or string with a method for 
+            generating a random speed distribution. 
+    min_speed : float, optional
+        Minimum allowed speed value.
+    spatial_downsample : int, optional
+        Spatial downsample factor.
+    boundary : int, optional
+        If greater than zero, then number of pixels on the boundary
+        to detect at, in downsampled coordinates. If zero then detection
+        is done over the full grid.
+    edge : int, optional
+        If provided detect only at that particular "edge", which in 1D is
+        a point, 2D a line, 3D a plane etc. The particular edge is determined
+        by indexing around the grid. It None is provided then all edges are
+        used.  
+    progress : bool, optional
+        Show progress bar or not.
+    leave : bool, optional
+        Leave progress bar or not.
+    rng : np.random.Generator, optional
+        Random number generator used to generate a random speed
+        distribution. If None then the global `np.random` state is used.
+
+    Returns
+    -------
+    travel_time : np.ndarray
+        Array of first arrival times in seconds sampled on detector.
+    speed : np.ndarray
+        Array of speed values sampled on grid.
+    """
+    # Create a simulation
+    sim = Simulation(size=size, spacing=spacing, max_speed=max_speed, pml_thickness=pml_thickness)
+
+    if isinstance(speed, str):
+        # Generate speed according to method
+        speed = generate_grid_speed(speed, sim.grid.shape, (min_speed, max_speed), rng=rng)
+
+    # Set speed array
+    if speed is not None:
+        sim.set_speed(speed=speed, min_speed=min_speed, max_speed=max_speed)
+
+    # Add detector grid
+    sim.add_detector(spatial_downsample=spatial_downsample,
+                     boundary=boundary, edge=edge)
+
+    detected_travel_times = []
+
+    # Move through sources
+    for source in tqdm(sources, disable=not progress, leave=leave):
+        sim.clear_sources()
+        sim.add_source(**source)
+        sim.run_travel_time()
+        detected_travel_times.append(sim.detected_travel_time)
+
+    # Return travel time and speed data
+    return np.stack(detected_travel_times, axis=0), np.expand_dims(np.expand_dims(sim.grid_speed, axis=0), axis=0)
+
+
+def _run_reciprocal_sources(size, spacing, sources, duration, max_speed, time_step=None, pml_thickness=20,
+                   speed=None, min_speed=0, spatial_downsample=1, temporal_downsample=1,
+                   boundary=0, edge=None, progress=True, leave=False):
+    """Run multiple sources using acoustic reciprocity.
+
+    A point source is placed at each detector pixel in turn and the wave
+    is recorded at every source location. As the discretized wave equation
+    is symmetric once scaled by the squared speed, the wave detected at
+    pixel r from source s is equal to the wave detected at s from a source
+    at r multiplied by c(r)**2 / c(s)**2.
+
+    Parameters are the same as for `run_multiple_sources`.
+
+    Returns
+    -------
+    wave : np.ndarray
+        Array of wave sampled on detector.
+    speed : np.ndarray
+        Array of speed values sampled on grid.
+    """
+    # Reciprocity requires all sources to share the same temporal profile,
+    # up to their amplitude
+    profile = _shared_profile(sources)
+    if profile is None:
+        raise ValueError('All sources must have the same waveform, period, ncycles and phase to use reciprocity')
+
+    # Create a simulation to get grid, speed and detector geometry
+    sim = Simulation(size=size, spacing=spacing, max_speed=max_speed, time_step=time_step, pml_thickness=pml_thickness)
+    if speed is not None:
+        sim.set_speed(speed=speed, min_speed=min_speed, max_speed=max_speed)
+    sim.add_detector(spatial_downsample=spatial_downsample, boundary=boundary, edge=edge)
+    grid_speed = sim.grid_speed
+    detector = sim.detector
+
+    # Sources on the edge are extended into the pml, so are not recorded
+    # by their weight on the grid
+    if _sources_on_edge(sources, sim.grid):
+        raise ValueError('Sources on the edge of the grid can not use reciprocity with a perfectly matched layer')
+
+    # Spatial weights of each source divided by the squared speed
+    weights = np.stack([Source(location=source['location'], shape=sim.grid.shape, spacing=sim.grid.spacing,
+                               period=profile['period'], ncycles=profile['ncycles'],
+                               phase=profile['phase']).weight * source.get('amplitude', 1)
+                        for source in sources])
+    weights = weights.reshape(len(sources), -1) / grid_speed.reshape(1, -1) ** 2
+
+    # Find the unique grid pixels that the detector records at
+    unique_index, inverse = _unique_detector_pixels(detector, sim.grid)
+
+    traces = []
+
+    # Move through receivers, placing a point source at each one. Receivers
+    # are often on the edge of the grid, so the sources are not extended
+    # into the pml, which keeps the wave equation symmetric
+    for flat_index in tqdm(unique_index, leave=False):
+        index = np.unravel_index(flat_index, sim.grid.shape)
+        location = tuple((ind + 0.5) * sim.grid.spacing for ind in index)
+        sim.clear_sources()
+        sim.add_source(location=location, **profile, extend=False)
+        sim.add_detector()
+        sim.run(duration=duration, temporal_downsample=temporal_downsample, progress=progress, leave=leave)
+        wave = sim.detected_wave
+
+        # Record the wave at the sources and rescale to obtain the reciprocal wave
+        wave = wave.reshape(wave.shape[0], -1)
+        traces.append(wave @ weights.T * grid_speed[index] ** 2)
+
+    # Reassemble traces in the shape of the detector, with sources first
+    traces = np.stack(traces, axis=-1)[..., np.ravel(inverse)]
+    detected_waves = np.moveaxis(traces, 1, 0).reshape((len(sources), -1) + detector.downsample_shape)
+
+    # Return simulation wave and speed data
+    return detected_waves, np.expand_dims(np.expand_dims(grid_speed, axis=0), axis=0)
+
+
+def _shared_profile(sources):
+    """Temporal profile shared by all sources, up to their amplitude.
+
+    Parameters
+    ----------
+    sources : list of dict
+        List of sources, each a dict of Simulation.add_source kwargs.
+
+    Returns
+    -------
+    dict or None
+        Simulation.add_source kwargs of the profile, or None if the sources
+        do not share one.
+    """
+    defaults = {'period': None, 'ncycles': 1, 'phase': 0, 'waveform': 'sine', 'end_period': None, 'samples': None}
+    profiles = {tuple((key, _hashable(source.get(key, value))) for key, value in defaults.items())
+                for source in sources}
+    if len(profiles) != 1:
+        return None
+    return dict(profiles.pop())
+
+
+def _unique_detector_pixels(detector, grid):
+    """Unique grid pixels that a detector records at.
+
+    Parameters
+    ----------
+    detector : Detector
+        Detector of the simulation.
+    grid : Grid
+        Grid of the simulation.
+
+    Returns
+    -------
+    unique_index : np.ndarray
+        Flat grid index of each unique pixel.
+    inverse : np.ndarray
+        Index into the unique pixels of each detector pixel.
+    """
+    receiver_index = np.ravel_multi_index(tuple(detector.index), grid.shape)
+    return np.unique(receiver_index, return_inverse=True)
+
+
+def _sources_on_edge(sources, grid):
+    """Whether any source is on the edge of a grid with a perfectly matched layer.
+
+    Parameters
+    ----------
+    sources : list of dict
+        List of sources, each a dict of Simulation.add_source kwargs.
+    grid : Grid
+        Grid of the simulation.
+
+    Returns
+    -------
+    bool
+        True if a pml is used and a source is on the first or last pixel
+        of an axis it is not broadcast along.
+    """
+    if grid.pml_thickness == 0:
+        return False
+    for source in sources:
+        index = location_to_index(source['location'], grid.spacing, grid.shape)
+        if any(ind is not None and ind in (0, length - 1) for ind, length in zip(index, grid.shape)):
+            return True
+    return False
+
+
+def run_reverse_time_migration(size, spacing, sources, detected_waves, duration, max_speed, time_step=None,
+                   pml_thickness=20, speed=None, min_speed=0, spatial_downsample=1, temporal_downsample=1,
+                   boundary=0, edge=None, checkpoint_memory=None, progress=True, leave=False):
+    """Convenience method to image recorded waves with reverse time migration.
+
+    The recorded wave of each source is migrated through the speed, usually
+    a smooth background speed, and the images of all sources are summed.
+    See `Simulation.run_migration`.
+
+    Parameters
+    ----------
+    size : tuple of float
+        Size of the grid in meters. Length of size determines the
+        dimensionality of the grid.
+    spacing : float
+        Spacing of the grid in meters. The grid is assumed to be
+        isotropic, all dimensions use the same spacing.
+    sources : list of dict
+        List of sources to use with the same grid. Each source is a
+        dict of Simulation.add_source kwargs.
+    detected_waves : np.ndarray
+        Waves recorded on the detector for each source, for example from
+        `run_multiple_sources`.
+    duration : float
+        Length of the simulation in seconds.
+    max_speed : float, optional
+        Maximum speed of the wave in meters per second. If passed then
+        this speed will be used to derive the time step.
+    time_step : float, optional
+        Time step to use if stable.
+    pml_thickness : int
+        Thickness of any perfectly matched layer in pixels.
+    speed : float or array, optional
+        Speed of the wave in meters per second the recorded waves are
+        migrated through. If a float then speed is assumed constant
+        across the whole grid. If an array then must be the same shape as
+        the grid.
+    min_speed : float, optional
+        Minimum allowed speed value.
+    spatial_downsample : int, optional
+        Spatial downsample factor.
+    temporal_downsample : int, optional
+        Temporal downsample factor.
+    boundary : int, optional
+        If greater than zero, then number of pixels on the boundary
+        to detect at, in downsampled coordinates. If zero then detection
+        is done over the full grid.
+    edge : int, optional
+        If provided detect only at that particular "edge", which in 1D is
+        a point, 2D a line, 3D a plane etc. The particular edge is determined
+        by indexing around the grid. It None is provided then all edges are
+        used.  
+    checkpoint_memory : int, optional
+        Memory budget in bytes for storing the forward wave of each source.
+    progress : bool, optional
+        Show progress bar or not.
+    leave : bool, optional
+        Leave progress bar or not.
+
+    Returns
+    -------
+    image : np.ndarray
+        Image on the grid summed over all sources.
+    speed : np.ndarray
+        Array of speed values sampled on grid.
+    """
+    image = 0
+
+    # Move through sources
+    for source, detected_wave in zip(tqdm(sources, leave=False), detected_waves):
+        sim = Simulation(size=size, spacing=spacing, max_speed=max_speed, time_step=time_step, pml_thickness=pml_thickness)
+
+        # Set speed array
+        if speed is not None:
+            sim.set_speed(speed=speed, min_speed=min_speed, max_speed=max_speed)
+
+        sim.add_source(**source)
+        sim.add_detector(spatial_downsample=spatial_downsample,
+                         boundary=boundary, edge=edge)
+
+        image = image + sim.run_migration(duration=duration, detected_wave=np.asarray(detected_wave),
+                                          temporal_downsample=temporal_downsample,
+                                          checkpoint_memory=checkpoint_memory, progress=progress, leave=leave)
+
+    # Return image and speed data
+    return image, np.expand_dims(np.expand_dims(sim.grid_speed, axis=0), axis=0)
+
+
+def _hashable(value):
+    """Convert arrays of source samples to tuples so they can be compared."""
+    if isinstance(value, (list, tuple, np.ndarray)):
+        return tuple(np.ravel(value).tolist())
+    return value
@@ -26,12 +26,16 @@ class Detector(NamedTuple):
         a point, 2D a line, 3D a plane etc. The particular edge is determined
         by indexing around the grid. It None is provided then all edges are
         used.
+    frequencies : tuple of float, optional
+        If provided then the detector records the spectrum of the wave at
+        these frequencies in Hz rather than the wave at each time step.
     """
     shape: tuple
     spacing: tuple
     spatial_downsample: int=1
     boundary: int=0
     edge: int=None
+    frequencies: tuple=None
 
     @property
     @lru_cache(1)
@@ -79,6 +83,14 @@ class Detector(NamedTuple):
                 # Add number of pixels on this face just once
                 return (int(self.boundary),) + tuple(boundary_shape)         
 
+    @property
+    @lru_cache(1)
+    def index(self):
+        """array of int: Grid index of each detector pixel, with shape
+        `(ndim,) + downsample_shape`."""
+        indices = np.indices(self.shape)
+        return np.stack([self.sample(ind[self.grid_index]) for ind in indices])
+
     def sample(self, wave):
         """Sample wave only at boundary.
 
@@ -92,4 +104,24 @@ class Detector(NamedTuple):
         array
             Wave sampled at the boundary.
         """
-        return sample_boundary(wave, self.boundary, self.edge)
\ No newline at end of file
+        return sample_boundary(wave, self.boundary, self.edge)
+
+    def scatter(self, detected):
+        """Add values on the detector back onto the grid.
+
+        This is the transpose of sampling the grid with the detector, so
+        pixels detected more than once receive the sum of their values.
+
+        Parameters
+        ----------
+        detected : array
+            Values with the shape of the detector.
+
+        Returns
+        -------
+        array
+            Values on the grid.
+        """
+        out = np.zeros(self.shape)
+        np.add.at(out, tuple(self.index), detected)
+        return out
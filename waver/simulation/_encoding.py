@@ -0,0 +1,91 @@
+import numpy as np
+
+
+def make_encoding_codes(nsources, encoding_size, nencodings=1, seed=None):
+    """Make random polarity codes for simultaneous source encoding.
+
+    Sources are packed in groups of consecutive sources of length
+    `encoding_size`, each group being fired together in one simulation
+    with a random polarity code for each source.
+
+    Parameters
+    ----------
+    nsources : int
+        Number of sources.
+    encoding_size : int
+        Number of sources fired together in a single simulation.
+    nencodings : int, optional
+        Number of independent codes to use for each group of sources.
+        Crosstalk between sources after decoding reduces as the number of
+        encodings increases.
+    seed : int, optional
+        Seed for the random number generator used to draw the codes.
+
+    Returns
+    -------
+    codes : np.ndarray
+        Array of shape `(nsimulations, nsources)` with the amplitude of
+        each source in each simulation. Sources not fired in a simulation
+        have an amplitude of zero.
+    """
+    rng = np.random.default_rng(seed)
+    ngroups = int(np.ceil(nsources / encoding_size))
+    codes = np.zeros((ngroups * nencodings, nsources))
+    for group in range(ngroups):
+        members = slice(group * encoding_size, min((group + 1) * encoding_size, nsources))
+        rows = slice(group * nencodings, (group + 1) * nencodings)
+        codes[rows, members] = rng.choice([-1, 1], size=codes[rows, members].shape)
+    return codes
+
+
+def encoding_crosstalk(codes):
+    """Crosstalk level between sources after decoding.
+
+    Parameters
+    ----------
+    codes : np.ndarray
+        Array of shape `(nsimulations, nsources)` with the amplitude of
+        each source in each simulation.
+
+    Returns
+    -------
+    float
+        Root mean square amplitude of the other sources of a group that
+        leaks into each decoded source, relative to the amplitude of the
+        source itself. Zero means the sources are perfectly separated.
+    """
+    gram = codes.T @ codes
+    norm = np.diag(gram)
+    crosstalk = gram / norm[:, np.newaxis]
+
+    # Only consider pairs of different sources that are fired together
+    fired_together = (np.abs(codes.T) @ np.abs(codes)) > 0
+    np.fill_diagonal(fired_together, False)
+    if not np.any(fired_together):
+        return 0.0
+    return float(np.sqrt(np.mean(crosstalk[fired_together] ** 2)))
+
+
+def decode_sources(wave, codes):
+    """Separate encoded waves into the waves of each source.
+
+    Parameters
+    ----------
+    wave : np.ndarray
+        Array of encoded waves with the simulations along the first axis.
+    codes : np.ndarray
+        Array of shape `(nsimulations, nsources)` with the amplitude of
+        each source in each simulation.
+
+    Returns
+    -------
+    wave : np.ndarray
+        Array of decoded waves with the sources along the first axis.
+    crosstalk : float
+        Crosstalk level between sources after decoding, see
+        `encoding_crosstalk`.
+    """
+    norm = np.sum(codes ** 2, axis=0)
+    decoded = np.tensordot(codes.T, wave, axes=1)
+    decoded = decoded / np.reshape(norm, (-1,) + (1,) * (decoded.ndim - 1))
+    return decoded, encoding_crosstalk(codes)
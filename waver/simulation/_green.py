@@ -0,0 +1,170 @@
+import numpy as np
+from scipy.special import hankel2
+
+
+# Equivalent radius in pixels of the source pixel, chosen so that the
+# continuum Green's function matches the lattice Green's function there.
+EQUIVALENT_RADIUS = {2: 0.1985, 3: 0.315}
+
+
+def time_wavenumber(frequency, speed, time_step):
+    """Squared wavenumber of the time stepping used by `WaveEquation`.
+
+    The update of the pressure averages the two previous time steps,
+    which both slows down and damps the wave compared to a continuous
+    wave equation. In the frequency domain the update is equivalent to a
+    Helmholtz equation with a complex squared wavenumber.
+
+    Parameters
+    ----------
+    frequency : np.ndarray
+        Angular frequencies in radians per second.
+    speed : float
+        Speed of the wave in meters per second.
+    time_step : float
+        Time step of the simulation in seconds.
+
+    Returns
+    -------
+    np.ndarray
+        Complex squared wavenumber for each frequency.
+    """
+    z = np.exp(1j * frequency * time_step)
+    return -(z - 0.5 - 0.5 / z) * (1 - 1 / z) / (speed * time_step) ** 2
+
+
+def lattice_wavenumber(wavenumber_squared, direction, spacing, niterations=8):
+    """Wavenumber of a wave travelling along a direction on the grid.
+
+    Solves the dispersion relation of the finite difference laplacian,
+    `sum(2 - 2 cos(k n_d dx)) = k0**2 dx**2`, with Newton's method.
+
+    Parameters
+    ----------
+    wavenumber_squared : np.ndarray
+        Complex squared wavenumber of the continuous wave equation.
+    direction : np.ndarray
+        Unit vector of the direction of travel, with the dimensions along
+        the first axis.
+    spacing : float
+        Spacing of the grid in meters.
+    niterations : int, optional
+        Number of iterations of Newton's method.
+
+    Returns
+    -------
+    np.ndarray
+        Complex wavenumber, with negative imaginary part.
+    """
+    target = wavenumber_squared * spacing ** 2
+
+    # Start from the exact solution for a wave travelling along an axis
+    kdx = np.arccos(1 - target / 2 + 0j) * np.ones(direction.shape[1:])
+    with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+        for _ in range(niterations):
+            value = np.sum([2 - 2 * np.cos(kdx * n) for n in direction], axis=0) - target
+            slope = np.sum([2 * n * np.sin(kdx * n) for n in direction], axis=0)
+            kdx = kdx - np.where(slope != 0, value / slope, 0)
+
+    # Take the decaying solution
+    kdx = np.where(kdx.imag > 0, -kdx, kdx)
+    return kdx / spacing
+
+
+def green_function(wavenumber, distance, ndim, spacing):
+    """Outgoing Green's function of the Helmholtz equation.
+
+    Parameters
+    ----------
+    wavenumber : np.ndarray
+        Complex wavenumber, with negative imaginary part.
+    distance : np.ndarray
+        Distance from the source in meters.
+    ndim : int
+        Dimensionality of the grid.
+    spacing : float
+        Spacing of the grid in meters.
+
+    Returns
+    -------
+    np.ndarray
+        Complex Green's function.
+    """
+    with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+        if ndim == 1:
+            # Exact Green's function of the 1D lattice
+            green = np.exp(-1j * wavenumber * distance) * spacing / (2j * np.sin(wavenumber * spacing))
+        elif ndim == 2:
+            distance = np.maximum(distance, EQUIVALENT_RADIUS[2] * spacing)
+            green = -0.25j * hankel2(0, wavenumber * distance)
+        elif ndim == 3:
+            distance = np.maximum(distance, EQUIVALENT_RADIUS[3] * spacing)
+            green = np.exp(-1j * wavenumber * distance) / (4 * np.pi * distance)
+        else:
+            raise ValueError(f'Green\'s function not available for {ndim} dimensions')
+    return np.nan_to_num(green, nan=0, posinf=0, neginf=0)
+
+
+def homogeneous_response(profile, offset, speed, time_step, spacing, chunk_size=4096):
+    """Wave in a homogeneous medium in response to a point source.
+
+    The response is computed in the frequency domain by multiplying the
+    spectrum of the source with the Green's function of the discretized
+    wave equation, so no time stepping is required. It includes the
+    dispersion of the time stepping exactly and the dispersion of the grid
+    along the direction of travel. It ignores any reflections from the edge
+    of the grid, so assumes a perfectly matched layer is used.
+
+    Parameters
+    ----------
+    profile : np.ndarray
+        Value of the source at each time step.
+    offset : np.ndarray
+        Offset in pixels of each point the wave is computed at from the
+        source, with the dimensions along the first axis.
+    speed : float
+        Speed of the wave in meters per second.
+    time_step : float
+        Time step of the simulation in seconds.
+    spacing : float
+        Spacing of the grid in meters.
+    chunk_size : int, optional
+        Number of points the wave is computed at together.
+
+    Returns
+    -------
+    np.ndarray
+        Wave after each time step, with shape `profile.shape + offset.shape[1:]`.
+    """
+    ndim = offset.shape[0]
+    nsteps = len(profile)
+    points_shape = offset.shape[1:]
+
+    # The response is symmetric under flipping and swapping the axes of
+    # the grid so only compute it once for each unique offset
+    offset = np.sort(np.abs(np.reshape(offset, (ndim, -1))), axis=0)
+    offset, inverse = np.unique(offset, axis=1, return_inverse=True)
+    offset = offset.astype(float)
+
+    # Zero pad to avoid wrap around of the response
+    nfft = 4 * nsteps
+    frequency = 2 * np.pi * np.fft.rfftfreq(nfft, time_step)
+    z = np.exp(1j * frequency * time_step)
+    wavenumber_squared = time_wavenumber(frequency, speed, time_step)
+
+    # Spectrum of the source as it enters the update of the pressure, the
+    # wave is detected after each update so is advanced one time step
+    spectrum = z * (1 - 1 / z) * np.fft.rfft(profile, nfft) * spacing ** ndim / (speed * time_step) ** 2
+    spectrum[0] = 0
+
+    response = np.zeros((nsteps, offset.shape[1]))
+    for start in range(0, offset.shape[1], chunk_size):
+        chunk = offset[:, start:start + chunk_size]
+        distance = np.sqrt(np.sum(chunk ** 2, axis=0))
+        direction = np.divide(chunk, distance, out=np.full(chunk.shape, 1 / np.sqrt(ndim)), where=distance > 0)
+
+        wavenumber = lattice_wavenumber(wavenumber_squared[:, np.newaxis], direction[:, np.newaxis], spacing)
+        green = green_function(wavenumber, distance * spacing, ndim, spacing)
+        response[:, start:start + chunk_size] = np.fft.irfft(spectrum[:, np.newaxis] * green, nfft, axis=0)[:nsteps]
+
+    return response[:, np.ravel(inverse)].reshape((nsteps,) + points_shape)
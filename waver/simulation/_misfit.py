@@ -0,0 +1,22 @@
+import numpy as np
+
+
+def l2_misfit(wave, observed):
+    """Least squares misfit between a detected and an observed wave.
+
+    Parameters
+    ----------
+    wave : np.ndarray
+        Detected wave.
+    observed : np.ndarray
+        Observed wave, with the same shape as the detected wave.
+
+    Returns
+    -------
+    value : float
+        Half the sum of the squared difference between the waves.
+    residual : np.ndarray
+        Derivative of the misfit with respect to the detected wave.
+    """
+    residual = wave - observed
+    return 0.5 * float(np.sum(residual ** 2)), residual
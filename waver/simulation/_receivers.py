@@ -0,0 +1,88 @@
+import itertools
+import numpy as np
+import scipy.sparse as sparse
+from functools import lru_cache
+from typing import NamedTuple
+
+
+class Receivers(NamedTuple):
+    """Receivers at arbitrary locations in the grid.
+
+    The wave at each receiver is interpolated multilinearly from the
+    pixels around it, with the interpolation weights of all receivers held
+    in a sparse matrix so that all receivers are sampled with a single
+    sparse matrix product.
+
+    Parameters
+    ----------
+    coordinates : tuple of tuple of float
+        Location of each receiver in meters.
+    spacing : float
+        Spacing of the grid in meters. The grid is assumed to be
+        isotropic, all dimensions use the same spacing.
+    shape : tuple of int
+        Shape of the grid.
+    pml_thickness : int, optional
+        Thickness of any perfectly matched layer in pixels around the grid.
+        Receivers are always inside the grid, but sample the wave on the
+        grid including the perfectly matched layer.
+    """
+    coordinates: tuple
+    spacing: float
+    shape: tuple
+    pml_thickness: int=0
+
+    @property
+    @lru_cache(1)
+    def nreceivers(self):
+        """int: Number of receivers."""
+        return len(self.coordinates)
+
+    @property
+    @lru_cache(1)
+    def index(self):
+        """np.ndarray: Fractional grid index of each receiver, of shape `(nreceivers, ndim)`.
+
+        Receivers between the last pixel of an axis and the size of the grid
+        sample the last pixel.
+        """
+        index = np.reshape(np.asarray(self.coordinates, dtype=float), (self.nreceivers, len(self.shape)))
+        return np.minimum(index / self.spacing, np.subtract(self.shape, 1))
+
+    @property
+    @lru_cache(1)
+    def matrix(self):
+        """scipy.sparse.csr_matrix: Interpolation weights of each receiver on the flattened padded grid."""
+        full_shape = tuple(s + 2 * self.pml_thickness for s in self.shape)
+
+        # Lower corner of the pixels around each receiver
+        lower = np.clip(np.floor(self.index).astype(int), 0, np.maximum(np.subtract(self.shape, 2), 0))
+        fraction = self.index - lower
+
+        rows, columns, weights = [], [], []
+        for corner in itertools.product([0, 1], repeat=len(self.shape)):
+            corner = np.array(corner)
+            weight = np.prod(np.where(corner, fraction, 1 - fraction), axis=1)
+            pixel = np.minimum(lower + corner, np.subtract(self.shape, 1)) + self.pml_thickness
+            rows.append(np.arange(self.nreceivers))
+            columns.append(np.ravel_multi_index(tuple(pixel.T), full_shape))
+            weights.append(weight)
+
+        shape = (self.nreceivers, int(np.prod(full_shape)))
+        return sparse.csr_matrix((np.concatenate(weights), (np.concatenate(rows), np.concatenate(columns))),
+                                 shape=shape)
+
+    def sample(self, wave):
+        """Sample wave at the receivers.
+
+        Parameters
+        ----------
+        wave : array
+            Wave on the grid including any perfectly matched layer.
+
+        Returns
+        -------
+        array
+            Wave at each receiver.
+        """
+        return self.matrix @ np.ravel(wave)
@@ -0,0 +1,172 @@
+import numpy as np
+
+
+class Reducer:
+    """Running reduction of the detected wave over time.
+
+    Reducers are updated in place with each detected frame of the wave, so
+    only the reduced values need to be stored rather than the wave at every
+    time step.
+
+    Parameters
+    ----------
+    name : str, optional
+        Name of the reduced values. Defaults to the name of the reducer.
+    """
+    default_name = None
+
+    def __init__(self, *, name=None):
+        self.name = name or self.default_name
+        self._value = None
+
+    def reset(self, shape):
+        """Reset the reduction for a new run.
+
+        Parameters
+        ----------
+        shape : tuple of int
+            Shape of the detected wave at one time step.
+        """
+        raise NotImplementedError
+
+    def update(self, wave, time):
+        """Update the reduction with the detected wave at one time step.
+
+        Parameters
+        ----------
+        wave : np.ndarray
+            Detected wave at the time step.
+        time : float
+            Time of the time step in seconds.
+        """
+        raise NotImplementedError
+
+    @property
+    def value(self):
+        """np.ndarray: Reduced values on the detector."""
+        return self._value
+
+
+class PeakAmplitude(Reducer):
+    """Largest absolute value of the wave."""
+    default_name = 'peak'
+
+    def reset(self, shape):
+        self._value = np.zeros(shape)
+
+    def update(self, wave, time):
+        np.maximum(self._value, np.abs(wave), out=self._value)
+
+
+class RMSAmplitude(Reducer):
+    """Root mean square value of the wave."""
+    default_name = 'rms'
+
+    def reset(self, shape):
+        self._sum_squares = np.zeros(shape)
+        self._count = 0
+
+    def update(self, wave, time):
+        self._sum_squares += wave ** 2
+        self._count += 1
+
+    @property
+    def value(self):
+        return np.sqrt(self._sum_squares / max(self._count, 1))
+
+
+class FirstArrival(Reducer):
+    """Time in seconds the absolute value of the wave first reaches a threshold.
+
+    Pixels the wave never reaches the threshold at are NaN.
+
+    Parameters
+    ----------
+    threshold : float
+        Threshold on the absolute value of the wave.
+    name : str, optional
+        Name of the reduced values.
+    """
+    default_name = 'first_arrival'
+
+    def __init__(self, threshold, *, name=None):
+        super().__init__(name=name)
+        self.threshold = threshold
+
+    def reset(self, shape):
+        self._value = np.full(shape, np.nan)
+
+    def update(self, wave, time):
+        arrived = (np.abs(wave) >= self.threshold) & np.isnan(self._value)
+        np.copyto(self._value, time, where=arrived)
+
+
+class TimeOfMax(Reducer):
+    """Time in seconds of the largest absolute value of the wave."""
+    default_name = 'time_of_max'
+
+    def reset(self, shape):
+        self._peak = np.zeros(shape)
+        self._value = np.zeros(shape)
+
+    def update(self, wave, time):
+        amplitude = np.abs(wave)
+        larger = amplitude > self._peak
+        np.copyto(self._peak, amplitude, where=larger)
+        np.copyto(self._value, time, where=larger)
+
+
+class Spectrum(Reducer):
+    """Discrete Fourier transform of the wave at selected frequencies.
+
+    The transform is accumulated as a running sum, `sum(wave * exp(-2j pi f t))`
+    over the detected time steps, which matches `np.fft.fft` of the full
+    time series at its frequencies.
+
+    Parameters
+    ----------
+    frequencies : list of float
+        Frequencies in Hz.
+    name : str, optional
+        Name of the reduced values.
+    """
+    default_name = 'spectrum'
+
+    def __init__(self, frequencies, *, name=None):
+        super().__init__(name=name)
+        self.frequencies = np.asarray(frequencies, dtype=float)
+
+    def reset(self, shape):
+        self._value = np.zeros((len(self.frequencies),) + tuple(shape), dtype=complex)
+
+    def update(self, wave, time):
+        phase = np.exp(-2j * np.pi * self.frequencies * time)
+        self._value += np.multiply.outer(phase, wave)
+
+
+REDUCERS = {reducer.default_name: reducer for reducer in [PeakAmplitude, RMSAmplitude, TimeOfMax]}
+
+
+def make_reducer(reducer):
+    """Make a reducer from its name.
+
+    Parameters
+    ----------
+    reducer : str or Reducer
+        Name of a reducer, one of 'peak', 'rms' or 'time_of_max', or a
+        reducer, for example `FirstArrival(threshold)`, which is returned
+        as is.
+
+    Returns
+    -------
+    Reducer
+        Reducer.
+    """
+    if isinstance(reducer, Reducer):
+        return reducer
+    elif reducer in REDUCERS:
+        return REDUCERS[reducer]()
+    elif reducer == FirstArrival.default_name:
+        raise ValueError('First arrival reducer requires a threshold, use FirstArrival(threshold)')
+    else:
+        raise ValueError(f'Reducer {reducer} not recognized, use one of {list(REDUCERS)} or a Reducer')
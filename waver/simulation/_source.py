@@ -6,11 +6,15 @@ import numpy as np
 from ._utils import location_to_index
 
 
+# Temporal profiles a source can have
+WAVEFORMS = ('sine', 'ricker', 'gaussian', 'chirp', 'array')
+
+
 class Source(NamedTuple):
     """Source for the grid.
     
     Note that the source has a fixed spatial weight that
-    varies with a certain temporal profile that is sinusoidal
+    varies with a certain temporal profile, by default sinusoidal
     either contiously or for a fixed number of cycles.
 
     Parameters
@@ -28,12 +32,34 @@ class Source(NamedTuple):
         Spacing of the grid in meters. The grid is assumed to be
         isotropic, all dimensions use the same spacing.
     period : float
-        Period of the source in seconds.
+        Period of the source in seconds. For a Ricker wavelet or Gaussian
+        pulse the inverse of the peak frequency, and for a chirp the period
+        at the start of the chirp.
     ncycles : int or None
         If None, source is considered to be continous, otherwise
-        it will only run for ncycles.
+        it will only run for ncycles. A chirp lasts for ncycles of its
+        starting period.
     phase : float
         Phase offset of the source in radians.
+    amplitude : float, optional
+        Amplitude of the source. A negative amplitude flips the polarity
+        of the source.
+    waveform : str, optional
+        Temporal profile of the source, one of 'sine', 'ricker', 'gaussian',
+        'chirp' or 'array'. A Ricker wavelet and Gaussian pulse are delayed
+        by one period so they start close to zero.
+    end_period : float, optional
+        Period at the end of a chirp in seconds.
+    samples : tuple of float, optional
+        Values of an 'array' source at each time step, the source is zero
+        after the last sample.
+    time_step : float, optional
+        Time step in seconds the samples of an 'array' source are at.
+    extend : bool, optional
+        If True the source is extended into any perfectly matched layer
+        from the edge of the grid along every axis, so a source on the edge
+        of the grid also fills the layer next to it. If False it is only
+        extended along the axes it is broadcast along.
     """
     location: tuple
     shape: tuple
@@ -41,6 +67,12 @@ class Source(NamedTuple):
     period: float
     ncycles: int
     phase: float
+    amplitude: float=1
+    waveform: str='sine'
+    end_period: float=None
+    samples: tuple=None
+    time_step: float=None
+    extend: bool=True
 
     @property
     @lru_cache(1)
@@ -61,18 +93,38 @@ class Source(NamedTuple):
         
         Parameters
         ----------
-        time : float
+        time : float or array
             Time in seconds through simulation,
 
         Returns
         -------
-        float
+        float or array
             Value of the source at that moment in time.
         """
-        if self.ncycles is None or time / self.period <= self.ncycles:
-            return np.sin(2 * np.pi * time / self.period + self.phase)
+        time = np.asarray(time, dtype=float)
+        if self.waveform == 'sine':
+            value = np.sin(2 * np.pi * time / self.period + self.phase)
+            active = (self.ncycles is None) | (time / self.period <= (self.ncycles or 0))
+        elif self.waveform in ['ricker', 'gaussian']:
+            # Delay the pulse by one period so it starts close to zero
+            argument = (np.pi * (time - self.period) / self.period) ** 2
+            value = np.exp(-argument)
+            if self.waveform == 'ricker':
+                value = (1 - 2 * argument) * value
+            active = True
+        elif self.waveform == 'chirp':
+            # Frequency changes linearly from the start to the end period
+            length = self.ncycles * self.period
+            rate = (1 / self.end_period - 1 / self.period) / length
+            value = np.sin(2 * np.pi * (time / self.period + rate * time ** 2 / 2) + self.phase)
+            active = time <= length
+        elif self.waveform == 'array':
+            index = np.rint(time / self.time_step).astype(int)
+            active = index < len(self.samples)
+            value = np.asarray(self.samples)[np.where(active, index, 0)]
         else:
-            return 0
+            raise ValueError(f'Waveform {self.waveform} not recognized, use one of {WAVEFORMS}')
+        return self.amplitude * np.where(active, value, 0)
 
     def value(self, time):
         """Get value of the source on grid at a certain time.
@@ -88,4 +140,34 @@ class Source(NamedTuple):
             Value of the source at that moment in time over the
             whole grid.
         """
-        return self.weight * self.profile(time)
\ No newline at end of file
+        return self.weight * self.profile(time)
+
+    def pad(self, value, pml_thickness):
+        """Pad value of the source into a perfectly matched layer.
+
+        The source is extended into the layer from the edge of the grid,
+        see `extend`. Along axes it is not extended along it is padded with
+        zeros.
+
+        Parameters
+        ----------
+        value : array
+            Value of the source over the whole grid.
+        pml_thickness : int
+            Thickness of the perfectly matched layer in pixels.
+
+        Returns
+        -------
+        array
+            Value of the source over the whole grid including the
+            perfectly matched layer.
+        """
+        if self.extend:
+            return np.pad(value, pml_thickness, 'edge')
+
+        for axis, loc in enumerate(self.location):
+            pad_width = [(0, 0)] * len(self.location)
+            pad_width[axis] = (pml_thickness, pml_thickness)
+            mode = 'edge' if loc is None else 'constant'
+            value = np.pad(value, pad_width, mode)
+        return value
@@ -0,0 +1,87 @@
+import os
+import time
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+import numpy as np
+import pytest
+
+from waver.simulation import ResultCache, run_single_source
+from waver.simulation import _cache
+from waver.simulation._cache import hash_inputs
+from waver.simulation._grid import Grid
+
+
+def test_hash_inputs():
+    """Test hashing inputs depends on their values only."""
+    grid = Grid(size=(1e-3, 1e-3), spacing=1e-4)
+    speed = np.ones((10, 10))
+
+    assert hash_inputs(grid, speed, 1e-8) == hash_inputs(Grid(size=(1e-3, 1e-3), spacing=1e-4), speed.copy(),
+                                                         np.float64(1e-8))
+    assert hash_inputs(grid, speed, 1e-8) != hash_inputs(grid, speed * 2, 1e-8)
+    assert hash_inputs(grid, speed, 1e-8) != hash_inputs(grid, speed.astype(np.float32), 1e-8)
+    assert hash_inputs(grid, speed, 1e-8) != hash_inputs(grid._replace(pml_thickness=1), speed, 1e-8)
+
+    with pytest.raises(TypeError):
+        hash_inputs(object())
+
+
+def test_result_cache_eviction():
+    """Test the least recently used results are evicted."""
+    values = np.zeros(1000)
+    with TemporaryDirectory() as path:
+        path = Path(path)
+        cache = ResultCache(path)
+        cache.put('a', values=values)
+        size = cache.stats['nbytes']
+
+        cache = ResultCache(path, max_bytes=2 * size)
+        cache.put('b', values=values)
+        os.utime(path / 'a.npz', (time.time() - 10, time.time() - 10))
+        os.utime(path / 'b.npz', (time.time() - 5, time.time() - 5))
+
+        # Use a so b is the least recently used
+        assert cache.get('a') is not None
+        cache.put('c', values=values)
+
+        assert cache.get('b') is None
+        assert cache.get('c') is not None
+        assert cache.stats == {'hits': 2, 'misses': 1, 'entries': 2, 'nbytes': 2 * size}
+
+        cache.clear()
+        assert cache.stats == {'hits': 0, 'misses': 0, 'entries': 0, 'nbytes': 0}
+
+
+def test_run_single_source_cache(monkeypatch):
+    """Test running a single source returns cached results."""
+    params = {
+        'size': (1.6e-3, 1.6e-3),
+        'spacing': 100e-6,
+        'duration': 5e-6,
+        'max_speed': 686,
+        'time_step': 50e-9,
+        'pml_thickness': 4,
+        'location': (0.8e-3, 0.8e-3),
+        'period': 5e-6,
+        'progress': False,
+    }
+    with TemporaryDirectory() as path:
+        cache = ResultCache(path)
+        wave, speed = run_single_source(**params, speed=500, cache=cache)
+        cached_wave, cached_speed = run_single_source(**params, speed=500, cache=cache)
+
+        np.testing.assert_array_equal(cached_wave, wave)
+        np.testing.assert_array_equal(cached_speed, speed)
+        assert cache.stats['hits'] == 1
+        assert cache.stats['misses'] == 1
+
+        # Changing the speed changes the result
+        other_wave, _ = run_single_source(**params, speed=600, cache=path)
+        assert not np.array_equal(other_wave, wave)
+        assert cache.stats['entries'] == 2
+
+        # Results of an older solver are not read
+        monkeypatch.setattr(_cache, 'SOLVER_VERSION', _cache.SOLVER_VERSION + 1)
+        run_single_source(**params, speed=500, cache=cache)
+        assert cache.stats['misses'] == 2
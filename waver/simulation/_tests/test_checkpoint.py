@@ -0,0 +1,50 @@
+import pytest
+
+from waver.simulation._checkpoint import checkpoint_number, max_reversible_steps, reverse_steps
+
+
+@pytest.mark.parametrize("nsteps", [1, 2, 10, 57])
+@pytest.mark.parametrize("ncheckpoints", [1, 2, 3, 6])
+def test_reverse_steps(nsteps, ncheckpoints):
+    """Test steps are reversed in order from the right state."""
+    state = {'step': 0}
+    checkpoints = []
+    reversed_steps = []
+
+    def advance(step):
+        assert state['step'] == step
+        state['step'] += 1
+
+    def reverse(step):
+        assert state['step'] == step
+        reversed_steps.append(step)
+
+    def snapshot():
+        checkpoints.append(state['step'])
+        return state['step']
+
+    def restore(step):
+        state['step'] = step
+
+    nadvanced = reverse_steps(nsteps, ncheckpoints, advance=advance, reverse=reverse,
+                              snapshot=snapshot, restore=restore)
+
+    assert reversed_steps == list(range(nsteps - 1, -1, -1))
+
+    # Number of advanced steps matches the optimal binomial schedule
+    ncheckpoints = min(ncheckpoints, nsteps)
+    nrepetitions = 0
+    while max_reversible_steps(ncheckpoints, nrepetitions) < nsteps:
+        nrepetitions += 1
+    expected = nrepetitions * nsteps - max_reversible_steps(ncheckpoints + 1, nrepetitions - 1)
+    assert nadvanced == max(expected, nsteps - 1)
+
+
+def test_checkpoint_number():
+    """Test number of checkpoints from a memory budget."""
+    assert checkpoint_number(1000, 100) == 10
+    assert checkpoint_number(1000, 100, memory=550) == 5
+    assert checkpoint_number(4, 100, memory=1e6) == 4
+
+    with pytest.raises(ValueError):
+        checkpoint_number(1000, 100, memory=50)
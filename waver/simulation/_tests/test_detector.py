@@ -123,6 +123,7 @@ def test_detector(detector_params, expected_params):
     assert detector.shape == detector_params['shape']
     assert len(detector.downsample_shape) == len(detector.shape)
     assert detector.downsample_shape == expected_params['downsample_shape']
+    assert detector.index.shape == (len(detector.shape),) + expected_params['downsample_shape']
 
     # Record wave
     wave = np.zeros(detector_params['shape'])
@@ -131,3 +132,16 @@ def test_detector(detector_params, expected_params):
 
     # Note that sampling never changes the dimensionality of the wave
     assert wave.ndim == detected_wave.ndim
+
+
+@pytest.mark.parametrize("edge", [None, 2])
+def test_detector_scatter(edge):
+    """Test scattering is the transpose of sampling."""
+    detector = Detector(shape=(12, 12), spacing=(1,), spatial_downsample=2, boundary=2, edge=edge)
+    wave = np.random.random(detector.shape)
+    detected = np.random.random(detector.downsample_shape)
+    scattered = detector.scatter(detected)
+
+    assert scattered.shape == detector.shape
+    np.testing.assert_allclose(np.sum(detector.sample(wave[detector.grid_index]) * detected),
+                               np.sum(wave * scattered))
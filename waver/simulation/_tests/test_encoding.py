@@ -0,0 +1,39 @@
+import numpy as np
+import pytest
+
+from waver.simulation._encoding import make_encoding_codes, encoding_crosstalk, decode_sources
+
+
+def test_make_encoding_codes():
+    """Test making reproducible polarity codes."""
+    codes = make_encoding_codes(10, 4, nencodings=2, seed=0)
+
+    # Ten sources in groups of four give three groups with two encodings each
+    assert codes.shape == (6, 10)
+    assert set(np.unique(codes)) <= {-1, 0, 1}
+    assert np.all(np.count_nonzero(codes, axis=0) == 2)
+    assert np.all(np.count_nonzero(codes, axis=1) == [4, 4, 4, 4, 2, 2])
+
+    np.testing.assert_array_equal(codes, make_encoding_codes(10, 4, nencodings=2, seed=0))
+
+
+@pytest.mark.parametrize("codes, expected", [
+    (np.eye(3), 0),
+    (np.array([[1, -1, 1]]), 1),
+    (np.array([[1, 1], [1, -1]]), 0),
+])
+def test_encoding_crosstalk(codes, expected):
+    """Test crosstalk level of codes."""
+    assert encoding_crosstalk(codes) == expected
+
+
+def test_decode_sources():
+    """Test separating encoded waves."""
+    waves = np.random.random((2, 5, 3))
+    codes = np.array([[1, 1], [1, -1]])
+    encoded = np.tensordot(codes, waves, axes=1)
+
+    decoded, crosstalk = decode_sources(encoded, codes)
+
+    np.testing.assert_allclose(decoded, waves)
+    assert crosstalk == 0
@@ -0,0 +1,24 @@
+import numpy as np
+
+from waver.simulation._green import lattice_wavenumber, homogeneous_response
+
+
+def test_lattice_wavenumber():
+    """Test wavenumber along an axis of the grid matches 1D dispersion."""
+    wavenumber_squared = np.linspace(0.01, 3, 10)
+    direction = np.array([1, 0])[:, np.newaxis]
+    wavenumber = lattice_wavenumber(wavenumber_squared, direction, 1)
+
+    np.testing.assert_allclose(wavenumber, np.arccos(1 - wavenumber_squared / 2))
+
+
+def test_homogeneous_response_symmetry():
+    """Test response is symmetric under flipping and swapping axes."""
+    profile = np.sin(np.linspace(0, 2 * np.pi, 50))
+    offset = np.array([[3, -3, 5, 0], [5, 5, 3, 0]])
+    response = homogeneous_response(profile, offset, 686, 50e-9, 100e-6)
+
+    assert response.shape == (50, 4)
+    np.testing.assert_array_equal(response[:, 0], response[:, 1])
+    np.testing.assert_array_equal(response[:, 0], response[:, 2])
+    assert np.abs(response[:, 3]).max() > np.abs(response[:, 0]).max()
@@ -0,0 +1,19 @@
+import numpy as np
+
+from waver.simulation._receivers import Receivers
+
+
+def test_receivers():
+    """Test receivers interpolate a linear wave exactly."""
+    coordinates = ((0.15, 0.3), (0.0, 0.0), (1.55, 0.72), (1.6, 0.8))
+    receivers = Receivers(coordinates=coordinates, spacing=0.1, shape=(16, 8), pml_thickness=2)
+
+    assert receivers.nreceivers == 4
+    assert receivers.matrix.shape == (4, 20 * 12)
+    np.testing.assert_allclose(receivers.matrix.sum(axis=1), 1)
+
+    # Linear wave on the grid including the pml
+    indices = np.indices((20, 12)) - 2
+    wave = 2 * indices[0] - 3 * indices[1] + 1
+    expected = [2 * 1.5 - 3 * 3 + 1, 1, 2 * 15 - 3 * 7 + 1, 2 * 15 - 3 * 7 + 1]
+    np.testing.assert_allclose(receivers.sample(wave), expected)
@@ -0,0 +1,36 @@
+import numpy as np
+import pytest
+
+from waver.simulation._reducers import FirstArrival, make_reducer
+
+
+def test_reducers():
+    """Test reducers match reductions of the full time series."""
+    wave = np.random.standard_normal((20, 4, 5))
+    times = np.arange(20) * 0.1
+    reducers = [make_reducer(name) for name in ['peak', 'rms', 'time_of_max']] + [FirstArrival(1.5)]
+    for reducer in reducers:
+        reducer.reset((4, 5))
+        for frame, time in zip(wave, times):
+            reducer.update(frame, time)
+
+    np.testing.assert_allclose(reducers[0].value, np.abs(wave).max(axis=0))
+    np.testing.assert_allclose(reducers[1].value, np.sqrt(np.mean(wave ** 2, axis=0)))
+    np.testing.assert_allclose(reducers[2].value, times[np.argmax(np.abs(wave), axis=0)])
+
+    arrived = np.abs(wave) >= 1.5
+    expected = np.where(arrived.any(axis=0), times[np.argmax(arrived, axis=0)], np.nan)
+    np.testing.assert_allclose(reducers[3].value, expected)
+
+
+def test_make_reducer():
+    """Test making reducers from names."""
+    assert make_reducer('peak').name == 'peak'
+    reducer = FirstArrival(0.1, name='arrival')
+    assert make_reducer(reducer) is reducer
+
+    with pytest.raises(ValueError):
+        make_reducer('first_arrival')
+
+    with pytest.raises(ValueError):
+        make_reducer('median')
@@ -1,4 +1,7 @@
-from waver.simulation import Simulation, run_single_source, run_multiple_sources
+import functools
+import numpy as np
+from waver.simulation import (Simulation, run_single_source, run_multiple_sources, run_encoded_sources,
+                             run_travel_times, run_reverse_time_migration, l2_misfit)
 import pytest
 
 
@@ -254,3 +257,442 @@ def test_multiple_source(sim_dict, expected_dict, n_sources):
 
     # Note that the dimensionality of the detecteds wave matches grid
     assert detected_waves.ndim == grid_speed.ndim
+
+
+@pytest.mark.parametrize("reciprocity", [True, 'auto'])
+def test_multiple_source_reciprocity(reciprocity):
+    """Test running multiple sources using reciprocity."""
+    speed = 343 + 343 * np.random.random((32, 32))
+    sim_dict = {
+        'size': (3.2e-3, 3.2e-3),
+        'spacing': 100e-6,
+        'max_speed': 686,
+        'min_speed': 343,
+        'time_step': 50e-9,
+        'duration': 5e-6,
+        'pml_thickness': 10,
+        'speed': speed,
+        'boundary': 1,
+        'edge': 1,
+    }
+    # Place more sources than detector pixels so auto mode uses reciprocity
+    sources = [{'location': (x, 0.5e-3), 'period': 5e-6, 'ncycles': 1} for x in np.linspace(0.1e-3, 3.0e-3, 40)]
+
+    # Run simulation with and without reciprocity
+    detected_waves, grid_speed = run_multiple_sources(sources=sources, **sim_dict)
+    reciprocal_waves, reciprocal_speed = run_multiple_sources(sources=sources, reciprocity=reciprocity, **sim_dict)
+
+    # Confirm reciprocal waves match the directly simulated ones
+    assert reciprocal_waves.shape == detected_waves.shape
+    np.testing.assert_allclose(reciprocal_waves, detected_waves, atol=1e-10)
+    np.testing.assert_array_equal(reciprocal_speed, grid_speed)
+
+
+def test_multiple_source_reciprocity_edge():
+    """Test reciprocity is not used for sources on the edge of the grid."""
+    sim_dict = {'size': (3.2e-3,), 'spacing': 100e-6, 'duration': 5e-6, 'max_speed': 686, 'time_step': 50e-9,
+                'pml_thickness': 4, 'boundary': 1}
+    sources = [{'location': (x,), 'period': 5e-6, 'ncycles': 1} for x in (0, 1e-3, 2e-3)]
+
+    with pytest.raises(ValueError):
+        run_multiple_sources(sources=sources, reciprocity=True, **sim_dict)
+
+    detected_waves, _ = run_multiple_sources(sources=sources, **sim_dict)
+    auto_waves, _ = run_multiple_sources(sources=sources, reciprocity='auto', **sim_dict)
+    np.testing.assert_array_equal(auto_waves, detected_waves)
+
+
+def test_multiple_source_reciprocity_profiles():
+    """Test reciprocity requires sources with the same profile."""
+    sources = [{'location': (0,), 'period': 5e-6}, {'location': (1e-3,), 'period': 10e-6}]
+
+    with pytest.raises(ValueError):
+        run_multiple_sources(size=(3.2e-3,), spacing=100e-6, sources=sources, duration=5e-6,
+            max_speed=686, boundary=1, reciprocity=True)
+
+    # Auto mode runs one simulation per source instead
+    sim_dict = {'size': (3.2e-3,), 'spacing': 100e-6, 'duration': 5e-6, 'max_speed': 686, 'time_step': 50e-9,
+                'pml_thickness': 4, 'boundary': 1}
+    sources = [{'location': (x,), 'period': period, 'ncycles': 1}
+               for x, period in zip(np.linspace(0.5e-3, 2.5e-3, 5), [5e-6, 4e-6] * 3)]
+    detected_waves, _ = run_multiple_sources(sources=sources, **sim_dict)
+    auto_waves, _ = run_multiple_sources(sources=sources, reciprocity='auto', **sim_dict)
+    np.testing.assert_array_equal(auto_waves, detected_waves)
+
+
+def test_encoded_sources():
+    """Test running multiple sources with simultaneous source encoding."""
+    sim_dict = {
+        'size': (3.2e-3, 3.2e-3),
+        'spacing': 100e-6,
+        'max_speed': 686,
+        'time_step': 50e-9,
+        'duration': 5e-6,
+        'pml_thickness': 10,
+        'boundary': 1,
+    }
+    sources = [{'location': (x, 0.5e-3), 'period': 5e-6} for x in np.linspace(0, 3.1e-3, 4)]
+    # Source amplitudes combine with the codes
+    sources[1]['amplitude'] = -2
+
+    # Run simulations with and without encoding
+    detected_waves, _ = run_multiple_sources(sources=sources, **sim_dict)
+    encoded_waves, grid_speed, codes = run_encoded_sources(sources=sources, encoding_size=2, seed=0, **sim_dict)
+
+    # Two sources are fired in each simulation
+    assert codes.shape == (2, 4)
+    assert encoded_waves.shape == (2,) + detected_waves.shape[1:]
+    assert grid_speed.shape == (1, 1, 32, 32)
+
+    # Confirm encoded waves are the superposition of the coded sources
+    expected_waves = np.tensordot(codes, detected_waves, axes=1)
+    np.testing.assert_allclose(encoded_waves, expected_waves, atol=1e-10)
+
+
+@pytest.mark.parametrize("sim_dict, tolerance", [
+    # 1D point source, interior pixels that reflections do not reach
+    ({
+        'size': (12.8e-3,),
+        'location': (6.4e-3,),
+        'boundary': 0,
+        'duration': 15e-6,
+        'index': (slice(None), slice(44, 84)),
+    }, 1e-6),
+    # 2D point source, full boundary
+    ({
+        'size': (6.4e-3, 6.4e-3),
+        'location': (3.2e-3, 3.2e-3),
+        'boundary': 1,
+        'duration': 12e-6,
+        'index': Ellipsis,
+    }, 0.1),
+    # 3D point source, single edge
+    ({
+        'size': (3.2e-3, 3.2e-3, 3.2e-3),
+        'location': (1.6e-3, 1.6e-3, 1.6e-3),
+        'boundary': 1,
+        'edge': 0,
+        'duration': 6e-6,
+        'index': Ellipsis,
+    }, 0.1),
+])
+def test_single_source_analytic(sim_dict, tolerance):
+    """Test analytic solution in a homogeneous medium matches time stepping."""
+    sim_dict = sim_dict.copy()
+    index = sim_dict.pop('index')
+    sim_dict.update({
+        'spacing': 100e-6,
+        'max_speed': 686,
+        'speed': 686,
+        'time_step': 50e-9,
+        'period': 5e-6,
+        'temporal_downsample': 2,
+    })
+
+    detected_wave, grid_speed = run_single_source(**sim_dict)
+    analytic_wave, analytic_speed = run_single_source(**sim_dict, analytic=True)
+
+    assert analytic_wave.shape == detected_wave.shape
+    np.testing.assert_array_equal(analytic_speed, grid_speed)
+    error = np.abs(analytic_wave[index] - detected_wave[index]).max() / np.abs(detected_wave).max()
+    assert error < tolerance
+
+
+def test_supports_analytic():
+    """Test when the analytic solution can be used."""
+    sim = Simulation(size=(3.2e-3, 3.2e-3), spacing=100e-6, max_speed=686)
+    sim.add_source(location=(1.6e-3, 1.6e-3), period=5e-6)
+    sim.add_detector(boundary=1)
+    assert sim.supports_analytic
+
+    # Not supported for line sources
+    sim.add_source(location=(1.6e-3, None), period=5e-6)
+    assert not sim.supports_analytic
+
+    # Not supported for non uniform speed
+    sim = Simulation(size=(3.2e-3, 3.2e-3), spacing=100e-6, max_speed=686)
+    sim.set_speed(np.random.random((32, 32)) * 686)
+    sim.add_source(location=(1.6e-3, 1.6e-3), period=5e-6)
+    sim.add_detector(boundary=1)
+    assert not sim.supports_analytic
+    with pytest.raises(ValueError):
+        sim.run_analytic(duration=5e-6)
+
+    # Not supported with a thin perfectly matched layer, which reflects
+    sim = Simulation(size=(3.2e-3, 3.2e-3), spacing=100e-6, max_speed=686, pml_thickness=8)
+    sim.add_source(location=(1.6e-3, 1.6e-3), period=5e-6)
+    sim.add_detector(boundary=1)
+    assert not sim.supports_analytic
+
+    # Not supported for long waves relative to the perfectly matched layer
+    sim = Simulation(size=(3.2e-3, 3.2e-3), spacing=100e-6, max_speed=686)
+    sim.add_source(location=(1.6e-3, 1.6e-3), period=20e-6)
+    sim.add_detector(boundary=1)
+    assert not sim.supports_analytic
+
+    # Not supported with detector pixels next to a source
+    sim.clear_sources()
+    sim.add_source(location=(1.6e-3, 1.6e-3), period=5e-6)
+    sim.add_detector()
+    assert not sim.supports_analytic
+
+    # Not supported with receivers, which are only recorded by time stepping
+    sim.add_detector(boundary=1)
+    assert sim.supports_analytic
+    sim.add_receivers([[0.8e-3, 0.8e-3]])
+    assert not sim.supports_analytic
+    with pytest.raises(ValueError):
+        sim.run_analytic(duration=5e-6)
+
+
+def test_single_source_analytic_fallback():
+    """Test simulations the analytic solution is not accurate for are time stepped."""
+    sim_dict = {'size': (3.2e-3, 3.2e-3), 'spacing': 100e-6, 'location': (1.6e-3, 1.6e-3), 'period': 5e-6,
+                'duration': 10e-6, 'max_speed': 686, 'speed': 500, 'time_step': 50e-9, 'pml_thickness': 8,
+                'boundary': 1}
+    detected_wave, _ = run_single_source(**sim_dict)
+    analytic_wave, _ = run_single_source(**sim_dict, analytic=True)
+    np.testing.assert_array_equal(analytic_wave, detected_wave)
+
+
+def test_travel_times():
+    """Test computing first arrival times for multiple sources."""
+    sim_dict = {
+        'size': (3.2e-3, 3.2e-3),
+        'spacing': 100e-6,
+        'max_speed': 686,
+        'pml_thickness': 10,
+        'boundary': 1,
+        'edge': 1,
+    }
+    sources = [{'location': (x, 1.6e-3), 'period': 5e-6} for x in [0.55e-3, 2.55e-3]]
+    travel_times, grid_speed = run_travel_times(sources=sources, **sim_dict)
+
+    assert travel_times.shape == (2, 1, 32)
+    assert grid_speed.shape == (1, 1, 32, 32)
+    # Detector pixel closest to each source sees it first
+    assert np.argmin(travel_times[0, 0]) == 5
+    assert np.argmin(travel_times[1, 0]) == 25
+
+
+@pytest.mark.parametrize("with_pml", [False, True])
+def test_adjoint_gradient(with_pml):
+    """Test adjoint gradient of a misfit matches finite differences."""
+    def run(speed, adjoint=False):
+        sim = Simulation(size=(1.6e-3, 1.6e-3), spacing=100e-6, max_speed=686, time_step=50e-9, pml_thickness=5)
+        sim.set_speed(speed)
+        sim.add_source(location=(0.45e-3, 0.85e-3), period=2e-6, ncycles=1)
+        sim.add_detector(boundary=1, with_pml=with_pml)
+        if adjoint:
+            return sim.run_adjoint(8e-6, misfit, temporal_downsample=2, progress=False)
+        sim.run(8e-6, temporal_downsample=2, progress=False)
+        return sim.detected_wave
+
+    rng = np.random.default_rng(0)
+    misfit = functools.partial(l2_misfit, observed=run(500))
+    speed = 400 + 200 * rng.random((16, 16))
+    value, gradient = run(speed, adjoint=True)
+
+    assert gradient.shape == (16, 16)
+    assert value == misfit(run(speed))[0]
+
+    # Compare with central difference along a random direction
+    direction = rng.standard_normal((16, 16))
+    step = 1e-3
+    difference = (misfit(run(speed + step * direction))[0] - misfit(run(speed - step * direction))[0]) / (2 * step)
+    np.testing.assert_allclose(np.sum(gradient * direction), difference, rtol=1e-5)
+
+
+def test_adjoint_checkpoint_memory():
+    """Test adjoint gradient does not depend on the checkpoint memory."""
+    sim = Simulation(size=(1.6e-3, 1.6e-3), spacing=100e-6, max_speed=686, time_step=50e-9, pml_thickness=5)
+    sim.set_speed(400 + 200 * np.random.random((16, 16)))
+    sim.add_source(location=(0.45e-3, 0.85e-3), period=2e-6, ncycles=1)
+    sim.add_detector(boundary=1)
+    misfit = functools.partial(l2_misfit, observed=0)
+
+    # Store every time step, or only two checkpoints
+    state_nbytes = 4 * 26 * 26 * 8
+    value, gradient = sim.run_adjoint(8e-6, misfit, checkpoint_memory=160 * state_nbytes, progress=False)
+    detected_wave = sim.detected_wave
+    low_value, low_gradient = sim.run_adjoint(8e-6, misfit, checkpoint_memory=2 * state_nbytes, progress=False)
+
+    assert low_value == value
+    np.testing.assert_array_equal(sim.detected_wave, detected_wave)
+    np.testing.assert_allclose(low_gradient, gradient, rtol=1e-12, atol=0)
+
+
+def test_adjoint_validation():
+    """Test the adjoint gradient checks the simulation before setting it up."""
+    sim = Simulation(size=(1.6e-3, 1.6e-3), spacing=100e-6, max_speed=686, time_step=50e-9, pml_thickness=5)
+    sim.add_detector(boundary=1)
+    with pytest.raises(ValueError):
+        sim.run_adjoint(8e-6, functools.partial(l2_misfit, observed=0), progress=False)
+    assert sim._wave_equation is None
+
+
+def test_resume_from_checkpoint(tmp_path):
+    """Test an interrupted and resumed run equals an uninterrupted one."""
+    def make_simulation():
+        sim = Simulation(size=(3.2e-3, 3.2e-3), spacing=100e-6, max_speed=686, time_step=50e-9, pml_thickness=5)
+        sim.add_source(location=(1.6e-3, 1.6e-3), period=5e-6, ncycles=1)
+        sim.add_detector(boundary=1)
+        return sim
+
+    sim = make_simulation()
+    sim.set_speed(343 + 343 * np.random.random((32, 32)))
+    speed = sim.grid_speed
+    sim.run(10e-6, temporal_downsample=2, progress=False)
+    detected_wave = sim.detected_wave
+
+    # Interrupt a run with checkpoints part way through
+    path = tmp_path / 'checkpoint.npz'
+    interrupted = make_simulation()
+    interrupted.set_speed(speed)
+    step = interrupted._step
+
+    def interrupt(current_step):
+        if current_step == 130:
+            raise KeyboardInterrupt
+        step(current_step)
+
+    interrupted._step = interrupt
+    with pytest.raises(KeyboardInterrupt):
+        interrupted.run(10e-6, temporal_downsample=2, progress=False, checkpoint_path=path, checkpoint_every=50)
+
+    # Resume in a new simulation, which gets the speed from the checkpoint
+    resumed = make_simulation()
+    resumed.resume(path, progress=False)
+    np.testing.assert_array_equal(resumed.grid_speed, speed)
+    np.testing.assert_array_equal(resumed.detected_wave, detected_wave)
+
+
+def test_reverse_time_migration():
+    """Test migrating scattered waves images a reflector."""
+    sim_dict = {
+        'size': (3.2e-3, 3.2e-3),
+        'spacing': 100e-6,
+        'max_speed': 686,
+        'time_step': 50e-9,
+        'duration': 15e-6,
+        'pml_thickness': 10,
+        'boundary': 1,
+        'edge': 0,
+    }
+    sources = [{'location': (0.25e-3, x), 'period': 3e-6, 'ncycles': 1} for x in [1.05e-3, 2.15e-3]]
+    speed = np.full((32, 32), 500.0)
+    speed[20:22, 8:24] = 650
+
+    # Migrate only the waves scattered by the reflector
+    detected_waves, _ = run_multiple_sources(sources=sources, speed=speed, **sim_dict)
+    background_waves, _ = run_multiple_sources(sources=sources, speed=500, **sim_dict)
+    image, grid_speed = run_reverse_time_migration(sources=sources, detected_waves=detected_waves - background_waves,
+                                                   speed=500, progress=False, **sim_dict)
+
+    assert image.shape == (32, 32)
+    assert grid_speed.shape == (1, 1, 32, 32)
+    profile = np.abs(image[:, 8:24]).mean(axis=1)
+    assert abs(np.argmax(profile[10:]) + 10 - 20) <= 1
+
+
+def test_reverse_time_migration_validation():
+    """Test migration checks the simulation before setting it up."""
+    sim = Simulation(size=(1.6e-3, 1.6e-3), spacing=100e-6, max_speed=686, time_step=50e-9, pml_thickness=5)
+    sim.add_source(location=(0.8e-3, 0.8e-3), period=2e-6, ncycles=1)
+    with pytest.raises(ValueError):
+        sim.run_migration(8e-6, np.zeros((160, 4, 16)), progress=False)
+    assert sim._wave_equation is None
+
+
+def test_run_reducers():
+    """Test running with reducers matches reducing the detected wave."""
+    sim = Simulation(size=(3.2e-3, 3.2e-3), spacing=100e-6, max_speed=686, time_step=50e-9, pml_thickness=5)
+    sim.add_source(location=(1.6e-3, 1.6e-3), period=5e-6, ncycles=1)
+    sim.add_detector(spatial_downsample=2)
+    sim.run(10e-6, temporal_downsample=2, progress=False)
+    detected_wave = sim.detected_wave
+
+    sim.run(10e-6, temporal_downsample=2, progress=False, reducers=['peak', 'rms', 'time_of_max'])
+    reduced_wave = sim.reduced_wave
+
+    assert set(reduced_wave) == {'peak', 'rms', 'time_of_max'}
+    np.testing.assert_allclose(reduced_wave['peak'], np.abs(detected_wave).max(axis=0))
+    np.testing.assert_allclose(reduced_wave['rms'], np.sqrt(np.mean(detected_wave ** 2, axis=0)))
+    times = np.array(sim.time.values[::2])
+    np.testing.assert_allclose(reduced_wave['time_of_max'], times[np.argmax(np.abs(detected_wave), axis=0)])
+
+    with pytest.raises(ValueError):
+        sim.detected_wave
+
+
+def test_frequency_detector():
+    """Test detecting selected frequencies matches the fft of the detected wave."""
+    sim = Simulation(size=(3.2e-3, 3.2e-3), spacing=100e-6, max_speed=686, time_step=50e-9, pml_thickness=5)
+    sim.add_source(location=(1.6e-3, 1.6e-3), period=5e-6, ncycles=1)
+    sim.add_detector(boundary=1)
+    sim.run(10e-6, temporal_downsample=2, progress=False)
+    spectrum = np.fft.fft(sim.detected_wave, axis=0)
+
+    # Harmonics of the source land on frequencies of the fft
+    frequencies = [1 / 5e-6, 2 / 5e-6]
+    sim.add_detector(boundary=1, frequencies=frequencies)
+    sim.run(10e-6, temporal_downsample=2, progress=False)
+
+    assert sim.detected_spectrum.shape == (2,) + sim.detector.downsample_shape
+    np.testing.assert_allclose(sim.detected_spectrum, spectrum[[2, 4]], atol=1e-12)
+    assert not sim.supports_analytic
+
+    with pytest.raises(ValueError):
+        sim.detected_wave
+
+
+def test_receivers():
+    """Test recording at receivers with and without a detector."""
+    def make_simulation():
+        sim = Simulation(size=(3.2e-3, 3.2e-3), spacing=100e-6, max_speed=686, time_step=50e-9, pml_thickness=5)
+        sim.add_source(location=(1.6e-3, 1.6e-3), period=5e-6, ncycles=1)
+        sim.add_receivers([[1.2e-3, 0.6e-3], [0.25e-3, 3.2e-3]])
+        return sim
+
+    sim = make_simulation()
+    sim.add_detector()
+    sim.run(10e-6, temporal_downsample=2, progress=False)
+    detected_wave = sim.detected_wave
+
+    sim = make_simulation()
+    sim.run(10e-6, temporal_downsample=2, progress=False)
+
+    assert sim.detected_receivers.shape == (100, 2)
+    np.testing.assert_allclose(sim.detected_receivers[:, 0], detected_wave[:, 12, 6], rtol=1e-6)
+    np.testing.assert_allclose(sim.detected_receivers[:, 1], (detected_wave[:, 2, 31] + detected_wave[:, 3, 31]) / 2)
+
+    # Receivers outside the grid are rejected rather than moved to its edge
+    with pytest.raises(ValueError):
+        sim.add_receivers([[1.2e-3, 0.6e-3], [3.3e-3, 1.6e-3]])
+    with pytest.raises(ValueError):
+        sim.add_receivers([[-0.1e-3, 1.6e-3]])
+
+
+def test_multiple_waveforms():
+    """Test sources with different waveforms fired together add up."""
+    sources = [
+        {'location': (0.8e-3, 0.8e-3), 'period': 5e-6, 'ncycles': 1},
+        {'location': (2.4e-3, 1.6e-3), 'period': 4e-6, 'waveform': 'ricker', 'amplitude': -2},
+        {'location': (1.6e-3, 2.4e-3), 'period': 6e-6, 'ncycles': 2, 'waveform': 'chirp', 'end_period': 3e-6},
+        {'location': (1.6e-3, None), 'waveform': 'array', 'samples': np.random.random(50)},
+    ]
+
+    def run(sources):
+        sim = Simulation(size=(3.2e-3, 3.2e-3), spacing=100e-6, max_speed=686, time_step=50e-9, pml_thickness=5)
+        for source in sources:
+            sim.add_source(**source)
+        sim.add_detector(boundary=1)
+        sim.run(10e-6, progress=False)
+        return sim.detected_wave
+
+    combined = run(sources)
+    separate = sum(run([source]) for source in sources)
+    np.testing.assert_allclose(combined, separate, atol=1e-12)
+
+    with pytest.raises(ValueError):
+        run([{'location': (0.8e-3, 0.8e-3), 'period': 5e-6, 'waveform': 'chirp'}])
@@ -1,4 +1,5 @@
 import numpy as np
+import pytest
 
 from waver.simulation._source import Source
 
@@ -95,4 +96,66 @@ def test_spatial_source():
 
     # Test full value is correct
     np.testing.assert_almost_equal(source.value(0), 0 * weight)
-    np.testing.assert_almost_equal(source.value(0.025), weight)
\ No newline at end of file
+    np.testing.assert_almost_equal(source.value(0.025), weight)
+
+
+def test_source_amplitude():
+    """Test a source with flipped polarity."""
+    source = Source(location=(None, None),
+                    shape=(2, 2),
+                    spacing=0.1,
+                    period=0.1,
+                    phase=0,
+                    ncycles=None,
+                    amplitude=-2)
+
+    np.testing.assert_almost_equal(source.profile(0.025), -2)
+
+
+@pytest.mark.parametrize("waveform, peak", [('ricker', 1), ('gaussian', 1)])
+def test_pulse_waveforms(waveform, peak):
+    """Test pulses are delayed by one period and start near zero."""
+    source = Source(location=(None,), shape=(2,), spacing=0.1, period=0.1, phase=0, ncycles=None,
+                    waveform=waveform)
+    time = np.linspace(0, 0.3, 301)
+    profile = source.profile(time)
+
+    assert profile.shape == time.shape
+    np.testing.assert_almost_equal(source.profile(0.1), peak)
+    assert np.argmax(profile) == 100
+    assert abs(profile[0]) < 1e-3
+
+
+def test_chirp_waveform():
+    """Test chirp changes frequency and stops after ncycles."""
+    source = Source(location=(None,), shape=(2,), spacing=0.1, period=0.1, phase=0, ncycles=4,
+                    waveform='chirp', end_period=0.05)
+    time = np.linspace(0, 0.5, 5001)
+    profile = source.profile(time)
+
+    # Zero crossings get closer together as the frequency increases
+    crossings = time[np.flatnonzero(np.diff(np.sign(profile[time < 0.4])))]
+    assert np.diff(crossings)[-1] < np.diff(crossings)[0]
+    np.testing.assert_array_equal(profile[time > 0.4], 0)
+
+
+def test_array_waveform():
+    """Test array source is sampled at each time step."""
+    source = Source(location=(None,), shape=(2,), spacing=0.1, period=None, phase=0, ncycles=None,
+                    waveform='array', samples=(1.0, -2.0, 3.0), time_step=0.5, amplitude=2)
+
+    np.testing.assert_array_equal(source.profile(np.arange(5) * 0.5), [2, -4, 6, 0, 0])
+
+
+def test_source_pad():
+    """Test sources on the edge are extended into the pml unless disabled."""
+    source = Source(location=(0, None), shape=(4, 3), spacing=1, period=1, phase=0, ncycles=1)
+
+    padded = source.pad(source.weight, 2)
+    np.testing.assert_array_equal(padded, np.pad(source.weight, 2, 'edge'))
+    assert np.all(padded[:3] == 1)
+
+    point = source._replace(extend=False).pad(source.weight, 2)
+    assert point.shape == (8, 7)
+    np.testing.assert_array_equal(point[:2], 0)
+    np.testing.assert_array_equal(point[2], 1)
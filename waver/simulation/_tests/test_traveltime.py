@@ -0,0 +1,49 @@
+import numpy as np
+
+from waver.simulation._traveltime import source_travel_time, sweep_planes, travel_time
+
+
+def test_sweep_planes():
+    """Test sweep covers all pixels once in order of the sweep."""
+    planes = sweep_planes((3, 4), (1, -1))
+
+    assert len(planes) == 3 + 4 - 1
+    index = np.concatenate(planes)
+    assert len(np.unique(index)) == 12
+    # First pixel updated is the corner the sweep starts from
+    np.testing.assert_array_equal(planes[0], [np.ravel_multi_index((1, 4), (5, 6))])
+
+
+def test_travel_time_1d():
+    """Test travel time is exact in 1D."""
+    speed = np.full(64, 500.0)
+    speed[32:] = 250
+    initial = np.full(64, np.inf)
+    initial[10] = 0
+    time = travel_time(speed, initial, 1e-4)
+
+    expected = np.abs(np.arange(64) - 10) * 1e-4 / 500
+    expected[32:] = expected[31] + np.arange(1, 33) * 1e-4 / 250
+    np.testing.assert_allclose(time, expected)
+
+
+def test_travel_time_homogeneous():
+    """Test travel time from a point source in a homogeneous medium."""
+    speed = np.full((64, 64), 500.0)
+    initial = source_travel_time(speed, (0, 0), (32, 20), 1e-4)
+    time = travel_time(speed, initial, 1e-4)
+
+    distance = np.sqrt(np.sum((np.indices((64, 64)) - np.array([32, 20])[:, np.newaxis, np.newaxis]) ** 2, axis=0))
+    expected = distance * 1e-4 / 500
+    np.testing.assert_allclose(time, expected, rtol=0.05, atol=1e-9)
+    # Travel time increases away from the source
+    assert np.all(np.diff(time[32, 20:]) > 0)
+
+
+def test_travel_time_line_source():
+    """Test travel time from a line source is a plane wave."""
+    speed = np.full((16, 16), 500.0)
+    initial = source_travel_time(speed, (None, 0), (slice(None), 4), 1e-4)
+    time = travel_time(speed, initial, 1e-4)
+
+    np.testing.assert_allclose(time, np.broadcast_to(np.abs(np.arange(16) - 4) * 1e-4 / 500, (16, 16)))
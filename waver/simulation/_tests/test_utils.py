@@ -1,6 +1,8 @@
+import numpy as np
 import pytest
 
-from waver.simulation._utils import location_to_index, fourier_sample, ifft_sample_1D
+from waver.simulation._utils import (location_to_index, fourier_sample, ifft_sample_1D, unpad_edge, generate_grid_speed,
+                                     generate_grid_speeds, run_rng, SPEED_METHODS)
 
 def test_location_to_index():
     """Test instantiating a time object."""
@@ -17,9 +19,75 @@ def test_fourier_sample(shape):
     assert values.shape == shape
 
 
+@pytest.mark.parametrize("shape", [(128,), (32, 24), ((16, 12, 10))])
+def test_fourier_sample_matches_direct_sum(shape):
+    """Test sampling matches summing the cosines over a full mesh."""
+    np.random.seed(0)
+    values = fourier_sample(shape)
+
+    # Direct sum over the mesh of values and frequencies
+    np.random.seed(0)
+    ndim = len(shape)
+    freq_cutoffs = tuple(np.random.randint(int(length / 2) - 1) + 1 for length in shape)
+    weight_shape = tuple(2 * f for f in freq_cutoffs)
+    weights = np.random.random(weight_shape)
+    weights = weights / np.sum(weights)
+    phi = np.random.random(weight_shape) * 2 * np.pi
+    slices_freq = tuple(slice(-f, f) for f in freq_cutoffs)
+    slices_values = tuple(slice(0, 1, 1/s) for s in shape)
+    mesh_values = np.mgrid[slices_values + slices_freq]
+    mesh_sum = np.sum([mesh_values[d]*mesh_values[d+ndim] for d in range(ndim)], axis=0)
+    expected = np.sum(weights * np.cos(mesh_sum + phi), axis=tuple(d+ndim for d in range(ndim)))
+    expected = (expected - expected.min()) / (expected.max() - expected.min())
+
+    np.testing.assert_allclose(values, expected, atol=1e-9)
+
+
+def test_fourier_sample_large():
+    """Test sampling a large grid."""
+    values = fourier_sample((512, 512))
+
+    assert values.shape == (512, 512)
+    assert values.min() == 0
+    assert values.max() == 1
+
+
 @pytest.mark.parametrize("length", [32, 16])
 def test_1D_ifft_sample(length):
     """Test sampling a 1D array with an ifft method."""
     values = ifft_sample_1D(length)
 
     assert values.shape == (length,)
+
+
+def test_unpad_edge():
+    """Test unpadding is the transpose of padding in edge mode."""
+    values = np.random.random((5, 4))
+    padded_values = np.random.random((11, 10))
+    unpadded = unpad_edge(padded_values, 3)
+
+    assert unpadded.shape == (5, 4)
+    np.testing.assert_allclose(np.sum(np.pad(values, 3, 'edge') * padded_values), np.sum(values * unpadded))
+
+
+@pytest.mark.parametrize("method", SPEED_METHODS)
+def test_generate_grid_speeds(method):
+    """Test each run of a batch matches generating it on its own."""
+    speeds = generate_grid_speeds(method, (16, 12), (1, 2), 6, seed=0)
+
+    assert speeds.shape == (6, 16, 12)
+    assert speeds.min() >= 1
+    assert speeds.max() <= 2
+
+    for run in range(6):
+        speed = generate_grid_speed(method, (16, 12), (1, 2), rng=run_rng(0, run))
+        np.testing.assert_allclose(speeds[run], speed)
+
+
+def test_generate_grid_speeds_split():
+    """Test runs are identical however the batch is split."""
+    speeds = generate_grid_speeds('mixed_random_fourier', (20, 20), (1, 2), 8, seed=5)
+    subset = generate_grid_speeds('mixed_random_fourier', (20, 20), (1, 2), [6, 1, 3], seed=5)
+
+    np.testing.assert_array_equal(speeds[[6, 1, 3]], subset)
+    assert not np.array_equal(speeds[0], speeds[1])
@@ -0,0 +1,155 @@
+import itertools
+
+import numpy as np
+
+
+# Radius in pixels around a source where the travel time is initialized
+# with the straight line travel time, which reduces the error of the first
+# order upwind scheme near the source.
+INITIAL_RADIUS = 3
+
+
+def sweep_planes(shape, direction):
+    """Flat indices of the pixels of a padded grid ordered for a sweep.
+
+    Pixels are grouped into hyperplanes of constant index sum along the
+    direction of the sweep. Pixels in the same hyperplane are never
+    neighbours, so can all be updated at once while still updating the
+    pixels in the order of the sweep.
+
+    Parameters
+    ----------
+    shape : tuple of int
+        Shape of the grid.
+    direction : tuple of int
+        Direction of the sweep along each axis, either 1 or -1.
+
+    Returns
+    -------
+    list of np.ndarray
+        Flat indices into the grid padded by one pixel on each side of the
+        pixels in each hyperplane, in the order they should be updated.
+    """
+    indices = np.indices(shape).reshape(len(shape), -1)
+    plane = np.sum([ind if d > 0 else s - 1 - ind for ind, s, d in zip(indices, shape, direction)], axis=0)
+    order = np.argsort(plane, kind='stable')
+    bounds = np.searchsorted(plane[order], np.arange(plane.max() + 2))
+    padded_index = np.ravel_multi_index(tuple(indices + 1), tuple(s + 2 for s in shape))[order]
+    return [padded_index[start:stop] for start, stop in zip(bounds[:-1], bounds[1:])]
+
+
+def godunov_update(neighbours, slowness):
+    """Solve the upwind discretization of the eikonal equation at a pixel.
+
+    Parameters
+    ----------
+    neighbours : np.ndarray
+        Smallest travel time of the two neighbours of each pixel along each
+        axis, with the axes along the first dimension.
+    slowness : np.ndarray
+        Time taken to cross each pixel.
+
+    Returns
+    -------
+    np.ndarray
+        Travel time at each pixel.
+    """
+    neighbours = np.sort(neighbours, axis=0)
+    ndim = neighbours.shape[0]
+    time = neighbours[0] + slowness
+    with np.errstate(invalid='ignore'):
+        for k in range(1, ndim):
+            # Include the next axis when the wave arrives later than its neighbour
+            use = time > neighbours[k]
+            used = np.where(use, neighbours[:k + 1], 0)
+            total = np.sum(used, axis=0)
+            squares = np.sum(used ** 2, axis=0)
+            discriminant = total ** 2 - (k + 1) * (squares - slowness ** 2)
+            candidate = (total + np.sqrt(np.maximum(discriminant, 0))) / (k + 1)
+            time = np.where(use, candidate, time)
+    return time
+
+
+def travel_time(speed, initial, spacing, max_iterations=20):
+    """First arrival travel time of a wave using the fast sweeping method.
+
+    Solves the eikonal equation `|grad T| = 1 / speed` with the travel time
+    fixed where it is already known, using Gauss-Seidel sweeps in
+    alternating directions across the grid.
+
+    Parameters
+    ----------
+    speed : np.ndarray
+        Speed of the wave in meters per second on the grid.
+    initial : np.ndarray
+        Known travel time in seconds, for example zero where the wave
+        starts, and infinite elsewhere.
+    spacing : float
+        Spacing of the grid in meters.
+    max_iterations : int, optional
+        Maximum number of iterations of sweeps in all directions. Iterations
+        stop early once the travel time stops changing.
+
+    Returns
+    -------
+    np.ndarray
+        Travel time in seconds of the wave to each pixel of the grid.
+    """
+    ndim = speed.ndim
+    padded_shape = tuple(s + 2 for s in speed.shape)
+    strides = [int(np.prod(padded_shape[axis + 1:])) for axis in range(ndim)]
+
+    # Pad arrays by one pixel so all pixels have neighbours
+    time = np.pad(initial.astype(float), 1, constant_values=np.inf).ravel()
+    fixed = np.isfinite(time)
+    slowness = np.pad(spacing / speed, 1, 'edge').ravel()
+
+    sweeps = [sweep_planes(speed.shape, direction)
+              for direction in itertools.product([1, -1], repeat=ndim)]
+
+    for _ in range(max_iterations):
+        changed = False
+        for planes in sweeps:
+            for index in planes:
+                neighbours = np.stack([np.minimum(time[index - s], time[index + s]) for s in strides])
+                updated = godunov_update(neighbours, slowness[index])
+                smaller = (updated < time[index]) & ~fixed[index]
+                if np.any(smaller):
+                    time[index[smaller]] = updated[smaller]
+                    changed = True
+        if not changed:
+            break
+
+    return time.reshape(padded_shape)[(slice(1, -1),) * ndim]
+
+
+def source_travel_time(speed, location, index, spacing, radius=INITIAL_RADIUS):
+    """Initial travel time of a wave around its source.
+
+    Parameters
+    ----------
+    speed : np.ndarray
+        Speed of the wave in meters per second on the grid.
+    location : tuple of float or None
+        Location of source in m. If None is passed at a certain location
+        of the tuple then the source is broadcast along the full extent
+        of that axis.
+    index : tuple of int or slice
+        Location of source in grid.
+    spacing : float
+        Spacing of the grid in meters.
+    radius : int, optional
+        Radius in pixels around the source where the straight line travel
+        time is used.
+
+    Returns
+    -------
+    np.ndarray
+        Travel time in seconds of the wave near the source and infinite
+        elsewhere.
+    """
+    # Distance to the source along the axes where it is localized
+    indices = np.indices(speed.shape)
+    distance = np.sqrt(np.sum([(indices[axis] - index[axis]) ** 2 for axis, loc in enumerate(location)
+                               if loc is not None], axis=0))
+    return np.where(distance <= radius, distance * spacing / speed, np.inf)
@@ -1,5 +1,6 @@
 import numpy as np
 from scipy.fft import ifft
+from scipy.signal import czt
 
 
 def location_to_index(location, spacing, shape):
@@ -89,10 +90,71 @@ def sample_boundary(wave, boundary, edge=None):
         return wave_at_boundary
 
 
-subs = ['', 'i', 'i,j', 'i,j,k', 'i,j,k,l']
+def unpad_edge(padded, pad_width):
+    """Transpose of padding an array in edge mode.
+
+    Parameters
+    ----------
+    padded : np.ndarray
+        Array defined on the padded grid.
+    pad_width : int
+        Number of pixels the array was padded by on each side of each axis.
+
+    Returns
+    -------
+    np.ndarray
+        Array on the unpadded grid, with the values in the pad added to the
+        edge pixels they were copied from.
+    """
+    out = padded
+    for axis in range(padded.ndim):
+        # Index of the unpadded pixel each padded pixel was copied from
+        length = padded.shape[axis] - 2 * pad_width
+        source = np.clip(np.arange(padded.shape[axis]) - pad_width, 0, length - 1)
+        moved = np.moveaxis(out, axis, 0)
+        unpadded = np.zeros((length,) + moved.shape[1:])
+        np.add.at(unpadded, source, moved)
+        out = np.moveaxis(unpadded, 0, axis)
+    return out
 
 
-def generate_grid_speed(method, shape, speed_range):
+SPEED_METHODS = ('flat', 'random', 'ifft', 'fourier', 'mixed_random_ifft', 'mixed_random_fourier')
+
+
+def run_rng(seed, run):
+    """Random number generator of a single run of a batch.
+
+    The generator of each run is seeded with a child of the seed spawned
+    for that run, so the values drawn for a run only depend on the seed and
+    the index of the run, not on which other runs are generated with it.
+
+    Parameters
+    ----------
+    seed : int or np.random.SeedSequence
+        Seed of the batch.
+    run : int
+        Index of the run.
+
+    Returns
+    -------
+    np.random.Generator
+        Random number generator of the run.
+    """
+    if isinstance(seed, np.random.SeedSequence):
+        entropy, spawn_key = seed.entropy, seed.spawn_key
+    else:
+        entropy, spawn_key = seed, ()
+    return np.random.default_rng(np.random.SeedSequence(entropy, spawn_key=tuple(spawn_key) + (int(run),)))
+
+
+def _integers(rng, high):
+    """Random integer from zero up to high with a generator or the legacy global state."""
+    if isinstance(rng, np.random.Generator):
+        return int(rng.integers(high))
+    return int(rng.randint(high))
+
+
+def generate_grid_speed(method, shape, speed_range, rng=None):
     """Generate a speed distribution according to sampling method.
 
     Parameters
@@ -103,6 +165,9 @@ def generate_grid_speed(method, shape, speed_range):
         Shape of grid that the speed distribution should be defined on.
     speed_range : tuple of float
         Minimum and maximum allowed speeds.
+    rng : np.random.Generator, optional
+        Random number generator. If None then the global `np.random` state
+        is used.
 
     Returns
     -------
@@ -110,93 +175,192 @@ def generate_grid_speed(method, shape, speed_range):
         Speed values matched to the shape of the grid, and in the
         allowed range, sampled according to input method.
     """
+    rng = np.random if rng is None else rng
+    return _grid_speeds(method, tuple(shape), speed_range, [rng])[0]
+
+
+def generate_grid_speeds(method, shape, speed_range, runs, seed=None):
+    """Generate a batch of speed distributions according to sampling method.
+
+    Each run draws from its own random number generator, spawned from the
+    seed for the index of the run, so a run is identical whichever other
+    runs are generated with it, for example when runs are split across
+    workers. The random parameters of each run are drawn one run at a time
+    and the speed distributions of all runs are then synthesized together.
+
+    Parameters
+    ----------
+    method : str
+        Method for generating the speed distributions, one of 'flat',
+        'random', 'ifft', 'fourier', 'mixed_random_ifft' or
+        'mixed_random_fourier'.
+    shape : tuple
+        Shape of grid that the speed distributions should be defined on.
+    speed_range : tuple of float
+        Minimum and maximum allowed speeds.
+    runs : int or sequence of int
+        Number of runs, or indices of the runs to generate.
+    seed : int or np.random.SeedSequence, optional
+        Seed of the batch. If None then fresh entropy is drawn, and runs are
+        only reproducible within a single call.
+
+    Returns
+    -------
+    speed : np.ndarray
+        Speed values of each run, of shape `(nruns,) + shape`.
+    """
+    if isinstance(runs, (int, np.integer)):
+        runs = range(runs)
+    if not isinstance(seed, np.random.SeedSequence):
+        seed = np.random.SeedSequence(seed)
+    rngs = [run_rng(seed, run) for run in runs]
+    return _grid_speeds(method, tuple(shape), speed_range, rngs)
+
+
+def _grid_speeds(method, shape, speed_range, rngs):
+    """Generate one speed distribution for each random number generator."""
+    if method not in SPEED_METHODS:
+        raise ValueError(f'Speed sampling method {method} not recognized for this grid shape')
+
     if method == 'flat':
-        speed = speed_range[0] * np.ones(shape)
+        return np.full((len(rngs),) + shape, speed_range[0], dtype=float)
     elif method == 'random':
-        speed = speed_range[0] + np.random.random(shape) * (speed_range[1] - speed_range[0])
+        output = np.stack([rng.random(shape) for rng in rngs]) if rngs else np.zeros((0,) + shape)
     elif method == 'ifft':
-        values = []
-        for length in shape:
-            values.append(ifft_sample_1D(length))
-        output = np.einsum(subs[len(values)], *values)
-        speed = speed_range[0] + output * (speed_range[1] - speed_range[0])
+        output = ifft_samples(shape, rngs)
     elif method == 'fourier':
-        output = fourier_sample(shape)
-        speed = speed_range[0] + output * (speed_range[1] - speed_range[0])
-    elif method == 'mixed_random_ifft':
-        if np.random.rand() > 0.5:
-            speed = generate_grid_speed('random', shape, speed_range)
-        else:
-            speed = generate_grid_speed('ifft', shape, speed_range)
-    elif method == 'mixed_random_fourier':
-        if np.random.rand() > 0.5:
-            speed = generate_grid_speed('random', shape, speed_range)
-        else:
-            speed = generate_grid_speed('fourier', shape, speed_range)
+        output = fourier_samples(shape, rngs)
     else:
-        raise ValueError(f'Speed sampling method {method} not recognized for this grid shape')
-
-    return speed
+        # Choose the method of each run, then generate the runs of each method together
+        other = method.split('_')[-1]
+        use_other = np.array([rng.random() <= 0.5 for rng in rngs], dtype=bool)
+        output = np.empty((len(rngs),) + shape)
+        for sub_method, selected in [('random', ~use_other), (other, use_other)]:
+            index = np.flatnonzero(selected)
+            output[index] = _grid_speeds(sub_method, shape, (0, 1), [rngs[i] for i in index])
+    return speed_range[0] + output * (speed_range[1] - speed_range[0])
 
 
-def fourier_sample(shape):
+def fourier_sample(shape, rng=None):
     """Randomly sample an array based on a fourier method.
 
     Parameters
     ----------
     shape : tuple of int
         Shape of array to be generated.
+    rng : np.random.Generator, optional
+        Random number generator. If None then the global `np.random` state
+        is used.
 
     Returns
     -------
     np.ndarray
         Array randomly sampled with a fourier method.
     """
-    ndim = len(shape)
-
-    freq_cutoffs = tuple(np.random.randint(int(length / 2) - 1) + 1 for length in shape)
-    weight_shape = tuple(2 * f for f in freq_cutoffs)
+    rng = np.random if rng is None else rng
+    return fourier_samples(tuple(shape), [rng])[0]
 
-    weights = np.random.random(weight_shape)
-    weights = weights / np.sum(weights)
-    phi = np.random.random(weight_shape) * 2 * np.pi
 
-    slices_freq = tuple(slice(-f, f) for f in freq_cutoffs)
-    slices_values = tuple(slice(0, 1, 1/s) for s in shape)
-    mesh_values = np.mgrid[slices_values + slices_freq]
-
-    mesh_sum = np.sum([mesh_values[d]*mesh_values[d+ndim] for d in range(ndim)], axis=0)
-
-    values = np.sum(weights * np.cos(mesh_sum + phi), axis=tuple(d+ndim for d in range(ndim)))
-    values = values - values.min()
-    max_val = values.max()
-    if max_val > 0:
-        values = values / max_val
-    return values
+def fourier_samples(shape, rngs):
+    """Randomly sample a batch of arrays based on a fourier method.
 
+    Parameters
+    ----------
+    shape : tuple of int
+        Shape of each array to be generated.
+    rngs : list of np.random.Generator
+        Random number generator of each array.
 
-def ifft_sample_1D(length):
+    Returns
+    -------
+    np.ndarray
+        Arrays randomly sampled with a fourier method, of shape
+        `(len(rngs),) + shape`.
+    """
+    values = np.zeros((len(rngs),) + tuple(shape))
+    for run, rng in enumerate(rngs):
+        freq_cutoffs = tuple(_integers(rng, int(length / 2) - 1) + 1 for length in shape)
+        weight_shape = tuple(2 * f for f in freq_cutoffs)
+        weights = rng.random(weight_shape)
+        weights = weights / np.sum(weights)
+        phi = rng.random(weight_shape) * 2 * np.pi
+
+        # The sum of cosines over all frequencies is separable, so it is
+        # evaluated one axis at a time with a chirp z-transform, which samples
+        # frequencies -f to f - 1 at phases of k / length radians. Each array
+        # is transformed on its own so it does not depend on the other arrays
+        # of the batch.
+        sample = weights * np.exp(1j * phi)
+        for axis, (length, f) in enumerate(zip(shape, freq_cutoffs)):
+            sample = czt(sample, length, np.exp(1j / length), axis=axis)
+            shift = np.exp(-1j * f * np.arange(length) / length)
+            sample = sample * np.reshape(shift, (1,) * axis + (-1,) + (1,) * (len(shape) - axis - 1))
+        values[run] = sample.real
+
+    # Rescale each array to between zero and one
+    axes = tuple(range(1, len(shape) + 1))
+    values = values - values.min(axis=axes, keepdims=True)
+    max_val = values.max(axis=axes, keepdims=True)
+    return np.divide(values, max_val, out=values, where=max_val > 0)
+
+
+def ifft_sample_1D(length, rng=None):
     """Sample in 1D based on an ifft method.
 
     Parameters
     ----------
     length : int
         Length of array to be generated.
+    rng : np.random.Generator, optional
+        Random number generator. If None then the global `np.random` state
+        is used.
 
     Returns
     -------
     np.ndarray
         1D array randomly sampled with ifft method.
     """
-    freq_cutoff = np.random.randint(length)
-    weights = np.random.random((freq_cutoff,))
-    weights = weights / np.sum(weights)
-    values = np.zeros((length,))
-    values[:freq_cutoff] = length * weights
-
-    shift = np.random.randint(length)
-    output = np.roll(ifft(values), shift)
-    return np.clip(np.abs(output), 0, 1)
+    rng = np.random if rng is None else rng
+    return ifft_samples((length,), [rng])[0]
+
+
+def ifft_samples(shape, rngs):
+    """Randomly sample a batch of arrays based on an ifft method.
+
+    Each array is the outer product of an array sampled in 1D along each
+    axis.
+
+    Parameters
+    ----------
+    shape : tuple of int
+        Shape of each array to be generated.
+    rngs : list of np.random.Generator
+        Random number generator of each array.
+
+    Returns
+    -------
+    np.ndarray
+        Arrays randomly sampled with an ifft method, of shape
+        `(len(rngs),) + shape`.
+    """
+    # Draw the spectrum and shift of each array along each axis
+    spectra = [np.zeros((len(rngs), length)) for length in shape]
+    shifts = np.zeros((len(rngs), len(shape)), dtype=int)
+    for run, rng in enumerate(rngs):
+        for axis, length in enumerate(shape):
+            freq_cutoff = _integers(rng, length)
+            weights = rng.random((freq_cutoff,))
+            spectra[axis][run, :freq_cutoff] = length * weights / np.sum(weights)
+            shifts[run, axis] = _integers(rng, length)
+
+    output = np.ones((len(rngs),) + (1,) * len(shape))
+    for axis, (length, spectrum) in enumerate(zip(shape, spectra)):
+        values = ifft(spectrum, axis=1)
+        # Roll each array by its own shift
+        index = (np.arange(length) - shifts[:, axis:axis + 1]) % length
+        values = np.clip(np.abs(np.take_along_axis(values, index, axis=1)), 0, 1)
+        output = output * np.reshape(values, (len(rngs),) + (1,) * axis + (length,) + (1,) * (len(shape) - axis - 1))
+    return output
 
 
 def gradient(f, axis=None):
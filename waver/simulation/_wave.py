@@ -2,6 +2,11 @@ import numpy as np
 from ._utils import gradient, divergence, make_pml_sigma
 
 
+# The pressure update averages the pressure of the two previous time
+# steps, so at low frequencies waves travel at sqrt(2 / 3) of the speed
+# `c` passed to `WaveEquation`.
+EFFECTIVE_SPEED_FACTOR = np.sqrt(2 / 3)
+
 class WaveEquation:
     """Class that does the wave equation update
     
@@ -32,6 +37,12 @@ class WaveEquation:
         self._sigma_factors = [np.sum([s for i, s in enumerate(self._sigma) if i != dim], axis=0)
                                 for dim in range(len(self._sigma))]
 
+        # Initialize adjoint pressure, velocity and speed gradient
+        self._P_adj = np.zeros(wave.shape)
+        self._P_1_adj = np.zeros(wave.shape)
+        self._v_adj = np.zeros(self._v.shape)
+        self._speed_gradient = np.zeros(wave.shape)
+
     def update(self, Q=0):
         """Update the wave equation"""
 
@@ -53,11 +64,89 @@ class WaveEquation:
         # Update auxilary equations for perfectly matched layer correction
         # self._psi += self._dt * self._c * self._v
 
+    def adjoint_update(self, P, v, R=0):
+        """Reverse one update of the wave equation for the adjoint wave.
+
+        The adjoint wave is the derivative of a misfit with respect to the
+        wave, propagated backward in time with the transpose of `update`.
+        Along the way the derivative of the misfit with respect to the
+        speed is accumulated in `speed_gradient`.
+
+        Parameters
+        ----------
+        P : np.ndarray
+            Pressure before the update being reversed.
+        v : np.ndarray
+            Velocity before the update being reversed.
+        R : np.ndarray, optional
+            Derivative of the misfit with respect to the pressure after the
+            update being reversed.
+        """
+        sigma_sum = np.sum(self._sigma, axis=0)
+        P_adj = self._P_adj + R
+
+        # Recompute the velocity after the update
+        v_next = v - self._D * gradient(P) - self._dt * self._c * self._sigma * v
+
+        # Reverse the pressure update
+        self._speed_gradient -= P_adj * (2 * self._D * self._c * divergence(v_next) + self._dt * sigma_sum * P)
+        v_adj = self._v_adj + self._D * gradient(self._c2 * P_adj)
+
+        # Reverse the velocity update
+        self._speed_gradient -= self._dt * np.sum(self._sigma * v * v_adj, axis=0)
+        self._P_adj = self._P_1_adj + (0.5 - self._dt * self._c * sigma_sum) * P_adj + self._D * divergence(v_adj)
+        self._P_1_adj = 0.5 * P_adj
+        self._v_adj = (1 - self._dt * self._c * self._sigma) * v_adj
+
+    def snapshot(self):
+        """Copy the state of the wave equation.
+
+        Returns
+        -------
+        tuple of np.ndarray
+            Copy of the pressure, the previous pressure and the velocity.
+        """
+        return self._P.copy(), self._P_1.copy(), self._v.copy()
+
+    def restore(self, state):
+        """Restore the wave equation to a copy of its state.
+
+        Parameters
+        ----------
+        state : tuple of np.ndarray
+            Pressure, previous pressure and velocity, as returned by
+            `snapshot`.
+        """
+        P, P_1, v = state
+        self._P = P.copy()
+        self._P_1 = P_1.copy()
+        self._v = v.copy()
+
+    @property
+    def state_nbytes(self):
+        """int: Size in bytes of a snapshot of the state."""
+        return self._P.nbytes + self._P_1.nbytes + self._v.nbytes
+
     @property
     def wave(self):
         """np.ndarray: Wave."""
         return self._P
 
+    @property
+    def velocity(self):
+        """np.ndarray: Velocity, with the dimensions along the first axis."""
+        return self._v
+
+    @property
+    def adjoint_wave(self):
+        """np.ndarray: Adjoint wave."""
+        return self._P_adj
+
+    @property
+    def speed_gradient(self):
+        """np.ndarray: Derivative of the misfit with respect to the speed."""
+        return self._speed_gradient
+
 
 # class WaveEquation:
 #     """Class that does the wave equation update
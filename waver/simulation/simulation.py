@@ -1,13 +1,36 @@
+import os
+
 import numpy as np
 import scipy.ndimage as ndi
+import scipy.sparse as sparse
 from tqdm import tqdm
 # from napari.qt import progress as tqdm
 
+from ._checkpoint import checkpoint_number, reverse_steps
 from ._detector import Detector
+from ._green import homogeneous_response
 from ._grid import Grid
-from ._source import Source
+from ._receivers import Receivers
+from ._reducers import Spectrum, make_reducer
+from ._source import WAVEFORMS, Source
 from ._time import Time
-from ._wave import WaveEquation
+from ._traveltime import source_travel_time, travel_time
+from ._utils import unpad_edge
+from ._wave import EFFECTIVE_SPEED_FACTOR, WaveEquation
+
+
+# The analytic solution ignores reflections from the perfectly matched
+# layer and is approximate close to a source and for waves spanning few
+# pixels. It is only used with a layer at least ANALYTIC_MIN_PML pixels
+# thick and half as thick as the longest wavelength of the sources, a
+# shortest wavelength of at least ANALYTIC_MIN_WAVELENGTH pixels, and in
+# 2D and 3D a detector at least ANALYTIC_MIN_DISTANCE pixels from each
+# source. The analytic wave is then within ANALYTIC_TOLERANCE of the peak
+# of the wave from time stepping.
+ANALYTIC_MIN_PML = 20
+ANALYTIC_MIN_WAVELENGTH = 12
+ANALYTIC_MIN_DISTANCE = 2
+ANALYTIC_TOLERANCE = 0.2
 
 
 class Simulation:
@@ -21,7 +44,8 @@ class Simulation:
     `add_detector` method must be called before the simulation can be
     `run`.
 
-    Right now only one source and one detector can be used per simulation.
+    Multiple sources can be added, in which case they are all fired
+    together, but right now only one detector can be used per simulation.
     """
     def __init__(self, *, size, spacing, max_speed, time_step=None, pml_thickness=20):
         """
@@ -79,10 +103,16 @@ class Simulation:
         # Initialize some unset attributes
         self._record_with_pml = None
         self._time = None
-        self._source = None
+        self._sources = []
         self._detector = None
+        self._receivers = None
+        self._detected_receivers = None
         self._wave_equation = None
         self._detected_wave = None
+        self._reducers = None
+        self._spectrum = None
+        self._travel_time = None
+        self._detected_travel_time = None
         self._run = False
 
     @property
@@ -100,15 +130,27 @@ class Simulation:
         """Time: Time that simulation is defined over."""
         return self._time
 
+    @property
+    def time_step(self):
+        """float: Time step of the simulation in seconds."""
+        return self._time_step
+
     @property
     def detector(self):
         """Decector: detector that simulation is recorded over."""
         return self._detector
 
+    @property
+    def sources(self):
+        """list of Source: Sources of the simulation."""
+        return list(self._sources)
+
     @property
     def detected_source(self):
         """array: Source for the wave on the detector."""
-        if self._run:
+        if self._run and self._reducers is not None:
+            raise ValueError('Detected source is not stored when running with reducers')
+        elif self._run:
             return self._detected_source
         else:
             raise ValueError('Simulation must be run first, use Simulation.run()')
@@ -116,11 +158,104 @@ class Simulation:
     @property
     def detected_wave(self):
         """array: Array for the wave."""
-        if self._run:
+        if self._run and self._reducers is not None:
+            raise ValueError('Detected wave is not stored when running with reducers, use Simulation.reduced_wave')
+        elif self._run:
             return self._detected_wave
         else:
             raise ValueError('Simulation must be run first, use Simulation.run()')
 
+    @property
+    def receivers(self):
+        """Receivers: receivers that simulation is recorded at."""
+        return self._receivers
+
+    @property
+    def detected_receivers(self):
+        """array: Wave at each receiver, with shape `(nsteps_detected, nreceivers)`."""
+        if self._run and self._receivers is not None:
+            return self._detected_receivers
+        elif self._run:
+            raise ValueError('Simulation has no receivers, use Simulation.add_receivers')
+        else:
+            raise ValueError('Simulation must be run first, use Simulation.run()')
+
+    @property
+    def detected_spectrum(self):
+        """array: Complex spectrum of the wave on the detector at each of its frequencies."""
+        if self._run and self._spectrum is not None:
+            return self._spectrum.value
+        elif self._run:
+            raise ValueError('Detector does not record a spectrum, use Simulation.add_detector(frequencies=...)')
+        else:
+            raise ValueError('Simulation must be run first, use Simulation.run()')
+
+    @property
+    def reduced_wave(self):
+        """dict of array: Reductions of the wave on the detector over time by name."""
+        if self._run and self._reducers is not None:
+            return {reducer.name: reducer.value for reducer in self._reducers}
+        else:
+            raise ValueError('Simulation must be run with reducers first, use Simulation.run(reducers=...)')
+
+    @property
+    def travel_time(self):
+        """array: First arrival time of the wave on the grid in seconds."""
+        if self._travel_time is not None:
+            return self._travel_time
+        else:
+            raise ValueError('Travel time must be computed first, use Simulation.run_travel_time()')
+
+    @property
+    def detected_travel_time(self):
+        """array: First arrival time of the wave on the detector in seconds."""
+        if self._detected_travel_time is not None:
+            return self._detected_travel_time
+        else:
+            raise ValueError('Travel time must be computed first, use Simulation.run_travel_time()')
+
+    @property
+    def supports_analytic(self):
+        """bool: If the detected wave can be computed with `run_analytic`.
+
+        This requires a uniform speed, no receivers, a detector that records
+        the wave at each time step but not in the perfectly matched layer,
+        and point sources with a known period that are not on the edge of
+        the grid. Sources broadcast along an axis or on the edge also extend into the
+        perfectly matched layer, so do not behave like point sources. The
+        result must also be accurate to within `ANALYTIC_TOLERANCE` of the
+        peak of the wave from time stepping, which requires a perfectly
+        matched layer thick enough that there are no reflections from the
+        edges of the grid, waves spanning enough pixels, and a detector away
+        from the sources, see `ANALYTIC_MIN_PML`.
+        """
+        if (np.ptp(self.grid_speed) != 0
+                or self._receivers is not None
+                or self._record_with_pml
+                or (self._detector is not None and self.detector.frequencies is not None)):
+            return False
+
+        wavelengths = []
+        for source in self._sources:
+            if source.period is None or None in source.location:
+                return False
+            if any(ind in (0, length - 1) for ind, length in zip(source.index, self.grid.shape)):
+                return False
+            periods = [source.period] + ([source.end_period] if source.end_period is not None else [])
+            wavelengths.extend(self.grid_speed.flat[0] * period / self.grid.spacing for period in periods)
+
+        if wavelengths and (self.grid.pml_thickness < max(ANALYTIC_MIN_PML, max(wavelengths) / 2)
+                            or min(wavelengths) < ANALYTIC_MIN_WAVELENGTH):
+            return False
+
+        if self._detector is not None and self._sources and self.grid.ndim > 1:
+            detector_index = self.detector.index.reshape(self.grid.ndim, -1)
+            for source in self._sources:
+                offset = detector_index - np.reshape(source.index, (-1, 1))
+                if np.min(np.sum(offset ** 2, axis=0)) < ANALYTIC_MIN_DISTANCE ** 2:
+                    return False
+        return True
+
     def set_speed(self, speed, min_speed=0, max_speed=None):
         """Set speed values defined on the simulation grid.
         
@@ -146,7 +281,7 @@ class Simulation:
         else:
             self._grid_speed = np.full(self.grid.shape, speed)
 
-    def _setup_run(self, duration, temporal_downsample=1):
+    def _setup_run(self, duration, temporal_downsample=1, reducers=None):
         """Setup run of the simulation for a given duration.
 
         Parameters
@@ -155,6 +290,9 @@ class Simulation:
             Length of the simulation in seconds.
         temporal_downsample : int, optional
             Temporal downsample factor.
+        reducers : list of str or Reducer, optional
+            Reductions of the detected wave to compute instead of storing
+            the detected wave.
         """
         # Create time object based on duration of run
         self._time = Time(step=self._time_step, duration=duration, temporal_downsample=temporal_downsample)
@@ -171,71 +309,546 @@ class Simulation:
                                            pml=self.grid.pml_thickness
                                            )
 
-        # Create detector arrays for wave and source
-        full_shape = (self.time.nsteps_detected,) + self.detector.downsample_shape
-        self._detected_wave = np.zeros(full_shape)
-        self._detected_source = np.zeros(full_shape)
+        # Combine the sources into a sparse matrix of their spatial weights
+        # on the padded grid and their profile at each time step, so all
+        # sources are injected with a single sparse product each step
+        times = np.array(self.time.values)
+        self._source_weights = sparse.hstack(
+            [sparse.csc_matrix(source.pad(source.weight, self.grid.pml_thickness).reshape(-1, 1))
+             for source in self._sources] or [sparse.csc_matrix((int(np.prod(self.grid.full_shape)), 0))]).tocsr()
+        self._source_profiles = np.reshape([source.profile(times) for source in self._sources],
+                                           (len(self._sources), self.time.nsteps)).T
+
+        # Create receiver array for wave
+        if self._receivers is not None:
+            self._detected_receivers = np.zeros((self.time.nsteps_detected, self._receivers.nreceivers))
+
+        # Record a running spectrum of the detected wave
+        if self._detector is None:
+            self._spectrum = None
+            self._reducers = None
+            self._detected_wave = None
+            self._detected_source = None
+            return
+        elif self.detector.frequencies is not None:
+            self._spectrum = Spectrum(self.detector.frequencies)
+            reducers = list(reducers or []) + [self._spectrum]
+        else:
+            self._spectrum = None
+
+        if reducers is not None:
+            # Only keep the reductions of the detected wave
+            self._reducers = [make_reducer(reducer) for reducer in reducers]
+            for reducer in self._reducers:
+                reducer.reset(self.detector.downsample_shape)
+            self._detected_wave = None
+            self._detected_source = None
+        else:
+            # Create detector arrays for wave and source
+            self._reducers = None
+            full_shape = (self.time.nsteps_detected,) + self.detector.downsample_shape
+            self._detected_wave = np.zeros(full_shape)
+            self._detected_source = np.zeros(full_shape)
+
+    @property
+    def _recorded_slice(self):
+        """tuple of slice: Part of the full grid that the detector records."""
+        if self.grid.pml_thickness > 0 and not self._record_with_pml:
+            return (slice(self.grid.pml_thickness, -self.grid.pml_thickness),) * self.grid.ndim
+        else:
+            return (slice(None), ) * self.grid.ndim
+
+    def _step(self, current_step):
+        """Advance the wave equation one time step and record the wave.
+
+        Parameters
+        ----------
+        current_step : int
+            Index of the time step.
+        """
+        current_time = self.time.step * current_step
 
-    def run(self, duration, *, temporal_downsample=1, progress=True, leave=False):
+        # Get current source values summed over all sources
+        source_current = self._source_weights @ self._source_profiles[current_step]
+        source_current = source_current.reshape(self.grid.full_shape)
+
+        # Compute the next wave values
+        self._wave_equation.update(Q=source_current)
+        wave_current = self._wave_equation.wave
+
+        # If recored timestep then use receivers
+        if current_step % self._time.temporal_downsample == 0 and self._receivers is not None:
+            index = int(current_step // self._time.temporal_downsample)
+            self._detected_receivers[index] = self._receivers.sample(wave_current)
+
+        # If recored timestep then use detector
+        if self._detector is None:
+            return
+        elif current_step % self._time.temporal_downsample == 0 and self._reducers is not None:
+            # Only update the reductions of the wave on detector
+            wave_current = wave_current[self._recorded_slice]
+            wave_current_ds = wave_current[self.detector.grid_index]
+            detected_wave = self.detector.sample(wave_current_ds)
+            for reducer in self._reducers:
+                reducer.update(detected_wave, current_time)
+
+        elif current_step % self._time.temporal_downsample == 0:
+            index = int(current_step // self._time.temporal_downsample)
+
+            # Record wave on detector
+            wave_current = wave_current[self._recorded_slice]
+            wave_current_ds = wave_current[self.detector.grid_index]
+            self._detected_wave[index] = self.detector.sample(wave_current_ds)
+
+            # Record source on detector
+            source_current = source_current[self._recorded_slice]
+            source_current_ds = source_current[self.detector.grid_index]
+            self._detected_source[index] = self.detector.sample(source_current_ds)
+
+    def run(self, duration, *, temporal_downsample=1, progress=True, leave=False,
+            checkpoint_path=None, checkpoint_every=None, reducers=None):
         """Run the simulation for a given duration.
         
-        Note a source and a detector must be added before the simulation
-        can be run.
+        Note a source and a detector or receivers must be added before the
+        simulation can be run.
+
+        Parameters
+        ----------
+        duration : float
+            Length of the simulation in seconds.
+        temporal_downsample : int, optional
+            Temporal downsample factor.
+        progress : bool, optional
+            Show progress bar or not.
+        leave : bool, optional
+            Leave progress bar or not.
+        checkpoint_path : str, optional
+            Path of an npz file the state of the simulation is saved to
+            while running, so an interrupted run can be continued with
+            `resume`.
+        checkpoint_every : int, optional
+            Number of time steps between saving checkpoints. If None and a
+            checkpoint path is provided then a checkpoint is saved every
+            tenth of the run.
+        reducers : list of str or Reducer, optional
+            If provided then instead of storing the detected wave at every
+            detected time step only reductions of it over time are computed,
+            which are available from `reduced_wave`. Reducers are either
+            one of 'peak', 'rms' or 'time_of_max', or a Reducer such as
+            `FirstArrival(threshold)`.
+        """
+        if len(self._sources) == 0:
+            raise ValueError('Please add a source before running, use Simulation.add_source')
+
+        if self._detector is None and self._receivers is None:
+            raise ValueError('Please add a detector or receivers before running, use Simulation.add_detector'
+                             ' or Simulation.add_receivers')
+
+        if self._detector is None and reducers is not None:
+            raise ValueError('Reducers require a detector, use Simulation.add_detector')
+
+        frequencies = self._detector is not None and self.detector.frequencies is not None
+        if checkpoint_path is not None and (reducers is not None or frequencies):
+            raise ValueError('Checkpoints can not be saved when running with reducers or a frequency detector')
+
+        # Setup the simulation for the requested duration
+        self._setup_run(duration=duration, temporal_downsample=temporal_downsample, reducers=reducers)
+
+        if checkpoint_path is not None and checkpoint_every is None:
+            checkpoint_every = max(1, self.time.nsteps // 10)
+
+        self._run_steps(0, progress=progress, leave=leave, checkpoint_path=checkpoint_path,
+                        checkpoint_every=checkpoint_every)
+
+    def resume(self, path, *, progress=True, leave=False):
+        """Continue an interrupted run from a checkpoint.
+
+        The simulation must have the same grid, sources and detector as the
+        simulation that saved the checkpoint. The speed, time and state of
+        the wave are restored from the checkpoint, and the run continues
+        saving checkpoints to the same path.
+
+        Parameters
+        ----------
+        path : str
+            Path of the npz file the checkpoint was saved to by `run`.
+        progress : bool, optional
+            Show progress bar or not.
+        leave : bool, optional
+            Leave progress bar or not.
+        """
+        if len(self._sources) == 0:
+            raise ValueError('Please add a source before running, use Simulation.add_source')
+
+        if self._detector is None and self._receivers is None:
+            raise ValueError('Please add a detector or receivers before running, use Simulation.add_detector'
+                             ' or Simulation.add_receivers')
+
+        with np.load(path) as checkpoint:
+            checkpoint = dict(checkpoint)
+
+        if checkpoint['grid_speed'].shape != self.grid.shape:
+            raise ValueError(f'Checkpoint grid shape {checkpoint["grid_speed"].shape} does not match'
+                             f' simulation grid shape {self.grid.shape}')
+        if ('detected_wave' in checkpoint) != (self._detector is not None):
+            raise ValueError('Checkpoint and simulation must both have a detector or both not have one')
+        if self._detector is not None and checkpoint['detected_wave'].shape[1:] != self.detector.downsample_shape:
+            raise ValueError(f'Checkpoint detector shape {checkpoint["detected_wave"].shape[1:]} does not match'
+                             f' simulation detector shape {self.detector.downsample_shape}')
+        if ('detected_receivers' in checkpoint) != (self._receivers is not None):
+            raise ValueError('Checkpoint and simulation must both have receivers or both not have them')
+
+        self._time_step = float(checkpoint['time_step'])
+        self._grid_speed = checkpoint['grid_speed']
+        self._setup_run(duration=float(checkpoint['duration']),
+                        temporal_downsample=int(checkpoint['temporal_downsample']))
+        self._wave_equation.restore((checkpoint['P'], checkpoint['P_1'], checkpoint['v']))
+        if self._detector is not None:
+            self._detected_wave = checkpoint['detected_wave']
+            self._detected_source = checkpoint['detected_source']
+        if self._receivers is not None:
+            self._detected_receivers = checkpoint['detected_receivers']
+
+        self._run_steps(int(checkpoint['step']), progress=progress, leave=leave, checkpoint_path=path,
+                        checkpoint_every=int(checkpoint['checkpoint_every']))
+
+    def _run_steps(self, start, *, progress=True, leave=False, checkpoint_path=None, checkpoint_every=None):
+        """Run the time steps of the simulation from a given step.
+
+        Parameters
+        ----------
+        start : int
+            Index of the first time step to run.
+        progress : bool, optional
+            Show progress bar or not.
+        leave : bool, optional
+            Leave progress bar or not.
+        checkpoint_path : str, optional
+            Path of an npz file to save checkpoints to.
+        checkpoint_every : int, optional
+            Number of time steps between saving checkpoints.
+        """
+        for current_step in tqdm(range(start, self.time.nsteps), initial=start, total=self.time.nsteps,
+                                 disable=not progress, leave=leave):
+            self._step(current_step)
+
+            next_step = current_step + 1
+            if checkpoint_path is not None and next_step % checkpoint_every == 0 and next_step < self.time.nsteps:
+                self._save_checkpoint(checkpoint_path, next_step, checkpoint_every)
+
+        # Simulation has finished running
+        self._run = True
+
+    def _save_checkpoint(self, path, step, checkpoint_every):
+        """Save the state of the simulation to an npz file.
+
+        The checkpoint is written to a temporary file that then replaces
+        any previous checkpoint, so an interruption while saving never
+        leaves a corrupted checkpoint behind.
+
+        Parameters
+        ----------
+        path : str
+            Path of the npz file.
+        step : int
+            Index of the next time step to run.
+        checkpoint_every : int
+            Number of time steps between saving checkpoints.
+        """
+        P, P_1, v = self._wave_equation.snapshot()
+        detected = {}
+        if self._detector is not None:
+            detected['detected_wave'] = self._detected_wave
+            detected['detected_source'] = self._detected_source
+        if self._receivers is not None:
+            detected['detected_receivers'] = self._detected_receivers
+
+        temporary_path = f'{path}.tmp'
+        with open(temporary_path, 'wb') as file:
+            np.savez(file,
+                     step=step,
+                     checkpoint_every=checkpoint_every,
+                     time_step=self.time.step,
+                     duration=self.time.duration,
+                     temporal_downsample=self.time.temporal_downsample,
+                     grid_speed=self.grid_speed,
+                     P=P,
+                     P_1=P_1,
+                     v=v,
+                     **detected)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temporary_path, path)
+
+    def run_adjoint(self, duration, misfit, *, temporal_downsample=1, checkpoint_memory=None,
+                    progress=True, leave=False):
+        """Compute the gradient of a misfit of the detected wave with respect to speed.
+
+        The simulation is run forward, then the adjoint wave equation is run
+        backward in time driven by the derivative of the misfit on the
+        detector. The gradient over the whole grid costs a few simulations,
+        rather than one simulation per pixel of the grid with finite
+        differences. The forward wave is needed in reverse order, so it is
+        stored at checkpoints and recomputed between them, see
+        `reverse_steps`. After running the detected wave is available as for
+        `run`.
 
         Parameters
         ----------
         duration : float
             Length of the simulation in seconds.
+        misfit : callable
+            Function taking the detected wave and returning the value of the
+            misfit and its derivative with respect to the detected wave, for
+            example `functools.partial(l2_misfit, observed=observed)`.
         temporal_downsample : int, optional
             Temporal downsample factor.
+        checkpoint_memory : int, optional
+            Memory budget in bytes for storing the forward wave. If None
+            then about `log2` of the number of time steps checkpoints are
+            stored. Less memory means more of the forward wave is
+            recomputed.
         progress : bool, optional
             Show progress bar or not.
         leave : bool, optional
             Leave progress bar or not.
+
+        Returns
+        -------
+        value : float
+            Value of the misfit.
+        gradient : np.ndarray
+            Derivative of the misfit with respect to the speed at each pixel
+            of the grid.
         """
+        if len(self._sources) == 0:
+            raise ValueError('Please add a source before running, use Simulation.add_source')
+
+        if self._detector is None:
+            raise ValueError('Please add a detector before running, use Simulation.add_detector')
+
+        if self.detector.frequencies is not None:
+            raise ValueError('Detected wave at each time step is required, add a detector without frequencies')
+
         # Setup the simulation for the requested duration
         self._setup_run(duration=duration, temporal_downsample=temporal_downsample)
 
-        if self._source is None:
+        result = {}
+
+        def residual(detected_wave):
+            result['value'], residual = misfit(detected_wave)
+            return residual
+
+        self._run_backward(residual, checkpoint_memory=checkpoint_memory, progress=progress, leave=leave)
+
+        # Speed was padded in edge mode into the pml
+        gradient = unpad_edge(self._wave_equation.speed_gradient, self.grid.pml_thickness)
+        return result['value'], gradient
+
+    def run_migration(self, duration, detected_wave, *, temporal_downsample=1, checkpoint_memory=None,
+                      progress=True, leave=False):
+        """Image structure in the speed with reverse time migration.
+
+        The recorded wave is propagated backward in time from the detector,
+        and correlated at zero lag with the wave from the sources propagated
+        forward in time through the speed of the simulation, usually a
+        smooth background speed. Changes in speed that scatter the wave
+        show up in the image. The image is accumulated as the waves are
+        stepped, with the forward wave recomputed from checkpoints as for
+        `run_adjoint`, so neither wave is stored for all time steps.
+
+        Parameters
+        ----------
+        duration : float
+            Length of the simulation in seconds.
+        detected_wave : np.ndarray
+            Wave recorded on the detector of this simulation, for example
+            from a simulation with the true speed.
+        temporal_downsample : int, optional
+            Temporal downsample factor the wave was recorded with.
+        checkpoint_memory : int, optional
+            Memory budget in bytes for storing the forward wave. If None
+            then about `log2` of the number of time steps checkpoints are
+            stored.
+        progress : bool, optional
+            Show progress bar or not.
+        leave : bool, optional
+            Leave progress bar or not.
+
+        Returns
+        -------
+        np.ndarray
+            Image on the grid.
+        """
+        if len(self._sources) == 0:
             raise ValueError('Please add a source before running, use Simulation.add_source')
 
         if self._detector is None:
             raise ValueError('Please add a detector before running, use Simulation.add_detector')
 
-        if self.grid.pml_thickness > 0 and not self._record_with_pml:
-            recorded_slice = (slice(self.grid.pml_thickness, -self.grid.pml_thickness),) * self.grid_speed.ndim
-        else:
-            recorded_slice = (slice(None), ) * self.grid_speed.ndim
+        if self.detector.frequencies is not None:
+            raise ValueError('Detected wave at each time step is required, add a detector without frequencies')
+
+        # Setup the simulation for the requested duration
+        self._setup_run(duration=duration, temporal_downsample=temporal_downsample)
+
+        if detected_wave.shape != self._detected_wave.shape:
+            raise ValueError(f'Detected wave shape {detected_wave.shape} does not match simulation'
+                             f' detector shape {self._detected_wave.shape}')
+
+        image = np.zeros(self.grid.full_shape)
+        self._run_backward(lambda _: detected_wave, checkpoint_memory=checkpoint_memory,
+                           progress=progress, leave=leave, image=image)
 
-        for current_step in tqdm(range(self.time.nsteps), disable=not progress, leave=leave):
-            current_time = self.time.step * current_step
+        interior = tuple(slice(self.grid.pml_thickness, self.grid.pml_thickness + s) for s in self.grid.shape)
+        return image[interior]
 
-            # Get current source values
-            source_current = self._source.value(current_time)
-            source_current = np.pad(source_current, self.grid.pml_thickness, 'edge')
+    def _run_backward(self, residual, *, checkpoint_memory=None, progress=True, leave=False, image=None):
+        """Run the adjoint wave equation backward in time.
 
-            # Compute the next wave values
-            self._wave_equation.update(Q=source_current)
-            wave_current = self._wave_equation.wave
+        The forward wave is stored at checkpoints and recomputed between
+        them, see `reverse_steps`. The first pass through the forward wave
+        completes the detected wave.
 
-            # If recored timestep then use detector
+        Parameters
+        ----------
+        residual : callable
+            Function taking the detected wave and returning the source of
+            the adjoint wave on the detector.
+        checkpoint_memory : int, optional
+            Memory budget in bytes for storing the forward wave.
+        progress : bool, optional
+            Show progress bar or not.
+        leave : bool, optional
+            Leave progress bar or not.
+        image : np.ndarray, optional
+            If provided then the product of the forward and adjoint waves
+            at each time step is added to it in place.
+        """
+        wave_equation = self._wave_equation
+        ncheckpoints = checkpoint_number(self.time.nsteps, wave_equation.state_nbytes, checkpoint_memory)
+        adjoint_sources = None
+
+        def reverse(current_step):
+            nonlocal adjoint_sources
+            if adjoint_sources is None:
+                # All but the last step have been run forward, run it to
+                # complete the detected wave
+                state = wave_equation.snapshot()
+                self._step(current_step)
+                self._run = True
+                adjoint_sources = residual(self.detected_wave)
+                wave_equation.restore(state)
+
+            # Run adjoint backward driven by its source on the detector
+            adjoint_source = 0
             if current_step % self._time.temporal_downsample == 0:
                 index = int(current_step // self._time.temporal_downsample)
+                adjoint_source = np.zeros(self.grid.full_shape)
+                adjoint_source[self._recorded_slice] = self.detector.scatter(adjoint_sources[index])
+            wave_equation.adjoint_update(wave_equation.wave, wave_equation.velocity, R=adjoint_source)
+
+            # Apply zero lag cross correlation imaging condition
+            if image is not None:
+                np.add(image, wave_equation.wave * wave_equation.adjoint_wave, out=image)
+            pbar.update()
+
+        with tqdm(total=self.time.nsteps, disable=not progress, leave=leave) as pbar:
+            reverse_steps(self.time.nsteps, ncheckpoints,
+                          advance=self._step,
+                          reverse=reverse,
+                          snapshot=wave_equation.snapshot,
+                          restore=wave_equation.restore)
+
+    def run_analytic(self, duration, *, temporal_downsample=1):
+        """Compute the detected wave for a given duration without time stepping.
+
+        In a homogeneous medium the wave at each pixel of the detector is the
+        source convolved with the Green's function of the wave equation, which
+        is known in closed form. The Green's function includes the dispersion
+        of the discretized wave equation so the result closely matches that
+        of `run`, though it is only approximate within a few pixels of a
+        source and for waves travelling diagonally across the grid. See
+        `supports_analytic` for when this method can be used.
+
+        Parameters
+        ----------
+        duration : float
+            Length of the simulation in seconds.
+        temporal_downsample : int, optional
+            Temporal downsample factor.
+        """
+        if len(self._sources) == 0:
+            raise ValueError('Please add a source before running, use Simulation.add_source')
+
+        if self._detector is None:
+            raise ValueError('Please add a detector before running, use Simulation.add_detector')
+
+        if not self.supports_analytic:
+            raise ValueError('Simulation does not support analytic solution, use Simulation.run')
+
+        # Create time object based on duration of run
+        self._time = Time(step=self._time_step, duration=duration, temporal_downsample=temporal_downsample)
+
+        # Create detector arrays for wave and source
+        full_shape = (self.time.nsteps_detected,) + self.detector.downsample_shape
+        self._detected_wave = np.zeros(full_shape)
+        self._detected_source = np.zeros(full_shape)
 
-                # Record wave on detector
-                wave_current = wave_current[recorded_slice]                
-                wave_current_ds = wave_current[self.detector.grid_index]
-                self._detected_wave[index] = self.detector.sample(wave_current_ds)
+        detector_index = self.detector.index
+        for source in self._sources:
+            profile = source.profile(np.array(self.time.values))
 
-                # Record source on detector
-                source_current = source_current[recorded_slice]
-                source_current_ds = source_current[self.detector.grid_index]
-                self._detected_source[index] = self.detector.sample(source_current_ds)
+            # Offset of detector from source
+            offset = detector_index - np.reshape(source.index, (-1,) + (1,) * self.grid.ndim)
+
+            # Record wave and source on detector
+            wave = homogeneous_response(profile, offset, self.grid_speed.flat[0], self.time.step, self.grid.spacing)
+            self._detected_wave += wave[::self.time.temporal_downsample]
+            weight = self.detector.sample(source.weight[self.detector.grid_index])
+            self._detected_source += np.multiply.outer(profile[::self.time.temporal_downsample], weight)
 
         # Simulation has finished running
         self._run = True
 
-    def add_detector(self, *, spatial_downsample=1, boundary=0, edge=None, with_pml=False):
+    def run_travel_time(self):
+        """Compute the first arrival time of the wave without time stepping.
+
+        The eikonal equation is solved with the fast sweeping method, which
+        costs a small number of passes over the grid rather than one pass per
+        time step. All sources are assumed to start at time zero. The speed
+        used is the speed at which waves travel in the simulation, which is
+        lower than the grid speed, see `EFFECTIVE_SPEED_FACTOR`. The travel
+        time is the arrival of the wavefront, as the time stepping is
+        dispersive a small precursor of the simulated wave can arrive
+        earlier.
+        """
+        if len(self._sources) == 0:
+            raise ValueError('Please add a source before running, use Simulation.add_source')
+
+        if self._detector is None:
+            raise ValueError('Please add a detector before running, use Simulation.add_detector')
+
+        # Include the pml if the detector records there
+        if self._record_with_pml and self.grid.pml_thickness > 0:
+            pml_thickness = self.grid.pml_thickness
+            recorded_slice = (slice(pml_thickness, -pml_thickness),) * self.grid.ndim
+        else:
+            pml_thickness = 0
+            recorded_slice = (slice(None), ) * self.grid.ndim
+        speed = np.pad(self.grid_speed, pml_thickness, 'edge') * EFFECTIVE_SPEED_FACTOR
+
+        initial = []
+        for source in self._sources:
+            index = tuple(ind + pml_thickness if isinstance(ind, int) else ind for ind in source.index)
+            initial.append(source_travel_time(speed, source.location, index, self.grid.spacing))
+        full_travel_time = travel_time(speed, np.min(initial, axis=0), self.grid.spacing)
+
+        # Record travel time on detector
+        self._travel_time = full_travel_time[recorded_slice]
+        self._detected_travel_time = self.detector.sample(full_travel_time[self.detector.grid_index])
+
+    def add_detector(self, *, spatial_downsample=1, boundary=0, edge=None, with_pml=False, frequencies=None):
         """Add a detector to the simulaiton.
         
         Note this must be done before the simulation can be run.
@@ -256,7 +869,18 @@ class Simulation:
         with_pml : bool, optional
             If detector should also record values at the perfectly matched layer.
             The boundary should always be set to zero if this option is used.
+        frequencies : list of float, optional
+            If provided then instead of the wave at each time step the
+            detector records a running discrete Fourier transform of the
+            wave at these frequencies in Hz, for example harmonics of the
+            source `[1 / period, 2 / period]`, which is available from
+            `detected_spectrum` after running. This reduces the memory of
+            the detector from the number of time steps to the number of
+            frequencies.
         """
+        if frequencies is not None:
+            frequencies = tuple(float(f) for f in np.atleast_1d(frequencies))
+
         self._run = False
         self._record_with_pml = with_pml
         if self._record_with_pml:
@@ -268,15 +892,49 @@ class Simulation:
                                   spatial_downsample=spatial_downsample,
                                   boundary=boundary,
                                   edge=edge,
+                                  frequencies=frequencies,
                                  )
 
-    def add_source(self, *, location, period, ncycles=None, phase=0):
+    def add_receivers(self, coordinates):
+        """Add receivers at arbitrary locations to the simulation.
+
+        The wave at each receiver is interpolated from the pixels around it
+        and recorded at each detected time step, which is much cheaper than
+        detecting the full grid and sampling it afterwards. Receivers can be
+        used with or instead of a detector, and are available from
+        `detected_receivers` after running.
+
+        Parameters
+        ----------
+        coordinates : array
+            Location of each receiver in meters, with shape
+            `(nreceivers, ndim)`. Each coordinate must be between zero and
+            the size of the grid along its axis.
+        """
+        coordinates = np.reshape(np.asarray(coordinates, dtype=float), (-1, self.grid.ndim))
+        outside = np.any((coordinates < 0) | (coordinates > np.asarray(self.grid.size)), axis=1)
+        if np.any(outside):
+            raise ValueError(f'Receivers at {coordinates[outside].tolist()} are outside the grid of size '
+                             f'{self.grid.size}')
+
+        self._run = False
+        self._receivers = Receivers(coordinates=tuple(map(tuple, coordinates)),
+                                    spacing=self.grid.spacing,
+                                    shape=self.grid.shape,
+                                    pml_thickness=self.grid.pml_thickness,
+                                   )
+
+    def add_source(self, *, location, period=None, ncycles=None, phase=0, amplitude=1, waveform='sine',
+                   end_period=None, samples=None, extend=True):
         """Add a source to the simulaiton.
         
-        Note this must be done before the simulation can be run.
+        Note this must be done before the simulation can be run. If
+        multiple sources are added then they are all fired together, each
+        with its own location and waveform.
 
-        The added source will be a sinusoid with a fixed spatial weight
-        and vary either contiously or for a fixed number of cycles.
+        The added source will have a fixed spatial weight and by default
+        be a sinusoid that varies either contiously or for a fixed number
+        of cycles.
 
         Parameters
         ----------
@@ -294,11 +952,53 @@ class Simulation:
             it will only run for ncycles.
         phase : float
             Phase offset of the source in radians.
+        amplitude : float
+            Amplitude of the source. A negative amplitude flips the
+            polarity of the source.
+        waveform : str, optional
+            Temporal profile of the source, one of 'sine', 'ricker',
+            'gaussian', 'chirp' or 'array'. For a Ricker wavelet or Gaussian
+            pulse the period is the inverse of the peak frequency. A chirp
+            changes linearly in frequency from `period` to `end_period` over
+            `ncycles` of its starting period.
+        end_period : float, optional
+            Period at the end of a chirp in seconds.
+        samples : array, optional
+            Values of an 'array' source at each time step of the
+            simulation, the source is zero after the last sample.
+        extend : bool, optional
+            If True the source is extended into the perfectly matched layer
+            from the edge of the grid along every axis. If False it is only
+            extended along the axes it is broadcast along, so a point source
+            on the edge of the grid stays a point source.
         """
+        if waveform not in WAVEFORMS:
+            raise ValueError(f'Waveform {waveform} not recognized, use one of {WAVEFORMS}')
+        if waveform == 'array' and samples is None:
+            raise ValueError('Array sources require samples')
+        if waveform != 'array' and period is None:
+            raise ValueError(f'{waveform} sources require a period')
+        if waveform == 'chirp' and (end_period is None or ncycles is None):
+            raise ValueError('Chirp sources require an end_period and ncycles')
+
+        if samples is not None:
+            samples = tuple(float(value) for value in np.ravel(samples))
+
+        self._run = False
+        self._sources.append(Source(location=location,
+                                    shape=self.grid.shape,
+                                    spacing=self.grid.spacing,
+                                    period=period,
+                                    ncycles=ncycles,
+                                    phase=phase,
+                                    amplitude=amplitude,
+                                    waveform=waveform,
+                                    end_period=end_period,
+                                    samples=samples,
+                                    time_step=self._time_step,
+                                    extend=extend))
+
+    def clear_sources(self):
+        """Remove all sources from the simulation."""
         self._run = False
-        self._source = Source(location=location,
-                              shape=self.grid.shape,
-                              spacing=self.grid.spacing,
-                              period=period,
-                              ncycles=ncycles,
-                              phase=phase)
+        self._sources = []